@@ -1,12 +1,17 @@
 '''
 File holds initialization logic for the simple skin converter.
 
+The headless calculation and application only need maya.cmds and the maya api. The UI pulls in pymel and PySide, so it's only
+imported the first time run( ) is called.
+
 * Author : Evan Cox coxevan90@gmail.com
 '''
 # Skonverter module imports
-import gui
+import cache
 import methods
 import const
+import sampler
+import telemetry
 
 # Maya lib imports
 import maya.cmds
@@ -15,7 +20,6 @@ import maya.cmds
 import os
 
 if const.DEBUG:
-	reload( gui )
 	reload( methods )
 	
 
@@ -23,46 +27,132 @@ def run( ):
 	"""
 	Runs Skonverter UI.
 	"""
+	import gui
+	if const.DEBUG:
+		reload( gui )
+	
 	skonverter_window = gui.Skonverter_Interface( )
 	skonverter_window.show( )
 	
 	
-def run_skin_calculation( transform, root_bone, tolerance = -1, file_path = '' ):
+def run_skin_calculation( transform, root_bone, tolerance = -1, file_path = '', incremental = False, trace_file = '', max_influences = None, prune_threshold = None,
+                          use_cache = None ):
 	"""
 	Main method call for the skin converter to calculate skin weights from the transform's shape node.
 	
+	If incremental is True and file_path holds data from an earlier run, only the bones that changed since then are recalculated.
+	If trace_file is given, the time spent in each stage is written there as a json trace.
+	max_influences and prune_threshold trim each vertex down to its largest weights, see methods.determine_weighting.
+	If use_cache is True ( defaults to const.CACHE_ENABLED ), an unchanged mesh and skeleton get their earlier result back from the
+	on disk cache instead of being probed again.
+	
+	transform can be a list of meshes bound to the same skeleton, they're all calculated off one pass over the bones. data is then
+	{ mesh_name : data } and file_path, if given, is { mesh_name : file_path }.
+	
 	Returns [ data, message ]
 	Data    : skin calculation data
 	Message : message about the results. If data == False, message holds more info.
 	"""
-	data, message = methods.determine_weighting( transform, root_bone, tolerance = tolerance )
+	if trace_file:
+		with telemetry.recording( trace_file = trace_file ):
+			return run_skin_calculation( transform, root_bone, tolerance = tolerance, file_path = file_path, incremental = incremental,
+			                             max_influences = max_influences, prune_threshold = prune_threshold, use_cache = use_cache )
+	
+	if use_cache is None:
+		use_cache = const.CACHE_ENABLED
+	
+	previous_data = None
+	if incremental and file_path:
+		if isinstance( file_path, dict ):
+			previous_data = dict( ( mesh_name, methods.load_data( mesh_path ) ) for mesh_name, mesh_path in file_path.iteritems( ) if os.path.exists( mesh_path ) )
+		else:
+			previous_data = methods.load_data( file_path )
+		
+	data, message = methods.determine_weighting( transform, root_bone, tolerance = tolerance, previous_data = previous_data,
+	                                             max_influences = max_influences, prune_threshold = prune_threshold,
+	                                             result_cache = cache.get_default_cache( ) if use_cache else None )
 	
 	# Data is valid, so if a file path was provided too, save the data out. 
 	if file_path and data:
-		methods.save_json( file_path, data )
+		if isinstance( file_path, dict ):
+			for mesh_name, mesh_path in file_path.iteritems( ):
+				if mesh_name in data:
+					methods.save_data( mesh_path, data[ mesh_name ] )
+		else:
+			methods.save_data( file_path, data )
 
 	return data, message
 
 
-def run_skin_application( transform = None, data = None, file_path = '' ):
+def run_skin_application( transform = None, data = None, file_path = '', trace_file = '', differential = None ):
 	"""
 	Main method call for the skin converter to apply skin weights to the transform.
 	
+	If trace_file is given, the time spent in each stage is written there as a json trace.
+	If differential is True ( defaults to const.APPLY_DIFFERENTIAL ), only the verts and influences whose weights differ from what the
+	skin cluster already holds get written, and the message holds how many that was.
+	
 	Returns [ result, message ]
 	Result  : Whether or not the application was successful
 	Message : message about the results. If data == False, message holds more info.
 	"""
+	if trace_file:
+		with telemetry.recording( trace_file = trace_file ):
+			return run_skin_application( transform = transform, data = data, file_path = file_path, differential = differential )
+	
 	result, data = methods.determine_data_to_source( data, file_path )
 	if not result:
 		maya.cmds.warning( data )
 		return result, data
 		
-	result, message = methods.apply_weighting( transform, data = data )
+	result, message = methods.apply_weighting( transform, data = data, differential = differential )
 	if not result:
 		maya.cmds.warning( message )
 		
 	return result, message
 
 
+def run_skin_transfer( source_transform, target_transform, data = None, file_path = '', target_file_path = '', trace_file = '', use_cache = None ):
+	"""
+	Main method call for transferring calculated skin weights from the source mesh onto other meshes of the same shape, like its LODs,
+	without probing the skeleton again. data or file_path hold the source mesh's data, same as run_skin_application.
+	
+	target_transform can be a list of meshes, data is then { mesh_name : data } and target_file_path, if given, is { mesh_name : file_path }.
+	If trace_file is given, the time spent in each stage is written there as a json trace.
+	If use_cache is True ( defaults to const.TRANSFER_CACHE_ENABLED ), the correspondence between the meshes is kept on disk so reruns
+	don't rebuild it.
+	
+	Returns [ data, message ]
+	Data    : the target mesh's skin data
+	Message : message about the results. If data == False, message holds more info.
+	"""
+	if trace_file:
+		with telemetry.recording( trace_file = trace_file ):
+			return run_skin_transfer( source_transform, target_transform, data = data, file_path = file_path, target_file_path = target_file_path, use_cache = use_cache )
+	
+	result, data = methods.determine_data_to_source( data, file_path )
+	if not result:
+		maya.cmds.warning( data )
+		return result, data
+	
+	if not isinstance( target_transform, ( list, tuple ) ):
+		target_data, message = methods.transfer_weighting( source_transform, target_transform, data = data, use_cache = use_cache )
+		if target_file_path and target_data:
+			methods.save_data( target_file_path, target_data )
+		return target_data, message
+	
+	# The correspondences are independent of each other, each LOD just gets its own
+	results = { }
+	for transform in target_transform:
+		mesh_name = sampler.get_node_name( transform )
+		target_data, message = methods.transfer_weighting( source_transform, transform, data = data, use_cache = use_cache )
+		if not target_data:
+			return None, message
+		results[ mesh_name ] = target_data
+		if target_file_path and mesh_name in target_file_path:
+			methods.save_data( target_file_path[ mesh_name ], target_data )
+	return results, 'Success'
+
+
 if __name__ not in '__main__':
 	print "*** Loaded Skonverter ***"
\ No newline at end of file
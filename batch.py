@@ -0,0 +1,419 @@
+"""
+Command line batch driver for converting many meshes in headless mayapy.
+
+Takes a json manifest of jobs, groups them by scene so each scene is opened as few times as possible, and spreads them across a
+pool of worker processes. A scene with more jobs than its share of the workers gets split so every worker has something to do.
+A worker that dies outright ( a mayapy crash ) doesn't stall the batch. The jobs it had already finished keep their results, the
+one it died on counts as a failed attempt, and whatever's left of its task goes back in the pool. Writes a json report with the
+timing and result of every job.
+
+	mayapy batch.py manifest.json --workers 8 --retries 1 --report report.json
+
+Manifest format:
+	[ { "scene": "/path/hero.ma", "transform": "body_geo", "root_bone": "root_jnt", "output": "/path/body.skw", "tolerance": -1 }, ... ]
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import argparse
+import json
+import multiprocessing
+import multiprocessing.queues
+import os
+import Queue
+import sys
+import time
+import traceback
+
+
+_backend = None # The backend for this worker process, made once by init_worker
+_open_scene = None # The scene this worker has open, so the next task for it doesn't open it again
+_progress_queue = None # Where this worker reports the tasks it picks up and how far it's got, see Worker_Pool
+_task_id = None # The Worker_Pool task this worker is running
+
+
+####################
+## Scene backends ##
+####################
+
+class Maya_Backend( object ):
+	"""
+	Runs jobs in a headless Maya session.
+	"""
+	def __init__( self ):
+		import maya.standalone
+		maya.standalone.initialize( name = 'python' )
+
+		# Imported after Maya is up, they need maya.cmds to be usable.
+		import maya.cmds
+		import methods
+		import telemetry
+		self.cmds = maya.cmds
+		self.methods = methods
+		self.telemetry = telemetry
+
+	def open_scene( self, scene ):
+		self.cmds.file( scene, open = True, force = True )
+
+	def convert( self, job ):
+		"""
+		Converts and saves one job. Returns the per stage timing summary.
+		"""
+		with self.telemetry.recording( trace_file = job.get( 'trace' ) ) as recorder:
+			data, message = self.methods.determine_weighting( job[ 'transform' ], job[ 'root_bone' ], tolerance = job.get( 'tolerance', -1 ) )
+			if not data:
+				raise RuntimeError( message )
+			self.methods.save_data( job[ 'output' ], data )
+		return recorder.get_summary( )
+
+
+class Stub_Backend( object ):
+	"""
+	Stand in for Maya, for checking the scheduling, retries and reporting on any machine.
+
+	Jobs can carry a "stub_failures" count ( fail that many attempts before succeeding ), a "stub_seconds" delay and "stub_exit",
+	which kills the worker process outright like a crashing mayapy. "stub_exits" kills the worker that many times before the job
+	goes through, counted in a file next to the output since the worker doesn't survive to remember. Each attempt is logged so
+	retries can be checked afterwards.
+	"""
+	def __init__( self ):
+		self.open_scenes = [ ]
+		self.attempts = { }
+
+	def open_scene( self, scene ):
+		self.open_scenes.append( scene )
+
+	def convert( self, job ):
+		key = job[ 'output' ]
+		self.attempts[ key ] = self.attempts.get( key, 0 ) + 1
+		time.sleep( job.get( 'stub_seconds', 0 ) )
+		if job.get( 'stub_exit' ):
+			os._exit( 1 )
+		if job.get( 'stub_exits' ):
+			exits_path = key + '.exits'
+			if not os.path.exists( exits_path ) or os.path.getsize( exits_path ) < job[ 'stub_exits' ]:
+				with open( exits_path, 'a' ) as exits_file:
+					exits_file.write( 'x' )
+				os._exit( 1 )
+		if self.attempts[ key ] <= job.get( 'stub_failures', 0 ):
+			raise RuntimeError( 'Stub failure {0} for {1}'.format( self.attempts[ key ], key ) )
+		with open( key, 'w' ) as output_file:
+			json.dump( { 'stub': job }, output_file )
+
+
+BACKENDS = { 'maya': Maya_Backend, 'stub': Stub_Backend }
+
+
+####################
+## Worker methods ##
+####################
+
+def init_worker( backend_name, backends = None ):
+	"""
+	Pool initializer, builds this process' backend once so every scene it handles shares the same session. backends is the
+	{ name : backend class } to pick from, BACKENDS by default.
+	"""
+	global _backend
+	_backend = ( backends or BACKENDS )[ backend_name ]( )
+
+
+def run_in_scene( scene, method_name, *args ):
+	"""
+	Calls the worker's backend method with the scene open, opening it unless this worker's last call left it open. Returns what
+	the method returned.
+	"""
+	global _open_scene
+	if _open_scene != scene:
+		_open_scene = None
+		_backend.open_scene( scene )
+		_open_scene = scene
+	try:
+		return getattr( _backend, method_name )( *args )
+	except:
+		# A failed job can leave the scene half moved, so it gets reopened before the next one.
+		_open_scene = None
+		raise
+
+
+def run_scene_jobs( task ):
+	"""
+	Runs each of the task's jobs in its scene. Returns a result dictionary per job. Each result is reported as soon as its job is
+	done too, so it isn't lost if the worker dies on a later job.
+	"""
+	scene, jobs, retries = task
+	results = [ ]
+	for job in jobs:
+		result = { 'job': job, 'scene': scene, 'attempts': 0, 'success': False, 'seconds': 0.0, 'error': None, 'telemetry': None, 'pid': os.getpid( ) }
+		start = time.time( )
+		while result[ 'attempts' ] <= retries and not result[ 'success' ]:
+			result[ 'attempts' ] += 1
+			try:
+				result[ 'telemetry' ] = run_in_scene( scene, 'convert', job )
+				result[ 'success' ] = True
+				result[ 'error' ] = None
+			except Exception:
+				result[ 'error' ] = traceback.format_exc( )
+
+		result[ 'seconds' ] = time.time( ) - start
+		results.append( result )
+		report_progress( result )
+
+	return results
+
+
+#################
+## Worker pool ##
+#################
+
+class Worker_Pool( object ):
+	"""
+	A multiprocessing.Pool that notices when a worker process dies part way through a task, rather than waiting on it forever.
+	Workers report each task they pick up along with their pid, results are polled with a timeout, and a task whose worker is gone
+	comes back with a result of None. The polling also keeps Ctrl-C working, python 2 can't interrupt a Queue.get( ) without a timeout.
+
+		pool = Worker_Pool( workers, init_worker, ( backend_name, ) )
+		pool.submit( run_scene_jobs, task )
+		task, result, progress = pool.get( )
+
+	Functions that raise come back with None as well, with the traceback printed by the worker. progress is the list of whatever
+	the task passed to report_progress( ), which survives the worker dying.
+	"""
+	def __init__( self, processes, initializer = None, initargs = ( ), poll_seconds = 0.5 ):
+		self.poll_seconds = poll_seconds
+		self.messages = multiprocessing.queues.SimpleQueue( ) # ( task_id, pid, progress ), written straight to the pipe so a crash can't lose it
+		self.finished = Queue.Queue( )
+		self.tasks = { }     # task_id : task, for everything submitted and not handed back yet
+		self.running = { }   # task_id : pid of the worker that picked it up
+		self.progress = { }  # task_id : [ progress the task has reported ]
+		self.suspects = set( ) # task ids whose worker was found dead, given one more poll for a result already on its way
+		self.next_id = 0
+		self.pool = multiprocessing.Pool( processes = processes, initializer = init_watched_worker, initargs = ( self.messages, initializer, initargs ) )
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ):
+		self.pool.terminate( )
+		self.pool.join( )
+		return False
+
+	def __len__( self ):
+		return len( self.tasks )
+
+	def submit( self, function, task ):
+		task_id = self.next_id
+		self.next_id += 1
+		self.tasks[ task_id ] = task
+		self.pool.apply_async( run_watched_task, ( task_id, function, task ), callback = self.finished.put )
+		return task_id
+
+	def get( self ):
+		"""
+		Waits for the next task to finish. Returns ( task, result, progress ), result is None if the task's worker died or it raised.
+		"""
+		while True:
+			try:
+				task_id, result = self.finished.get( timeout = self.poll_seconds )
+			except Queue.Empty:
+				task_id, result = self.find_lost_task( ), None
+				if task_id is None:
+					continue
+
+			# A result can still turn up for a task that was already given up on, it's been handled.
+			if task_id in self.tasks:
+				self.read_messages( )
+				self.running.pop( task_id, None )
+				self.suspects.discard( task_id )
+				return self.tasks.pop( task_id ), result, self.progress.pop( task_id, [ ] )
+
+	def read_messages( self ):
+		"""
+		Catches up on the tasks the workers have picked up and the progress they've reported.
+		"""
+		while not self.messages.empty( ):
+			task_id, pid, progress = self.messages.get( )
+			if task_id not in self.tasks:
+				continue
+			self.running[ task_id ] = pid
+			if progress is not None:
+				self.progress.setdefault( task_id, [ ] ).append( progress )
+
+	def find_lost_task( self ):
+		"""
+		Returns the id of a task whose worker has died, or None. The pool replaces dead workers, so the dead one's pid is just gone
+		from the live child processes.
+		"""
+		self.read_messages( )
+		alive = set( process.pid for process in multiprocessing.active_children( ) )
+		for task_id, pid in self.running.items( ):
+			if pid in alive:
+				continue
+			if task_id in self.suspects:
+				return task_id
+			self.suspects.add( task_id )
+		return None
+
+
+def init_watched_worker( messages, initializer, initargs ):
+	global _progress_queue
+	_progress_queue = messages
+	if initializer:
+		initializer( *initargs )
+
+
+def run_watched_task( task_id, function, task ):
+	global _task_id
+	_task_id = task_id
+	_progress_queue.put( ( task_id, os.getpid( ), None ) )
+	try:
+		return task_id, function( task )
+	except Exception:
+		traceback.print_exc( )
+		return task_id, None
+
+
+def report_progress( progress ):
+	"""
+	Hands part of the running task's result back to the Worker_Pool straight away. Does nothing outside of a Worker_Pool worker.
+	"""
+	if _progress_queue is not None:
+		_progress_queue.put( ( _task_id, os.getpid( ), progress ) )
+
+
+########################
+## Scheduling methods ##
+########################
+
+def load_manifest( file_path ):
+	"""
+	Loads and checks a manifest. Returns the list of jobs.
+	"""
+	with open( file_path, 'r' ) as manifest_file:
+		jobs = json.load( manifest_file )
+
+	if not isinstance( jobs, list ):
+		raise ValueError( 'Manifest must be a list of jobs' )
+	for index, job in enumerate( jobs ):
+		missing = [ key for key in ( 'scene', 'transform', 'root_bone', 'output' ) if key not in job ]
+		if missing:
+			raise ValueError( 'Job {0} is missing {1}'.format( index, ', '.join( missing ) ) )
+	return jobs
+
+
+def group_jobs_by_scene( jobs, retries = 0, task_count = 1 ):
+	"""
+	Groups the jobs into ( scene, jobs, retries ) tasks, one per scene, keeping the manifest order within each scene. While there
+	are fewer than task_count tasks the biggest one gets split in half, so every worker gets work even with only a few scenes.
+	Each half opens the scene itself. Tasks with the most jobs go first so the longest ones don't end up starting last.
+	"""
+	scene_jobs = { }
+	scene_order = [ ]
+	for job in jobs:
+		if job[ 'scene' ] not in scene_jobs:
+			scene_jobs[ job[ 'scene' ] ] = [ ]
+			scene_order.append( job[ 'scene' ] )
+		scene_jobs[ job[ 'scene' ] ].append( job )
+
+	tasks = [ ( scene, scene_jobs[ scene ] ) for scene in scene_order ]
+	while len( tasks ) < task_count:
+		index = max( range( len( tasks ) ), key = lambda task_index: len( tasks[ task_index ][ 1 ] ) )
+		scene, task_jobs = tasks[ index ]
+		if len( task_jobs ) < 2:
+			break
+		half = ( len( task_jobs ) + 1 ) // 2
+		tasks[ index:index + 1 ] = [ ( scene, task_jobs[ :half ] ), ( scene, task_jobs[ half: ] ) ]
+
+	tasks.sort( key = lambda task: -len( task[ 1 ] ) )
+	return [ ( scene, task_jobs, retries ) for scene, task_jobs in tasks ]
+
+
+def run_batch( jobs, workers = None, retries = 0, backend_name = 'maya', trace_dir = None ):
+	"""
+	Runs the jobs across a pool of worker processes. Returns the report dictionary.
+	
+	With a trace_dir, every job without its own "trace" path writes its stage trace there, named after its output file.
+	"""
+	if trace_dir:
+		for job in jobs:
+			job.setdefault( 'trace', os.path.join( trace_dir, os.path.basename( job[ 'output' ] ) + '.trace.json' ) )
+	
+	workers = max( 1, workers or multiprocessing.cpu_count( ) )
+	tasks = group_jobs_by_scene( jobs, retries = retries, task_count = workers )
+	workers = max( 1, min( workers, len( tasks ) ) )
+
+	start = time.time( )
+	results = [ ]
+	lost_attempts = { } # output : attempts lost to a dead worker
+	with Worker_Pool( workers, init_worker, ( backend_name, ) ) as pool:
+		for task in tasks:
+			pool.submit( run_scene_jobs, task )
+
+		while len( pool ):
+			( scene, scene_jobs, task_retries ), scene_results, finished_results = pool.get( )
+			# The worker died ( or run_scene_jobs itself failed ). The jobs run in order, so the ones it reported are done, the next
+			# one is what it died on and the rest never started.
+			lost = scene_results is None
+			if lost:
+				scene_results = finished_results
+			for result in scene_results:
+				result[ 'attempts' ] += lost_attempts.get( result[ 'job' ][ 'output' ], 0 )
+			
+			unfinished_jobs = scene_jobs[ len( scene_results ): ] if lost else [ ]
+			if unfinished_jobs:
+				output = unfinished_jobs[ 0 ][ 'output' ]
+				lost_attempts[ output ] = lost_attempts.get( output, 0 ) + 1
+				if lost_attempts[ output ] > task_retries:
+					scene_results.append( { 'job': unfinished_jobs.pop( 0 ), 'scene': scene, 'attempts': lost_attempts[ output ], 'success': False,
+					                        'seconds': 0.0, 'telemetry': None, 'pid': None, 'error': 'Worker process died while running {0}'.format( scene ) } )
+			if unfinished_jobs:
+				print 'Skonverter Batch : Worker died in {0}, requeueing {1} jobs'.format( scene, len( unfinished_jobs ) )
+				pool.submit( run_scene_jobs, ( scene, unfinished_jobs, task_retries ) )
+			
+			for result in scene_results:
+				status = 'OK' if result[ 'success' ] else 'FAILED'
+				print 'Skonverter Batch : {0} | {1} -> {2} | {3:.2f}s'.format( status, result[ 'job' ][ 'transform' ], result[ 'job' ][ 'output' ], result[ 'seconds' ] )
+			results.extend( scene_results )
+
+	return build_report( results, time.time( ) - start, workers )
+
+
+def build_report( results, seconds, workers ):
+	"""
+	Rolls the per job results up into the report.
+	"""
+	failures = [ result for result in results if not result[ 'success' ] ]
+	return {
+		'jobs'        : len( results ),
+		'succeeded'   : len( results ) - len( failures ),
+		'failed'      : len( failures ),
+		'retried'     : len( [ result for result in results if result[ 'attempts' ] > 1 ] ),
+		'workers'     : workers,
+		'seconds'     : seconds,
+		'job_seconds' : sum( result[ 'seconds' ] for result in results ),
+		'results'     : results,
+	}
+
+
+def main( args = None ):
+	parser = argparse.ArgumentParser( description = 'Batch skin conversion for many meshes.' )
+	parser.add_argument( 'manifest', help = 'Json list of { scene, transform, root_bone, output } jobs.' )
+	parser.add_argument( '--workers', type = int, default = None, help = 'Worker processes, defaults to the cpu count.' )
+	parser.add_argument( '--retries', type = int, default = 1, help = 'How many times a failed job gets retried.' )
+	parser.add_argument( '--report', default = None, help = 'Where to write the json report.' )
+	parser.add_argument( '--backend', choices = sorted( BACKENDS ), default = 'maya' )
+	parser.add_argument( '--trace-dir', default = None, help = 'Folder to write a json stage trace per job into.' )
+	args = parser.parse_args( args )
+
+	report = run_batch( load_manifest( args.manifest ), workers = args.workers, retries = args.retries, backend_name = args.backend, trace_dir = args.trace_dir )
+	print 'Skonverter Batch : {0}/{1} jobs succeeded in {2:.2f}s'.format( report[ 'succeeded' ], report[ 'jobs' ], report[ 'seconds' ] )
+
+	if args.report:
+		with open( args.report, 'w' ) as report_file:
+			json.dump( report, report_file, indent = 2 )
+
+	return 1 if report[ 'failed' ] else 0
+
+
+if __name__ == '__main__':
+	sys.exit( main( ) )
@@ -0,0 +1,110 @@
+"""
+Benchmarks the json weight file writer and reader against the original one shot json.dumps / json.loads path.
+
+Each case runs in its own process so peak memory ( ru_maxrss ) only covers that case. Runs without Maya.
+
+	python benchmarks/bench_json_io.py --verts 200000 --bones 150 --influences 4
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# The package modules import each other by bare name, so the package folder itself goes on the path.
+PACKAGE_PATH = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, PACKAGE_PATH )
+
+# Skonverter module imports
+import json_stream
+
+CASES = [ 'legacy_save', 'stream_save', 'legacy_load', 'stream_load' ]
+
+
+def make_data( vertex_count, bone_count, influences ):
+	"""
+	Builds a data dictionary shaped like determine_weighting's output, with random normalized weights.
+	"""
+	random.seed( vertex_count )
+	bone_names = [ 'joint_{0}'.format( index ) for index in range( bone_count ) ]
+	weight_data = { }
+	for vert_id in xrange( vertex_count ):
+		bone_indices = sorted( random.sample( xrange( bone_count ), min( influences, bone_count ) ) )
+		values = [ random.random( ) for _ in bone_indices ]
+		total = sum( values )
+		weight_data[ str( vert_id ) ] = [ ( bone_names[ index ], value / total ) for index, value in zip( bone_indices, values ) ]
+	return { 'weight': weight_data, 'order': bone_names }
+
+
+def get_rss_kb( ):
+	"""
+	Current resident set size in KB, linux only.
+	"""
+	with open( '/proc/self/statm' ) as statm:
+		return int( statm.read( ).split( )[ 1 ] ) * resource.getpagesize( ) / 1024
+
+
+def run_case( case, file_path, vertex_count, bone_count, influences ):
+	"""
+	Runs a single case in this process and returns its result dictionary.
+	"""
+	data = None
+	if case.endswith( 'save' ):
+		data = make_data( vertex_count, bone_count, influences )
+
+	baseline_kb = get_rss_kb( )
+	start = time.time( )
+
+	if case == 'legacy_save':
+		# The original save_json
+		with open( file_path, 'w' ) as data_file:
+			data_file.write( json.dumps( data ) )
+	elif case == 'stream_save':
+		json_stream.write_json( file_path, data )
+	elif case == 'legacy_load':
+		# The original load_json
+		with open( file_path, 'r' ) as data_file:
+			data = json.loads( data_file.readlines( )[ 0 ] )
+	elif case == 'stream_load':
+		data = json_stream.load_json_table( file_path )
+
+	seconds = time.time( ) - start
+	peak_kb = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+	return { 'case': case, 'seconds': seconds, 'baseline_kb': baseline_kb, 'peak_kb': peak_kb, 'peak_over_baseline_kb': peak_kb - baseline_kb }
+
+
+def main( ):
+	parser = argparse.ArgumentParser( description = __doc__.strip( ).splitlines( )[ 0 ] )
+	parser.add_argument( '--verts', type = int, default = 200000 )
+	parser.add_argument( '--bones', type = int, default = 150 )
+	parser.add_argument( '--influences', type = int, default = 4 )
+	parser.add_argument( '--case', choices = CASES, help = 'Run one case in this process, used internally.' )
+	parser.add_argument( '--file', help = 'Data file the case reads or writes, used internally.' )
+	args = parser.parse_args( )
+
+	if args.case:
+		print json.dumps( run_case( args.case, args.file, args.verts, args.bones, args.influences ) )
+		return
+
+	file_path = os.path.join( tempfile.mkdtemp( prefix = 'skonverter_bench_' ), 'weights.json' )
+	results = [ ]
+	for case in CASES:
+		output = subprocess.check_output( [ sys.executable, os.path.abspath( __file__ ), '--case', case, '--file', file_path,
+		                                    '--verts', str( args.verts ), '--bones', str( args.bones ), '--influences', str( args.influences ) ] )
+		result = json.loads( output.strip( ).splitlines( )[ -1 ] )
+		result[ 'file_bytes' ] = os.path.getsize( file_path )
+		results.append( result )
+
+	print json.dumps( { 'benchmark': 'json_io', 'verts': args.verts, 'bones': args.bones, 'influences': args.influences, 'results': results }, indent = 2 )
+
+
+if __name__ == '__main__':
+	main( )
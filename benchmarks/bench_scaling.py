@@ -0,0 +1,151 @@
+"""
+Benchmarks how the weight accumulation, normalization and skinPercent application scale with vertex count.
+
+The legacy case is the original determine_weighting accumulation, which checked "vert_id_string not in weight_data.keys( )" for
+every vertex of every bone and so grew quadratically. The table case is the Weight_Table path determine_weighting uses now.
+The skinpercent case runs apply_weighting( method = 'skinpercent' ) against the fake Maya and counts the commands it makes.
+
+For each case the report holds the timings per size and the fitted exponent of time ~ verts ** exponent ( ~1 linear, ~2 quadratic ).
+
+	python benchmarks/bench_scaling.py --sizes 1000,2000,4000,8000,16000 --bones 20
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import argparse
+import json
+import os
+import sys
+import time
+
+# The package modules import each other by bare name, so the package folder itself goes on the path.
+BENCHMARK_PATH = os.path.dirname( os.path.abspath( __file__ ) )
+PACKAGE_PATH = os.path.dirname( BENCHMARK_PATH )
+sys.path.insert( 0, BENCHMARK_PATH )
+sys.path.insert( 0, PACKAGE_PATH )
+
+# Skonverter module imports
+import fake_maya
+
+LEGACY_LIMIT = 16000 # The legacy case takes minutes past this
+
+
+def make_bone_weights( vertex_count, bone_count ):
+	"""
+	Builds per bone ( vert_ids, weights ) arrays shaped like the probes' output. Each bone moves an overlapping band of the verts.
+	"""
+	random = numpy.random.RandomState( vertex_count )
+	band = max( 1, 2 * vertex_count // bone_count )
+	bone_weights = [ ]
+	for bone_index in range( bone_count ):
+		start = bone_index * vertex_count // bone_count
+		vert_ids = numpy.arange( start, min( vertex_count, start + band ) )
+		bone_weights.append( ( 'joint_{0}'.format( bone_index ), vert_ids, numpy.round( random.uniform( 0.001, 1.0, len( vert_ids ) ), 3 ) ) )
+	return bone_weights
+
+
+def run_legacy( methods, vertex_count, bone_weights ):
+	"""
+	The original accumulation and normalization loops, kept here as the baseline.
+	"""
+	weight_data = { }
+	for bone_name, vert_ids, weights in bone_weights:
+		for vert_id, weight in zip( vert_ids.tolist( ), weights.tolist( ) ):
+			vert_id_string = str( vert_id )
+			if vert_id_string not in weight_data.keys( ):
+				weight_data[ vert_id_string ] = [ ]
+			weight_data[ vert_id_string ].append( ( bone_name, weight ) )
+
+	for vert_id_string in weight_data.keys( ):
+		weight_data[ vert_id_string ], message = methods.normalize_vertex_weighting( weight_data[ vert_id_string ] )
+	return weight_data
+
+
+def run_table( weights, vertex_count, bone_weights ):
+	"""
+	The Weight_Table accumulation and normalization determine_weighting uses.
+	"""
+	weight_table = weights.Weight_Table( vertex_count )
+	for bone_name, vert_ids, bone_values in bone_weights:
+		weight_table.add_bone( bone_name, vert_ids, bone_values )
+	weight_table.build( )
+	weight_table.normalize( )
+	return weight_table.to_weight_dict( )
+
+
+def run_skinpercent( vertex_count, bone_count ):
+	"""
+	Applies converted weights to a fake skinned cylinder through skinPercent. Returns ( seconds, command_count ).
+	"""
+	scene = fake_maya.install( fake_maya.build_skinned_cylinder( vertex_count = vertex_count, joint_count = bone_count ) )
+	import methods
+	mesh = scene.meshes[ 'mesh' ]
+	data = { 'order': list( scene.joint_order ), 'weight': { } }
+	for vert_id, ( joint_indices, joint_weights ) in enumerate( zip( mesh.joint_index.tolist( ), mesh.joint_weight.tolist( ) ) ):
+		data[ 'weight' ][ str( vert_id ) ] = [ ( scene.joint_order[ joint ], weight ) for joint, weight in zip( joint_indices, joint_weights ) if weight ]
+
+	scene.command_count = 0
+	start = time.time( )
+	methods.apply_weighting( 'mesh', data = data, method = 'skinpercent' )
+	return time.time( ) - start, scene.command_count
+
+
+def fit_exponent( sizes, seconds ):
+	"""
+	Slope of log( seconds ) against log( size ).
+	"""
+	if len( sizes ) < 2:
+		return None
+	return float( numpy.polyfit( numpy.log( sizes ), numpy.log( numpy.maximum( seconds, 1e-6 ) ), 1 )[ 0 ] )
+
+
+def main( ):
+	parser = argparse.ArgumentParser( description = __doc__.strip( ).splitlines( )[ 0 ] )
+	parser.add_argument( '--sizes', default = '1000,2000,4000,8000,16000' )
+	parser.add_argument( '--bones', type = int, default = 20 )
+	parser.add_argument( '--legacy-limit', type = int, default = LEGACY_LIMIT, help = 'Skip the legacy case above this many verts.' )
+	args = parser.parse_args( )
+	sizes = [ int( size ) for size in args.sizes.split( ',' ) if size ]
+
+	# The fake has to be in place before methods gets imported
+	fake_maya.install( fake_maya.Fake_Scene( ) )
+	import methods
+	import weights
+
+	cases = { 'legacy': [ ], 'table': [ ], 'skinpercent': [ ] }
+	devnull = open( os.devnull, 'w' )
+	for vertex_count in sizes:
+		bone_weights = make_bone_weights( vertex_count, args.bones )
+
+		if vertex_count <= args.legacy_limit:
+			start = time.time( )
+			run_legacy( methods, vertex_count, bone_weights )
+			cases[ 'legacy' ].append( { 'verts': vertex_count, 'seconds': time.time( ) - start } )
+
+		start = time.time( )
+		run_table( weights, vertex_count, bone_weights )
+		cases[ 'table' ].append( { 'verts': vertex_count, 'seconds': time.time( ) - start } )
+
+		stdout, sys.stdout = sys.stdout, devnull
+		try:
+			seconds, command_count = run_skinpercent( vertex_count, args.bones )
+		finally:
+			sys.stdout = stdout
+		cases[ 'skinpercent' ].append( { 'verts': vertex_count, 'seconds': seconds, 'commands': command_count } )
+		sys.stderr.write( 'Skonverter Benchmark : {0} verts done\n'.format( vertex_count ) )
+
+	report = { 'benchmark': 'scaling', 'bones': args.bones, 'cases': { } }
+	for name, results in cases.iteritems( ):
+		report[ 'cases' ][ name ] = {
+			'results'  : results,
+			'exponent' : fit_exponent( [ result[ 'verts' ] for result in results ], [ result[ 'seconds' ] for result in results ] ),
+		}
+	print json.dumps( report, indent = 2, sort_keys = True )
+
+
+if __name__ == '__main__':
+	main( )
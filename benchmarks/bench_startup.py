@@ -0,0 +1,118 @@
+"""
+Benchmarks how long importing the package takes, and checks the headless import leaves pymel and PySide alone.
+
+Every run imports the package in a fresh process. By default the fake Maya backend stands in for Maya, with pymel and PySide made
+unimportable, so a stray import shows up as a failure rather than a slow import. Run it under mayapy with --real to time it
+against the real modules, after maya.standalone is up.
+
+	python benchmarks/bench_startup.py --runs 10
+	mayapy benchmarks/bench_startup.py --runs 10 --real
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+BENCHMARK_PATH = os.path.dirname( os.path.abspath( __file__ ) )
+PACKAGE_PATH = os.path.dirname( BENCHMARK_PATH )
+GUI_MODULES = ( 'pymel', 'PySide' ) # Only the UI should need these
+
+
+class Import_Blocker( object ):
+	"""
+	Meta path finder that refuses the gui modules and remembers who asked, so the headless import can't quietly pull them in.
+	"""
+	def __init__( self ):
+		self.attempts = [ ]
+
+	def find_module( self, name, path = None ):
+		if name.split( '.' )[ 0 ] in GUI_MODULES:
+			self.attempts.append( name )
+			return self
+		return None
+
+	def load_module( self, name ):
+		raise ImportError( '{0} is blocked by the startup benchmark'.format( name ) )
+
+
+def run_single( real ):
+	"""
+	Imports the package in this process and returns the result dictionary.
+	"""
+	blocker = None
+	if real:
+		import maya.standalone
+		maya.standalone.initialize( name = 'python' )
+	else:
+		sys.path.insert( 0, BENCHMARK_PATH )
+		import fake_maya
+		fake_maya.install( fake_maya.Fake_Scene( ) )
+		for name in list( sys.modules ):
+			if name.split( '.' )[ 0 ] in GUI_MODULES:
+				del sys.modules[ name ]
+		blocker = Import_Blocker( )
+		sys.meta_path.insert( 0, blocker )
+
+	# The package is imported the way users do, as the package folder under its parent
+	sys.path.insert( 0, os.path.dirname( PACKAGE_PATH ) )
+	modules_before = set( sys.modules )
+	start = timeit.default_timer( )
+	error = None
+	try:
+		importlib.import_module( os.path.basename( PACKAGE_PATH ) )
+	except ImportError as exception:
+		error = str( exception )
+	seconds = timeit.default_timer( ) - start
+
+	loaded = set( sys.modules ) - modules_before
+	result = {
+		'seconds'     : seconds,
+		'new_modules' : len( [ name for name in loaded if sys.modules[ name ] is not None ] ),
+		'gui_loaded'  : sorted( name for name in loaded if name.split( '.' )[ 0 ] in GUI_MODULES and sys.modules[ name ] is not None ),
+		'error'       : error,
+	}
+	if blocker:
+		result[ 'gui_attempts' ] = sorted( set( blocker.attempts ) )
+	return result
+
+
+def main( ):
+	parser = argparse.ArgumentParser( description = __doc__.strip( ).splitlines( )[ 0 ] )
+	parser.add_argument( '--runs', type = int, default = 5 )
+	parser.add_argument( '--real', action = 'store_true', help = 'Import against the real Maya modules, run with mayapy.' )
+	parser.add_argument( '--single', action = 'store_true', help = 'Run one import in this process, used internally.' )
+	args = parser.parse_args( )
+
+	if args.single:
+		print json.dumps( run_single( args.real ) )
+		return
+
+	results = [ ]
+	for _ in range( args.runs ):
+		command = [ sys.executable, os.path.abspath( __file__ ), '--single' ] + ( [ '--real' ] if args.real else [ ] )
+		output = subprocess.check_output( command )
+		results.append( json.loads( output.strip( ).splitlines( )[ -1 ] ) )
+
+	seconds = sorted( result[ 'seconds' ] for result in results )
+	report = {
+		'benchmark'      : 'startup',
+		'backend'        : 'maya' if args.real else 'fake',
+		'runs'           : len( results ),
+		'median_seconds' : seconds[ len( seconds ) // 2 ],
+		'min_seconds'    : seconds[ 0 ],
+		'max_seconds'    : seconds[ -1 ],
+		'headless'       : all( not result[ 'gui_loaded' ] and not result.get( 'gui_attempts' ) and not result[ 'error' ] for result in results ),
+		'results'        : results,
+	}
+	print json.dumps( report, indent = 2, sort_keys = True )
+
+
+if __name__ == '__main__':
+	main( )
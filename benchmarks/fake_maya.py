@@ -0,0 +1,691 @@
+"""
+Pure python / numpy stand in for the parts of maya.cmds, OpenMaya ( 1.0 and 2.0 ), OpenMayaAnim and pymel that Skonverter uses.
+
+The scene is a hierarchy of translate only joints and meshes deformed by linear blend skinning, which is exactly what the
+converter's probing assumes, so converting a fake mesh should give back its ground truth weights.
+
+	import fake_maya
+	scene = fake_maya.build_skinned_cylinder( vertex_count = 10000, joint_count = 50 )
+	fake_maya.install( scene ) # Must happen before any Skonverter module is imported
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import re
+import sys
+import types
+
+
+_scene = None # The scene every fake module works against, set by install( )
+
+
+class Fake_Scene( object ):
+	"""
+	Holds the joints, meshes and skin clusters of the fake scene.
+	"""
+	def __init__( self ):
+		self.joints = { }         # name : Fake_Joint
+		self.joint_order = [ ]    # names in creation order, the column order of every skin's joint_index
+		self.meshes = { }         # name : Fake_Mesh
+		self.skin_clusters = { }  # name : Fake_Skin_Cluster
+		self.command_count = 0    # maya.cmds calls, handy to see how chatty a stage is
+		self.undo_state = True
+		self.undo_chunks = 0      # Open undo chunks
+		self.undo_queue = 0       # Commands recorded while undo was on
+		self.refresh_suspended = False
+
+	def add_joint( self, name, parent = None, translation = ( 0, 0, 0 ) ):
+		"""
+		Adds a joint. translation is local to the parent, joints have no rotation so world space is just the sum down the chain.
+		"""
+		joint = Fake_Joint( name, parent, translation )
+		self.joints[ name ] = joint
+		self.joint_order.append( name )
+		if parent:
+			self.joints[ parent ].children.append( name )
+		joint.rest_world = self.get_world_translation( name )
+		return joint
+
+	def get_world_translation( self, name ):
+		joint = self.joints[ name ]
+		world = joint.translation.copy( )
+		while joint.parent:
+			joint = self.joints[ joint.parent ]
+			world += joint.translation
+		return world
+
+	def set_world_translation( self, name, world ):
+		joint = self.joints[ name ]
+		parent_world = self.get_world_translation( joint.parent ) if joint.parent else numpy.zeros( 3 )
+		joint.translation = numpy.asarray( world, dtype = numpy.float64 ) - parent_world
+		self.dirty( )
+
+	def dirty( self ):
+		for mesh in self.meshes.values( ):
+			mesh.evaluated = None
+
+	def get_joint_deltas( self ):
+		"""
+		Returns a ( joint_count, 3 ) array of how far each joint is from its rest world position.
+		"""
+		return numpy.array( [ self.get_world_translation( name ) - self.joints[ name ].rest_world for name in self.joint_order ] ).reshape( -1, 3 )
+
+	def get_node_type( self, name ):
+		name = short_name( name )
+		if name in self.joints:
+			return 'joint'
+		if name in self.meshes:
+			return 'mesh'
+		if name in self.skin_clusters:
+			return 'skinCluster'
+		return None
+
+
+class Fake_Joint( object ):
+	def __init__( self, name, parent, translation ):
+		self.name = name
+		self.parent = parent
+		self.children = [ ]
+		self.translation = numpy.array( translation, dtype = numpy.float64 )
+		self.rest_world = None
+
+
+class Fake_Mesh( object ):
+	"""
+	A mesh skinned with up to K influences per vertex. joint_index / joint_weight are ( N, K ) arrays into scene.joint_order.
+	"""
+	def __init__( self, scene, name, rest_points, polygon_counts, polygon_connects, joint_index, joint_weight ):
+		self.scene = scene
+		self.name = name
+		self.rest_points = numpy.asarray( rest_points, dtype = numpy.float64 )
+		self.polygon_counts = polygon_counts
+		self.polygon_connects = polygon_connects
+		self.joint_index = joint_index
+		self.joint_weight = joint_weight
+		self.evaluated = None
+		self.raw_points = None
+		self.evaluation_count = 0
+
+	def evaluate( self ):
+		"""
+		Returns the deformed points, recalculated only when a joint moved since the last call.
+		"""
+		if self.evaluated is None:
+			deltas = self.scene.get_joint_deltas( )
+			points = self.rest_points.copy( )
+			for column in range( self.joint_index.shape[ 1 ] ):
+				points += self.joint_weight[ :, column, None ] * deltas[ self.joint_index[ :, column ] ]
+			self.evaluated = points
+			self.evaluation_count += 1
+		return self.evaluated
+
+	def get_ground_truth( self ):
+		"""
+		Returns { vert_id : { joint_name : weight } } for the non zero weights.
+		"""
+		truth = { }
+		for vert_id in xrange( len( self.rest_points ) ):
+			truth[ vert_id ] = dict( ( self.scene.joint_order[ joint ], weight ) for joint, weight in zip( self.joint_index[ vert_id ], self.joint_weight[ vert_id ] ) if weight )
+		return truth
+
+
+class Fake_Skin_Cluster( object ):
+	"""
+	Receives weights written by the application stage. Weights are a dense ( N, influences ) float32 array.
+
+	failing_writes holds the setWeights attempt numbers ( counting from 0 ) that raise a RuntimeError instead of writing, for
+	testing failed blocks.
+	"""
+	def __init__( self, name, mesh_name, influences, vertex_count ):
+		self.name = name
+		self.mesh_name = mesh_name
+		self.influences = list( influences )
+		self.weights = numpy.zeros( ( vertex_count, len( influences ) ), dtype = numpy.float32 )
+		self.normalize_weights = 1
+		self.write_calls = 0
+		self.write_attempts = 0
+		self.failing_writes = set( )
+
+
+def short_name( name ):
+	return str( name ).split( '|' )[ -1 ].split( '.' )[ 0 ]
+
+
+###########################
+## Synthetic test scenes ##
+###########################
+
+def build_skinned_cylinder( vertex_count = 10000, joint_count = 50, influences = 2, height = 100.0, radius = 5.0, scene = None, mesh_name = 'mesh',
+                            skeleton_name = None ):
+	"""
+	Builds a cylinder mesh along +Y, a straight joint chain running up its middle and linear blend weights between the
+	nearest joints, plus a skin cluster on the mesh for the application stage. Returns the scene.
+
+	The joints are named after skeleton_name ( defaults to mesh_name ), meshes built into one scene with the same skeleton_name share them.
+
+	Ground truth weights are rounded to 3 decimals, the precision the converter works at, so a perfect conversion matches exactly.
+	"""
+	scene = scene or Fake_Scene( )
+	segments = max( 3, int( round( vertex_count ** 0.5 ) ) )
+	rings = max( 2, vertex_count // segments )
+
+	# Points, ring by ring up the cylinder
+	ring_heights = numpy.linspace( 0.0, height, rings )
+	angles = numpy.linspace( 0.0, 2 * numpy.pi, segments, endpoint = False )
+	points = numpy.zeros( ( rings * segments, 3 ) )
+	points[ :, 0 ] = numpy.tile( numpy.cos( angles ) * radius, rings )
+	points[ :, 1 ] = numpy.repeat( ring_heights, segments )
+	points[ :, 2 ] = numpy.tile( numpy.sin( angles ) * radius, rings )
+
+	# Quads between neighbouring rings
+	ring = numpy.arange( rings - 1 )[ :, None ] * segments
+	segment = numpy.arange( segments )[ None, : ]
+	next_segment = ( segment + 1 ) % segments
+	quads = numpy.stack( [ ring + segment, ring + next_segment, ring + segments + next_segment, ring + segments + segment ], axis = -1 ).reshape( -1, 4 )
+	polygon_counts = [ 4 ] * len( quads )
+	polygon_connects = quads.ravel( ).tolist( )
+
+	# Joint chain, evenly spaced
+	joint_names = [ '{0}_joint_{1}'.format( skeleton_name or mesh_name, index ) for index in range( joint_count ) ]
+	if joint_names[ 0 ] not in scene.joints:
+		spacing = height / max( 1, joint_count - 1 )
+		for index, joint_name in enumerate( joint_names ):
+			scene.add_joint( joint_name, parent = joint_names[ index - 1 ] if index else None, translation = ( 0, 0 if not index else spacing, 0 ) )
+	joint_heights = numpy.array( [ scene.joints[ name ].rest_world[ 1 ] for name in joint_names ] )
+	joint_columns = numpy.array( [ scene.joint_order.index( name ) for name in joint_names ] )
+
+	# Weights fall off with distance along the chain over the nearest few joints. The chain is sorted by height, so only the
+	# joints either side of each point need checking rather than all of them.
+	influences = min( influences, joint_count )
+	above = numpy.searchsorted( joint_heights, points[ :, 1 ] )
+	candidates = numpy.clip( above[ :, None ] + numpy.arange( -influences, influences )[ None, : ], 0, joint_count - 1 )
+	distances = numpy.abs( points[ :, 1, None ] - joint_heights[ candidates ] )
+	distances[ :, 1: ][ candidates[ :, 1: ] == candidates[ :, :-1 ] ] = numpy.inf # Clipping repeats the end joints
+	rows = numpy.arange( len( points ) )[ :, None ]
+	order = numpy.argsort( distances, axis = 1 )[ :, :influences ]
+	nearest = candidates[ rows, order ]
+	falloff = 1.0 / ( distances[ rows, order ] + 1e-3 )
+	joint_weight = round_weights( falloff / falloff.sum( axis = 1, keepdims = True ) )
+
+	scene.meshes[ mesh_name ] = Fake_Mesh( scene, mesh_name, points, polygon_counts, polygon_connects, joint_columns[ nearest ], joint_weight )
+	scene.skin_clusters[ mesh_name + '_skinCluster' ] = Fake_Skin_Cluster( mesh_name + '_skinCluster', mesh_name, joint_names, len( points ) )
+	return scene
+
+
+def round_weights( weights ):
+	"""
+	Rounds each row to 3 decimals while keeping it summed to 1.0, the rounding error goes to the largest weight.
+	"""
+	rounded = numpy.round( weights, 3 )
+	largest = numpy.argmax( rounded, axis = 1 )
+	rows = numpy.arange( len( rounded ) )
+	rounded[ rows, largest ] += 1.0 - rounded.sum( axis = 1 )
+	return numpy.round( rounded, 3 )
+
+
+###############
+## maya.cmds ##
+###############
+
+def _flag( kwargs, *names ):
+	for name in names:
+		if name in kwargs:
+			return kwargs[ name ]
+	return None
+
+
+def _record_undo( ):
+	"""
+	Edits land in the undo queue while undo is on, queries don't.
+	"""
+	if _scene.undo_state:
+		_scene.undo_queue += 1
+
+
+def xform( name, **kwargs ):
+	_scene.command_count += 1
+	name = short_name( name )
+	if _flag( kwargs, 'query', 'q' ):
+		if _flag( kwargs, 'matrix', 'm' ):
+			world = _scene.get_world_translation( name )
+			return [ 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, world[ 0 ], world[ 1 ], world[ 2 ], 1.0 ]
+		if _flag( kwargs, 'worldSpace', 'ws' ):
+			return _scene.get_world_translation( name ).tolist( )
+		return _scene.joints[ name ].translation.tolist( )
+
+	translation = _flag( kwargs, 'translation', 't' )
+	if translation is not None:
+		_record_undo( )
+		if _flag( kwargs, 'worldSpace', 'ws' ):
+			_scene.set_world_translation( name, translation )
+		else:
+			_scene.joints[ name ].translation = numpy.array( translation, dtype = numpy.float64 )
+			_scene.dirty( )
+
+
+def listHistory( name, **kwargs ):
+	_scene.command_count += 1
+	name = short_name( name )
+	return [ name ] + [ cluster.name for cluster in _scene.skin_clusters.values( ) if cluster.mesh_name == name ]
+
+
+def listRelatives( name, children = False, parent = False, type = None, **kwargs ):
+	_scene.command_count += 1
+	name = short_name( name )
+	if children and name in _scene.joints:
+		return list( _scene.joints[ name ].children ) or None
+	if parent and name in _scene.joints and _scene.joints[ name ].parent:
+		return [ _scene.joints[ name ].parent ]
+	return None
+
+
+def objExists( name ):
+	_scene.command_count += 1
+	return _scene.get_node_type( short_name( name ) ) is not None
+
+
+def setAttr( attribute, value, **kwargs ):
+	_scene.command_count += 1
+	_record_undo( )
+	name, attribute_name = short_name( attribute.split( '.' )[ 0 ] ), attribute.split( '.', 1 )[ 1 ]
+	if attribute_name == 'normalizeWeights' and name in _scene.skin_clusters:
+		_scene.skin_clusters[ name ].normalize_weights = value
+	else:
+		raise RuntimeError( 'setAttr: {0} is not supported by the fake scene'.format( attribute ) )
+
+
+def nodeType( name, **kwargs ):
+	_scene.command_count += 1
+	return _scene.get_node_type( short_name( name ) ) or 'transform'
+
+
+def ls( names = None, type = None, **kwargs ):
+	_scene.command_count += 1
+	names = names or [ ]
+	return [ name for name in names if type is None or _scene.get_node_type( name ) == type ]
+
+
+VTX_PATTERN = re.compile( r'\.vtx\[(\d+)(?::(\d+))?\]' )
+
+
+def skinPercent( skincluster, *components, **kwargs ):
+	_scene.command_count += 1
+	_record_undo( )
+	cluster = _scene.skin_clusters[ short_name( skincluster ) ]
+	vert_ids = [ ]
+	for component in components:
+		match = VTX_PATTERN.search( str( component ) )
+		start = int( match.group( 1 ) )
+		end = int( match.group( 2 ) ) if match.group( 2 ) else start
+		vert_ids.extend( range( start, end + 1 ) )
+
+	for bone_name, weight in ( kwargs.get( 'tv' ) or kwargs.get( 'transformValue' ) or [ ] ):
+		if bone_name not in cluster.influences:
+			raise RuntimeError( 'Invalid influence: {0}'.format( bone_name ) )
+		cluster.weights[ vert_ids, cluster.influences.index( bone_name ) ] = weight
+	cluster.write_calls += 1
+
+
+def undoInfo( query = False, state = None, stateWithoutFlush = None, openChunk = False, closeChunk = False, **kwargs ):
+	if query:
+		return _scene.undo_state
+	if state is not None:
+		_scene.undo_state = state
+		if not state:
+			_scene.undo_queue = 0
+	if stateWithoutFlush is not None:
+		_scene.undo_state = stateWithoutFlush
+	if openChunk:
+		_scene.undo_chunks += 1
+	if closeChunk:
+		if not _scene.undo_chunks:
+			raise RuntimeError( 'No undo chunk is open' )
+		_scene.undo_chunks -= 1
+
+
+def refresh( suspend = None, **kwargs ):
+	if suspend is not None:
+		_scene.refresh_suspended = suspend
+
+
+def warning( message ):
+	print 'Warning: {0}'.format( message )
+
+
+######################
+## OpenMaya ( 2.0 ) ##
+######################
+
+class MFn( object ):
+	kMeshVertComponent = 'kMeshVertComponent'
+
+
+class MSpace( object ):
+	kObject = 'kObject'
+	kWorld = 'kWorld'
+	kTransform = 'kTransform'
+
+
+class Fake_Dag_Path( object ):
+	def __init__( self, name ):
+		self.name = short_name( name )
+
+	def partialPathName( self ):
+		return self.name
+
+	def fullPathName( self ):
+		return '|' + self.name
+
+
+class MSelectionList( object ):
+	def __init__( self ):
+		self.names = [ ]
+
+	def add( self, name ):
+		name = short_name( name )
+		if _scene.get_node_type( name ) is None:
+			raise RuntimeError( '( kInvalidParameter ): Object does not exist : {0}'.format( name ) )
+		self.names.append( name )
+		return self
+
+	def getDagPath( self, index ):
+		return Fake_Dag_Path( self.names[ index ] )
+
+	def getDependNode( self, index ):
+		return Fake_Dag_Path( self.names[ index ] )
+
+
+class MVector( object ):
+	__slots__ = ( 'x', 'y', 'z' )
+
+	def __init__( self, x = 0.0, y = 0.0, z = 0.0 ):
+		if isinstance( x, ( list, tuple, MVector ) ):
+			x, y, z = x[ 0 ], x[ 1 ], x[ 2 ]
+		self.x, self.y, self.z = x, y, z
+
+	def __getitem__( self, index ):
+		return ( self.x, self.y, self.z )[ index ]
+
+	def __len__( self ):
+		return 3
+
+
+class MFnTransform( object ):
+	"""
+	Translation only, like the rest of the fake scene.
+	"""
+	def __init__( self, dag_path ):
+		self.name = dag_path.name
+
+	def translation( self, space ):
+		if space == MSpace.kWorld:
+			return MVector( _scene.get_world_translation( self.name ).tolist( ) )
+		return MVector( _scene.joints[ self.name ].translation.tolist( ) )
+
+	def setTranslation( self, vector, space ):
+		if space == MSpace.kWorld:
+			_scene.set_world_translation( self.name, list( vector ) )
+		else:
+			_scene.joints[ self.name ].translation = numpy.array( list( vector ), dtype = numpy.float64 )
+			_scene.dirty( )
+		return self
+
+	def translateBy( self, vector, space ):
+		# Without rotations or scales, a world space offset is the same offset in every space
+		_scene.joints[ self.name ].translation = _scene.joints[ self.name ].translation + numpy.array( list( vector ), dtype = numpy.float64 )
+		_scene.dirty( )
+		return self
+
+
+class MPoint( object ):
+	__slots__ = ( 'x', 'y', 'z', 'w' )
+
+	def __init__( self, x = 0.0, y = 0.0, z = 0.0, w = 1.0 ):
+		self.x, self.y, self.z, self.w = x, y, z, w
+
+	def __getitem__( self, index ):
+		return ( self.x, self.y, self.z, self.w )[ index ]
+
+	def __len__( self ):
+		return 4
+
+	def __eq__( self, other ):
+		return ( self.x, self.y, self.z, self.w ) == ( other[ 0 ], other[ 1 ], other[ 2 ], other[ 3 ] )
+
+	def __ne__( self, other ):
+		return not self == other
+
+
+class MFnMesh( object ):
+	def __init__( self, dag_path ):
+		self.mesh = _scene.meshes[ dag_path.name ]
+
+	@property
+	def numVertices( self ):
+		return len( self.mesh.rest_points )
+
+	def getPoints( self, space = None ):
+		return [ MPoint( x, y, z ) for x, y, z in self.mesh.evaluate( ).tolist( ) ]
+
+	def getVertices( self ):
+		return list( self.mesh.polygon_counts ), list( self.mesh.polygon_connects )
+
+	def syncObject( self ):
+		return self
+
+
+class Fake_Component( object ):
+	def __init__( self ):
+		self.elements = [ ]
+
+
+class MFnSingleIndexedComponent( object ):
+	def __init__( self, component = None ):
+		self.component = component
+
+	def create( self, component_type ):
+		self.component = Fake_Component( )
+		return self.component
+
+	def addElements( self, elements ):
+		self.component.elements.extend( elements )
+		return self
+
+	def getElements( self ):
+		return list( self.component.elements )
+
+
+def MIntArray( values = None ):
+	return list( values or [ ] )
+
+
+def MDoubleArray( values = None ):
+	return list( values or [ ] )
+
+
+class MFnSkinCluster( object ):
+	def __init__( self, mobject ):
+		self.cluster = _scene.skin_clusters[ mobject.name ]
+
+	def indexForOutputConnection( self, connection_index ):
+		return 0
+
+	def getPathAtIndex( self, index ):
+		return Fake_Dag_Path( self.cluster.mesh_name )
+
+	def influenceObjects( self ):
+		return [ Fake_Dag_Path( name ) for name in self.cluster.influences ]
+
+	def setWeights( self, shape_path, components, influences, weights, normalize = True, returnOldWeights = False ):
+		attempt = self.cluster.write_attempts
+		self.cluster.write_attempts += 1
+		if attempt in self.cluster.failing_writes:
+			raise RuntimeError( '(kFailure): Unexpected Internal Failure' )
+		vert_ids = numpy.asarray( components.elements, dtype = numpy.int64 )
+		block = numpy.asarray( weights, dtype = numpy.float32 ).reshape( len( vert_ids ), len( influences ) )
+		self.cluster.weights[ vert_ids[ :, None ], numpy.asarray( influences )[ None, : ] ] = block
+		self.cluster.write_calls += 1
+
+	def getWeights( self, shape_path, components, influences = None ):
+		vert_ids = numpy.asarray( components.elements, dtype = numpy.int64 )
+		if influences is None:
+			return self.cluster.weights[ vert_ids ].astype( numpy.float64 ).ravel( ).tolist( ), len( self.cluster.influences )
+		return self.cluster.weights[ vert_ids[ :, None ], numpy.asarray( influences )[ None, : ] ].astype( numpy.float64 ).ravel( ).tolist( )
+
+
+######################
+## OpenMaya ( 1.0 ) ##
+######################
+
+class Fake_Pointer( object ):
+	"""
+	Stands in for the swig float pointer getRawPoints returns, int( ) gives the address.
+	"""
+	def __init__( self, array ):
+		self.array = array
+
+	def __int__( self ):
+		return self.array.ctypes.data
+
+
+class MDagPath1( object ):
+	def __init__( self ):
+		self.name = None
+
+
+class MSelectionList1( object ):
+	def __init__( self ):
+		self.names = [ ]
+
+	def add( self, name ):
+		if _scene.get_node_type( name ) is None:
+			raise RuntimeError( 'Object does not exist : {0}'.format( name ) )
+		self.names.append( short_name( name ) )
+
+	def getDagPath( self, index, dag_path ):
+		dag_path.name = self.names[ index ]
+
+
+class MFnMesh1( object ):
+	def __init__( self, dag_path ):
+		self.mesh = _scene.meshes[ dag_path.name ]
+
+	def getRawPoints( self ):
+		# Maya keeps the evaluated points as floats, hand out a pointer to a float32 copy that lives on the mesh.
+		self.mesh.raw_points = numpy.ascontiguousarray( self.mesh.evaluate( ), dtype = numpy.float32 )
+		return Fake_Pointer( self.mesh.raw_points )
+
+	def syncObject( self ):
+		return self
+
+
+###########
+## pymel ##
+###########
+
+class MayaNodeError( Exception ):
+	pass
+
+
+class PyNode( object ):
+	def __new__( cls, name ):
+		if isinstance( name, PyNode ):
+			return name
+		node_type = _scene.get_node_type( name )
+		if node_type is None:
+			raise MayaNodeError( 'No object matches name: {0}'.format( name ) )
+		node_class = { 'joint': Joint, 'mesh': Transform, 'skinCluster': SkinCluster }[ node_type ]
+		node = object.__new__( node_class )
+		node._name = short_name( name )
+		return node
+
+	def name( self ):
+		return self._name
+
+	def __str__( self ):
+		return self._name
+
+	def __add__( self, other ):
+		return self._name + other
+
+	def __eq__( self, other ):
+		return str( self ) == str( other )
+
+	def __ne__( self, other ):
+		return not self == other
+
+	def __hash__( self ):
+		return hash( self._name )
+
+
+class DagNode( PyNode ):
+	def getChildren( self ):
+		return [ ]
+
+
+class Transform( DagNode ):
+	pass
+
+
+class Joint( Transform ):
+	def getChildren( self ):
+		return [ PyNode( name ) for name in _scene.joints[ self._name ].children ]
+
+
+class SkinCluster( PyNode ):
+	def setNormalizeWeights( self, value ):
+		_scene.skin_clusters[ self._name ].normalize_weights = value
+
+
+##################
+## Installation ##
+##################
+
+def install( scene ):
+	"""
+	Points the fake modules at scene and registers them in sys.modules. Safe to call again to swap scenes.
+	"""
+	global _scene
+	_scene = scene
+
+	this_module = sys.modules[ __name__ ]
+	modules = { }
+	for name in [ 'maya', 'maya.cmds', 'maya.api', 'maya.api.OpenMaya', 'maya.api.OpenMayaAnim', 'maya.OpenMaya', 'pymel', 'pymel.core', 'pymel.core.nodetypes' ]:
+		modules[ name ] = sys.modules.get( name ) if isinstance( sys.modules.get( name ), types.ModuleType ) and getattr( sys.modules[ name ], '_fake', False ) else types.ModuleType( name )
+		modules[ name ]._fake = True
+
+	cmds = modules[ 'maya.cmds' ]
+	for command in ( xform, listHistory, listRelatives, ls, nodeType, objExists, setAttr, skinPercent, undoInfo, refresh, warning ):
+		setattr( cmds, command.__name__, command )
+
+	om2 = modules[ 'maya.api.OpenMaya' ]
+	for name in ( 'MFn', 'MSpace', 'MSelectionList', 'MPoint', 'MVector', 'MFnMesh', 'MFnTransform', 'MFnSingleIndexedComponent', 'MIntArray', 'MDoubleArray' ):
+		setattr( om2, name, getattr( this_module, name ) )
+	modules[ 'maya.api.OpenMayaAnim' ].MFnSkinCluster = MFnSkinCluster
+
+	om1 = modules[ 'maya.OpenMaya' ]
+	om1.MSelectionList = MSelectionList1
+	om1.MDagPath = MDagPath1
+	om1.MFnMesh = MFnMesh1
+
+	nodetypes = modules[ 'pymel.core.nodetypes' ]
+	for node_class in ( DagNode, Transform, Joint, SkinCluster ):
+		setattr( nodetypes, node_class.__name__, node_class )
+	core = modules[ 'pymel.core' ]
+	core.PyNode = PyNode
+	core.MayaNodeError = MayaNodeError
+	core.nodetypes = nodetypes
+	core.warning = warning
+
+	# Wire up the package attributes so "import maya.cmds" style imports resolve
+	for name, module in modules.iteritems( ):
+		sys.modules[ name ] = module
+		if '.' in name:
+			parent, child = name.rsplit( '.', 1 )
+			setattr( modules[ parent ], child, module )
+
+	return scene
@@ -0,0 +1,272 @@
+"""
+Benchmarks the converter end to end on synthetic skinned cylinders, against the fake Maya in fake_maya.py.
+
+Times determine_weighting, normalize_vertex_weighting, apply_weighting and the data file save / load for each mesh size, and checks
+the weights against the ground truth the meshes were skinned with. Prints ( or writes ) a json report meant to be diffed between revisions.
+
+	python benchmarks/run_benchmarks.py --sizes 1000x10,20000x50,100000x150 --output report.json
+
+Each size runs in its own process so its peak memory ( ru_maxrss ) isn't muddied by the one before it. Peaks are recorded after
+every stage and only ever go up, so a stage's own cost is how much it raised the peak.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# The package modules import each other by bare name, so the package folder itself goes on the path.
+BENCHMARK_PATH = os.path.dirname( os.path.abspath( __file__ ) )
+PACKAGE_PATH = os.path.dirname( BENCHMARK_PATH )
+sys.path.insert( 0, BENCHMARK_PATH )
+sys.path.insert( 0, PACKAGE_PATH )
+
+# Skonverter module imports
+import fake_maya
+import telemetry
+
+DEFAULT_SIZES = '1000x10,20000x50,100000x150'
+SKINPERCENT_LIMIT = 20000 # skinPercent is one command per vert, above this many verts it's skipped unless asked for
+WEIGHT_TOLERANCE = 0.0015 # Just over the converter's 3 decimal rounding
+
+
+class Stage_Timer( object ):
+	"""
+	Times the stages of one run and records the process' peak memory and telemetry summary after each. Output from the converter
+	is swallowed while a stage runs.
+	"""
+	def __init__( self ):
+		self.stages = [ ]
+
+	def run( self, name, function, *args, **kwargs ):
+		devnull = open( os.devnull, 'w' )
+		stdout = sys.stdout
+		sys.stdout = devnull
+		try:
+			with telemetry.recording( ) as recorder:
+				start = time.time( )
+				result = function( *args, **kwargs )
+				seconds = time.time( ) - start
+		finally:
+			sys.stdout = stdout
+			devnull.close( )
+
+		self.stages.append( { 'stage': name, 'seconds': round( seconds, 4 ), 'peak_kb': get_peak_kb( ), 'telemetry': recorder.get_summary( )[ 'stages' ] } )
+		return result
+
+
+def get_peak_kb( ):
+	return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+
+
+def parse_sizes( sizes ):
+	"""
+	Turns "1000x10,20000x50" into [ ( 1000, 10 ), ( 20000, 50 ) ].
+	"""
+	return [ tuple( int( value ) for value in size.split( 'x' ) ) for size in sizes.split( ',' ) if size ]
+
+
+def compare_weights( weight_data, mesh ):
+	"""
+	Compares converted weight data ( vert_id : [ ( bone_name, weight ), ... ] ) against the mesh's ground truth.
+	"""
+	columns = dict( ( name, index ) for index, name in enumerate( mesh.scene.joint_order ) )
+	vert_ids, bone_columns, values = [ ], [ ], [ ]
+	for vert_id, weight_list in weight_data.iteritems( ):
+		for bone_name, weight in weight_list:
+			vert_ids.append( int( vert_id ) )
+			bone_columns.append( columns[ bone_name ] )
+			values.append( weight )
+	return summarize_error( mesh, vert_ids, bone_columns, values, len( columns ) )
+
+
+def compare_skin_cluster( cluster, mesh ):
+	"""
+	Compares the weights written to a fake skin cluster against the mesh's ground truth.
+	"""
+	columns = numpy.array( [ mesh.scene.joint_order.index( name ) for name in cluster.influences ] )
+	vert_ids, influence_indices = numpy.nonzero( cluster.weights )
+	return summarize_error( mesh, vert_ids, columns[ influence_indices ], cluster.weights[ vert_ids, influence_indices ], len( mesh.scene.joint_order ) )
+
+
+def summarize_error( mesh, vert_ids, bone_columns, values, column_count ):
+	"""
+	Lines the ( vert_id, column, weight ) entries up with the ground truth and sums up the differences, sparse so the big meshes don't
+	need a dense verts x joints array.
+	"""
+	truth_ids = numpy.repeat( numpy.arange( len( mesh.rest_points ) ), mesh.joint_index.shape[ 1 ] )
+	keys = numpy.concatenate( [ numpy.asarray( vert_ids, dtype = numpy.int64 ) * column_count + numpy.asarray( bone_columns, dtype = numpy.int64 ),
+	                            truth_ids * column_count + mesh.joint_index.ravel( ) ] )
+	differences = numpy.concatenate( [ numpy.asarray( values, dtype = numpy.float64 ), -mesh.joint_weight.ravel( ) ] )
+
+	unique_keys, inverse = numpy.unique( keys, return_inverse = True )
+	error = numpy.abs( numpy.bincount( inverse, weights = differences ) )
+	vert_error = numpy.zeros( len( mesh.rest_points ) )
+	numpy.maximum.at( vert_error, unique_keys // column_count, error )
+	return {
+		'max_error'  : float( vert_error.max( ) ),
+		'mean_error' : float( vert_error.mean( ) ),
+		'bad_verts'  : int( ( vert_error > WEIGHT_TOLERANCE ).sum( ) ),
+	}
+
+
+def run_size( vertex_count, joint_count, influences, skinpercent ):
+	"""
+	Runs every stage for one mesh size in this process. Returns its result dictionary.
+	"""
+	scene = fake_maya.install( fake_maya.build_skinned_cylinder( vertex_count = vertex_count, joint_count = joint_count, influences = influences ) )
+	mesh = scene.meshes[ 'mesh' ]
+	cluster = scene.skin_clusters[ 'mesh_skinCluster' ]
+
+	# Imported once the fake is installed, they pull in maya.cmds and pymel at import time.
+	import const
+	import methods
+
+	timer = Stage_Timer( )
+	result = { 'verts': len( mesh.rest_points ), 'joints': joint_count, 'influences': influences, 'baseline_kb': get_peak_kb( ) }
+
+	# Weight calculation
+	scene.command_count = 0
+	data, message = timer.run( 'determine_weighting', methods.determine_weighting, 'mesh', 'mesh_joint_0' )
+	if not data:
+		raise RuntimeError( message )
+	result[ 'probe_evaluations' ] = mesh.evaluation_count
+	result[ 'probe_commands' ] = scene.command_count
+	result[ 'accuracy' ] = { 'determine_weighting': compare_weights( data[ 'weight' ], mesh ) }
+
+	spatial_data, message = timer.run( 'determine_weighting_spatial', methods.determine_weighting, 'mesh', 'mesh_joint_0', spatial_index = True )
+	result[ 'accuracy' ][ 'determine_weighting_spatial' ] = compare_weights( spatial_data[ 'weight' ], mesh )
+	del spatial_data
+
+	# Same probes with the weight math done between them on the main thread, to compare against the pipelined default.
+	serial_data, message = timer.run( 'determine_weighting_serial', methods.determine_weighting, 'mesh', 'mesh_joint_0', pipeline_workers = 0 )
+	result[ 'accuracy' ][ 'determine_weighting_serial' ] = compare_weights( serial_data[ 'weight' ], mesh )
+	del serial_data
+
+	# A second, looser mesh on the same skeleton, converted alongside the first off one pass over the joints.
+	fake_maya.build_skinned_cylinder( vertex_count = vertex_count // 4, joint_count = joint_count, influences = influences, radius = 7.0, scene = scene,
+	                                  mesh_name = 'mesh_shell', skeleton_name = 'mesh' )
+	scene.command_count = 0
+	shared_data, message = timer.run( 'determine_weighting_shared', methods.determine_weighting, [ 'mesh', 'mesh_shell' ], 'mesh_joint_0' )
+	result[ 'shared_probe_commands' ] = scene.command_count
+	for mesh_name, mesh_data in shared_data.iteritems( ):
+		result[ 'accuracy' ][ 'determine_weighting_shared_' + mesh_name ] = compare_weights( mesh_data[ 'weight' ], scene.meshes[ mesh_name ] )
+	del shared_data
+
+	# A lower resolution LOD of the first mesh, weighted by transferring the converted data rather than probing it again.
+	fake_maya.build_skinned_cylinder( vertex_count = vertex_count // 4, joint_count = joint_count, influences = influences, scene = scene,
+	                                  mesh_name = 'mesh_lod', skeleton_name = 'mesh' )
+	lod_data, message = timer.run( 'transfer_weighting', methods.transfer_weighting, 'mesh', 'mesh_lod', data, use_cache = False )
+	result[ 'accuracy' ][ 'transfer_weighting' ] = compare_weights( lod_data[ 'weight' ], scene.meshes[ 'mesh_lod' ] )
+	del lod_data
+
+	# The legacy per vertex normalize works on plain lists, the way json files used to load.
+	weight_lists = timer.run( 'prepare_weight_lists', lambda weight_data: [ list( weight_list ) for weight_list in weight_data.itervalues( ) ], data[ 'weight' ] )
+	timer.run( 'normalize_vertex_weighting', lambda lists: [ methods.normalize_vertex_weighting( weight_list ) for weight_list in lists ], weight_lists )
+	del weight_lists
+
+	# Weight application, both writers
+	methods_to_apply = [ 'api' ] + ( [ 'skinpercent' ] if skinpercent else [ ] )
+	for method in methods_to_apply:
+		cluster.weights[ : ] = 0
+		timer.run( 'apply_weighting_' + method, methods.apply_weighting, 'mesh', data = data, method = method )
+		result[ 'accuracy' ][ 'apply_weighting_' + method ] = compare_skin_cluster( cluster, mesh )
+
+	# Reapplying the same data over itself, which the differential writer should get through without writing anything.
+	cluster.write_calls = 0
+	timer.run( 'apply_weighting_differential', methods.apply_weighting, 'mesh', data = data, differential = True )
+	result[ 'differential_write_calls' ] = cluster.write_calls
+	result[ 'accuracy' ][ 'apply_weighting_differential' ] = compare_skin_cluster( cluster, mesh )
+
+	# Data files, the original one shot json, the streamed json and the binary format
+	folder = tempfile.mkdtemp( prefix = 'skonverter_bench_' )
+	json_path = os.path.join( folder, 'weights.json' )
+	binary_path = os.path.join( folder, 'weights' + const.BINARY_EXTENSION )
+	result[ 'file_bytes' ] = { }
+
+	timer.run( 'save_json', methods.save_json, json_path, data )
+	result[ 'file_bytes' ][ 'json' ] = os.path.getsize( json_path )
+	loaded = timer.run( 'load_json', methods.load_json, json_path )
+	result[ 'accuracy' ][ 'load_json' ] = compare_weights( loaded[ 'weight' ], mesh )
+	del loaded
+
+	loaded = timer.run( 'load_data_json', methods.load_data, json_path )
+	result[ 'accuracy' ][ 'load_data_json' ] = compare_weights( loaded[ 'weight' ], mesh )
+	del loaded
+
+	timer.run( 'save_data_binary', methods.save_data, binary_path, data )
+	result[ 'file_bytes' ][ 'binary' ] = os.path.getsize( binary_path )
+	loaded = timer.run( 'load_data_binary', methods.load_data, binary_path )
+	result[ 'accuracy' ][ 'load_data_binary' ] = compare_weights( loaded[ 'weight' ], mesh )
+	del loaded
+
+	for file_path in ( json_path, binary_path ):
+		os.remove( file_path )
+	os.rmdir( folder )
+
+	result[ 'stages' ] = timer.stages
+	result[ 'peak_kb' ] = get_peak_kb( )
+	return result
+
+
+def get_revision( ):
+	"""
+	The git revision of the package, so reports can be matched up with the code they measured.
+	"""
+	try:
+		return subprocess.check_output( [ 'git', 'rev-parse', 'HEAD' ], cwd = PACKAGE_PATH, stderr = open( os.devnull, 'w' ) ).strip( )
+	except ( OSError, subprocess.CalledProcessError ):
+		return None
+
+
+def main( ):
+	parser = argparse.ArgumentParser( description = __doc__.strip( ).splitlines( )[ 0 ] )
+	parser.add_argument( '--sizes', default = DEFAULT_SIZES, help = 'Comma separated vertsxjoints, eg. 1000x10,500000x300' )
+	parser.add_argument( '--influences', type = int, default = 2, help = 'Ground truth influences per vertex.' )
+	parser.add_argument( '--skinpercent', choices = [ 'auto', 'always', 'never' ], default = 'auto',
+	                     help = 'Whether to time the skinPercent writer, auto skips it above {0} verts.'.format( SKINPERCENT_LIMIT ) )
+	parser.add_argument( '--output', default = None, help = 'Where to write the json report, defaults to stdout.' )
+	parser.add_argument( '--single', action = 'store_true', help = 'Run one size in this process, used internally.' )
+	args = parser.parse_args( )
+
+	if args.single:
+		vertex_count, joint_count = parse_sizes( args.sizes )[ 0 ]
+		skinpercent = args.skinpercent == 'always' or ( args.skinpercent == 'auto' and vertex_count <= SKINPERCENT_LIMIT )
+		print json.dumps( run_size( vertex_count, joint_count, args.influences, skinpercent ) )
+		return
+
+	results = [ ]
+	for vertex_count, joint_count in parse_sizes( args.sizes ):
+		output = subprocess.check_output( [ sys.executable, os.path.abspath( __file__ ), '--single', '--sizes', '{0}x{1}'.format( vertex_count, joint_count ),
+		                                    '--influences', str( args.influences ), '--skinpercent', args.skinpercent ] )
+		results.append( json.loads( output.strip( ).splitlines( )[ -1 ] ) )
+		sys.stderr.write( 'Skonverter Benchmark : {0}x{1} done\n'.format( vertex_count, joint_count ) )
+
+	report = {
+		'benchmark' : 'skonverter',
+		'revision'  : get_revision( ),
+		'python'    : platform.python_version( ),
+		'numpy'     : numpy.__version__,
+		'results'   : results,
+	}
+	report_string = json.dumps( report, indent = 2, sort_keys = True )
+	if args.output:
+		with open( args.output, 'w' ) as report_file:
+			report_file.write( report_string )
+	else:
+		print report_string
+
+
+if __name__ == '__main__':
+	main( )
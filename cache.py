@@ -0,0 +1,214 @@
+"""
+Contains the result cache, which keeps finished conversions on disk so rerunning on an unchanged asset skips the probing entirely.
+
+Entries are content addressed. The key hashes everything the weights depend on that the converter can see:
+	mesh         : topology and rest point positions
+	skeleton     : the ordered joint names with each joint's world matrix and its children's ( see incremental.get_bone_fingerprint )
+	settings     : BONE_DELTA ( or the adaptive delta settings ), PROBE_SAMPLES, tolerance, NORMALIZE and the pruning limits
+	history      : the names and types of the nodes in the mesh's deformer history
+
+What the deformers do internally isn't part of the key, so repainting the source weights without touching anything above gives a
+stale hit. Turn the cache off or clear( ) it after that kind of edit.
+
+	result_cache = cache.get_default_cache( )
+	data, message = methods.determine_weighting( transform, root_bone, result_cache = result_cache )
+	print result_cache.get_stats( )
+
+Each entry is one binary weight file. Hits touch the file, and anything past const.CACHE_MAX_AGE or beyond const.CACHE_MAX_BYTES
+is evicted least recently used first. Hit and miss counts are kept in a stats file next to the entries, so they add up across runs.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Maya sdk imports
+import maya.cmds
+
+# Python std lib imports
+import hashlib
+import json
+import os
+import time
+
+# Skonverter module imports
+import const
+import weight_file
+
+
+KEY_VERSION = 1 # Bump when anything that goes into the key or the stored data changes, so old entries stop matching
+STATS_FILE = 'stats.json'
+
+_default_cache = None
+
+
+class Result_Cache( object ):
+	"""
+	Directory of cached conversion results. max_bytes and max_age ( seconds ) default to const.CACHE_MAX_BYTES and
+	const.CACHE_MAX_AGE, 0 turns that limit off.
+	"""
+	def __init__( self, cache_dir = None, max_bytes = None, max_age = None ):
+		self.cache_dir = os.path.expanduser( cache_dir or const.CACHE_DIR )
+		self.max_bytes = const.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+		self.max_age = const.CACHE_MAX_AGE if max_age is None else max_age
+
+		# This session's counts, get_stats( ) adds them to the saved ones
+		self.hits = 0
+		self.misses = 0
+		self.seconds_saved = 0.0
+
+	def get_entry_path( self, key ):
+		return os.path.join( self.cache_dir, key + const.BINARY_EXTENSION )
+
+	def lookup( self, key ):
+		"""
+		Returns the data stored under the key, or None on a miss.
+		"""
+		entry_path = self.get_entry_path( key )
+		data = None
+		if os.path.exists( entry_path ):
+			try:
+				data = weight_file.load_binary( entry_path )
+			except ( IOError, ValueError ) as exception:
+				print 'Skonverter Cache : Unreadable entry, ignoring it | {0}'.format( exception )
+
+		if data is None:
+			self.misses += 1
+			self.update_stats( misses = 1 )
+			return None
+
+		# Touch it, the modified time is what eviction goes by
+		os.utime( entry_path, None )
+		seconds = data.pop( 'cache_seconds', 0.0 )
+		self.hits += 1
+		self.seconds_saved += seconds
+		self.update_stats( hits = 1, seconds_saved = seconds )
+		return data
+
+	def store( self, key, data, seconds = 0.0 ):
+		"""
+		Saves the data under the key, along with how long it took to calculate, then evicts whatever no longer fits.
+		"""
+		if not os.path.isdir( self.cache_dir ):
+			os.makedirs( self.cache_dir )
+
+		# Written under a temporary name first, so another process never loads half a file
+		entry_path = self.get_entry_path( key )
+		temporary_path = '{0}.{1}.tmp'.format( entry_path, os.getpid( ) )
+		entry_data = dict( data )
+		entry_data[ 'cache_seconds' ] = seconds
+		weight_file.save_binary( temporary_path, entry_data )
+		if os.path.exists( entry_path ):
+			os.remove( entry_path )
+		os.rename( temporary_path, entry_path )
+
+		self.evict( keep = entry_path )
+		return True
+
+	def get_entries( self ):
+		"""
+		Returns [ ( modified_time, size, path ), ... ] for every entry, least recently used first.
+		"""
+		if not os.path.isdir( self.cache_dir ):
+			return [ ]
+
+		entries = [ ]
+		for file_name in os.listdir( self.cache_dir ):
+			if not file_name.endswith( const.BINARY_EXTENSION ):
+				continue
+			entry_path = os.path.join( self.cache_dir, file_name )
+			entries.append( ( os.path.getmtime( entry_path ), os.path.getsize( entry_path ), entry_path ) )
+		return sorted( entries )
+
+	def evict( self, keep = None ):
+		"""
+		Removes entries older than max_age, then the least recently used ones until the rest fit in max_bytes. Returns how many went.
+		"""
+		entries = self.get_entries( )
+		total_bytes = sum( size for _, size, _ in entries )
+		now = time.time( )
+
+		evicted = 0
+		for modified_time, size, entry_path in entries:
+			too_old = self.max_age and now - modified_time > self.max_age
+			too_big = self.max_bytes and total_bytes > self.max_bytes
+			if entry_path == keep or not ( too_old or too_big ):
+				continue
+			try:
+				os.remove( entry_path )
+			except OSError:
+				# Still mapped by a loaded result on some platforms, it'll go next time
+				continue
+			total_bytes -= size
+			evicted += 1
+
+		if evicted:
+			self.update_stats( evictions = evicted )
+		return evicted
+
+	def clear( self ):
+		"""
+		Removes every entry and resets the saved stats.
+		"""
+		for _, _, entry_path in self.get_entries( ):
+			os.remove( entry_path )
+		stats_path = os.path.join( self.cache_dir, STATS_FILE )
+		if os.path.exists( stats_path ):
+			os.remove( stats_path )
+		return True
+
+	def get_stats( self ):
+		"""
+		Returns the saved hit, miss and eviction counts across every run, the seconds hits have saved, and the current size on disk.
+		"""
+		stats = self.load_stats( )
+		entries = self.get_entries( )
+		stats[ 'entries' ] = len( entries )
+		stats[ 'bytes' ] = sum( size for _, size, _ in entries )
+		return stats
+
+	def load_stats( self ):
+		stats = { 'hits': 0, 'misses': 0, 'evictions': 0, 'seconds_saved': 0.0 }
+		stats_path = os.path.join( self.cache_dir, STATS_FILE )
+		if os.path.exists( stats_path ):
+			try:
+				with open( stats_path, 'r' ) as stats_file:
+					stats.update( json.load( stats_file ) )
+			except ( IOError, ValueError ):
+				pass
+		return stats
+
+	def update_stats( self, **counts ):
+		if not os.path.isdir( self.cache_dir ):
+			os.makedirs( self.cache_dir )
+
+		stats = self.load_stats( )
+		for name, count in counts.iteritems( ):
+			stats[ name ] = stats.get( name, 0 ) + count
+		with open( os.path.join( self.cache_dir, STATS_FILE ), 'w' ) as stats_file:
+			json.dump( stats, stats_file )
+
+
+def get_default_cache( ):
+	"""
+	Returns the shared cache in const.CACHE_DIR.
+	"""
+	global _default_cache
+	if _default_cache is None:
+		_default_cache = Result_Cache( )
+	return _default_cache
+
+
+def get_cache_key( mesh_name, fingerprint, bone_names ):
+	"""
+	Builds the cache key from a run's fingerprint ( see incremental.get_fingerprint ) and the mesh's deformer history.
+	"""
+	digest = hashlib.sha1( )
+	digest.update( repr( KEY_VERSION ) )
+	digest.update( fingerprint[ 'mesh' ] )
+	digest.update( fingerprint[ 'settings' ] )
+	for bone_name in bone_names:
+		digest.update( bone_name.encode( 'utf-8' ) )
+		digest.update( fingerprint[ 'bones' ][ bone_name ] )
+	for node_name in maya.cmds.listHistory( mesh_name ) or [ ]:
+		digest.update( node_name.encode( 'utf-8' ) )
+		digest.update( maya.cmds.nodeType( node_name ) )
+	return digest.hexdigest( )
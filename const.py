@@ -5,6 +5,52 @@ File contains constant values for the Skonverter tool.
 VERSION = 0.5
 
 BONE_DELTA = 2 # The amount of distance each bone should be moved to determine weighting.
+# Size the probe move to the mesh instead, PROBE_DELTA_SCALE of the bounding box diagonal ( snapped to a power of two ). Keeps the
+# move well clear of float noise on tiny props and small enough to stay linear on huge set pieces. BONE_DELTA is used when it's off.
+# Off by default since it changes the weights on meshes where BONE_DELTA probes weren't linear.
+ADAPTIVE_DELTA = False
+PROBE_DELTA_SCALE = 0.01
+# How many poses each probe goes through. Every pose moves each bone along a different world axis, and the weights come out of one
+# least squares solve over all the displacements, so extra poses average out noise from non-linear deformers. 1 is one pose per probe.
+PROBE_SAMPLES = 1
+# Probe up to three bones per mesh evaluation, one per world axis, and split the weights back apart afterwards. Cuts the number of
+# evaluations by about 3x, but it's only valid when the mesh deforms linearly with the bone translations ( plain linear skinning ).
+BATCH_PROBES = False
+PROBE_AXIS_EPSILON = 1e-6 # Displacements along a probe axis smaller than this are treated as noise from the other axes.
+
+# How bones get moved while probing. Undo recording is turned off ( 'off' ) or folded into one undo entry ( 'chunk' ) while probing,
+# 'keep' leaves it alone. With PROBE_USE_API, moves go through MFnTransform rather than xform, which skips the command layer entirely.
+PROBE_UNDO_MODE = 'off'
+PROBE_USE_API = True
+PROBE_SUSPEND_REFRESH = True # Stop the viewports redrawing while the bones are being moved
+
+# Only sample and compare the verts near each bone once the first few probes have shown how far bones reach ( see spatial.py ).
+# Assumes influence falls off with distance from the bone, so it's off by default. SPATIAL_INDEX_VERIFY full scans every probe
+# as well and reports any difference, for checking a rig before trusting it.
+SPATIAL_INDEX = False
+SPATIAL_INDEX_VERIFY = False
+SPATIAL_INDEX_WARMUP = 4 # How many bones get a full scan before the index is used
+SPATIAL_INDEX_MARGIN = 1.5 # Candidates are taken this much further out than the furthest reach seen so far
+SPATIAL_INDEX_MAX_FRACTION = 0.5 # Above this fraction of the mesh, a full scan is just as cheap
+
+# Work the weights out on this many worker threads while the main thread keeps moving bones ( see pipeline.py ). 0 does the math
+# between probes like before. PIPELINE_QUEUE_SIZE is how many sampled snapshots can wait for a worker, which caps the memory used.
+PIPELINE_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 4
+
+# Splitting one mesh's bones across worker processes ( see distributed.py ). The bones get cut into this many partitions per worker,
+# so a slow partition doesn't hold everything up, and a failed partition gets retried this many times before the run gives up.
+DISTRIBUTED_PARTITIONS_PER_WORKER = 2
+DISTRIBUTED_RETRIES = 1
+
+# Read mesh points straight out of Maya's float buffer ( API 1.0 getRawPoints ) when sampling, instead of building an MPointArray each time.
+SAMPLE_RAW_POINTS = True
+
+# Pruning, for engines that limit how many bones can weight a vertex. Keep at most MAX_INFLUENCES weights per vertex and drop weights
+# below PRUNE_THRESHOLD of their vertex's total, then renormalize. 0 turns either off.
+MAX_INFLUENCES = 0
+PRUNE_THRESHOLD = 0.0
+
 FAILURE_THRESHOLD = 0 # How many bones can fail before user is prompted with warning
 
 # Slows down the processes a good bit, but displays some useful information in regards to actual weighting without 
@@ -12,6 +58,36 @@ FAILURE_THRESHOLD = 0 # How many bones can fail before user is prompted with war
 # the purposes of the tool, it works as it is now.
 DEBUG = False
 
+# How weights get written to the skin cluster. 'api' writes them in bulk through MFnSkinCluster.setWeights, 'skinpercent' is the
+# original one skinPercent call per vert path. It's a lot slower but undoable, so it's kept around as a fallback.
+APPLY_METHOD = 'api'
+APPLY_CHUNK_SIZE = 50000 # How many verts get written per setWeights call.
+APPLY_BLOCK_SIZE = 1000000 # How many weights ( verts x bones ) get written per setWeights call, at most.
+SKINPERCENT_COMPONENTS = 1000 # How many vertex range components go into a single skinPercent call.
+# Read the skin cluster's current weights back and only write the verts and influences that are more than APPLY_EPSILON off, for
+# reapplying updated data to a mesh that's mostly weighted already. Needs the 'api' method.
+APPLY_DIFFERENTIAL = False
+APPLY_EPSILON = 1e-6
+
+# Keep finished conversions on disk and hand them straight back when the mesh, skeleton and settings haven't changed ( see cache.py ).
+# Off by default since edits inside the deformers themselves don't change the key.
+CACHE_ENABLED = False
+CACHE_DIR = '~/.skonverter/cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3 # Least recently used entries get evicted past this, 0 for no limit
+CACHE_MAX_AGE = 30 * 24 * 60 * 60 # Entries unused for this many seconds get evicted, 0 for no limit
+
+# Transferring weights from a converted mesh onto its LODs ( see transfer.py ). 'barycentric' blends the source triangle closest to
+# each target vertex, 'nearest' blends the TRANSFER_NEIGHBOURS nearest source vertices. The correspondence only depends on the two
+# meshes, so it's safe to keep on disk under CACHE_DIR. Off by default like CACHE_ENABLED, so nothing gets written to disk unasked.
+TRANSFER_MODE = 'barycentric'
+TRANSFER_NEIGHBOURS = 3
+TRANSFER_EPSILON = 1e-6 # Target vertices this close to a source vertex take its weights as they are
+TRANSFER_CACHE_ENABLED = False
+
+UI_STEP_SECONDS = 0.1 # How long the UI runs the calculation for before handing control back to Maya, between progress updates
+
+BINARY_EXTENSION = '.skw' # Data files with this extension are saved in the binary format, anything else is saved as json.
+
 FILE_PREFERENCE = True # We prefer to use the file passed in if both data and filepath are passed in during initialzation of the script.
 
 # Should the weighting be normalized? Really, this shouldn't be ever changed, but if the situation arises, this is here.
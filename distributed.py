@@ -0,0 +1,269 @@
+"""
+Distributed weight calculation, which splits one mesh's bones across a pool of headless worker processes.
+
+Probing can't run in parallel inside one Maya session, since every probe moves the one skeleton. Given the rest pose though, a bone's
+weights only depend on that bone, so separate sessions with the same scene open can each probe a share of the bones:
+
+	1. One worker walks the skeleton and fingerprints the mesh ( the plan ).
+	2. The bones get split into contiguous partitions, a few per worker, and the pool hands them out as workers free up.
+	3. Each partition's raw weights come back to the coordinator as soon as it's done and get merged in.
+	4. Once every partition is in, the coordinator prunes and normalizes the whole table, exactly like a single session run would.
+
+A partition that fails is retried on whichever worker is free next, up to the retry count, and the worker that failed reopens the
+scene before its next partition. That includes partitions lost to a worker dying outright ( a mayapy crash ), see batch.Worker_Pool.
+The workers are batch's, started with batch.init_worker and running tasks through batch.run_in_scene. Each worker opens the scene
+once, so the split only pays off when probing takes longer than loading the scene, which is the case for high joint count rigs.
+
+	mayapy distributed.py /path/hero.ma body_geo root_jnt body.skw --workers 16
+	python distributed.py fake:20000x150 mesh mesh_joint_0 out.skw --backend fake --workers 4 --fake-failures 0:1
+
+The fake backend runs the real probing code against the numpy fake of Maya in benchmarks/fake_maya.py, on a synthetic skinned
+cylinder described by the scene name ( fake:<verts>x<joints> ). Partitions can be told to fail a few times, for checking the retries.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# Skonverter module imports
+import batch
+import const
+
+
+PACKAGE_PATH = os.path.dirname( os.path.abspath( __file__ ) )
+
+
+####################
+## Scene backends ##
+####################
+
+class Probe_Backend( object ):
+	"""
+	The plan and probe tasks, mixed into a backend that starts the session, imports methods and opens scenes the way batch's do.
+	"""
+	methods = None
+
+	def plan( self, task ):
+		"""
+		Returns the ordered bones under the root, the mesh's vertex count and its fingerprint.
+		"""
+		import incremental
+		import sampler
+		bone_names = self.methods.get_ordered_bone_list( task[ 'root_bone' ], [ task[ 'root_bone' ] ] )
+		mesh_sampler = sampler.Mesh_Sampler( task[ 'transform' ] )
+		fingerprint = incremental.get_fingerprint( mesh_sampler, bone_names, task[ 'tolerance' ], max_influences = task[ 'max_influences' ], prune_threshold = task[ 'prune_threshold' ] )
+		return { 'bones': bone_names, 'vertex_count': mesh_sampler.vertex_count, 'fingerprint': fingerprint }
+
+	def probe( self, task ):
+		"""
+		Probes the task's bones. Returns { bone_name : ( vert_ids, weights ) }.
+		"""
+		# The worker processes already fill the cores, so the weight math stays on the probing thread.
+		bone_weights, message = self.methods.probe_bone_weights( task[ 'transform' ], task[ 'root_bone' ], task[ 'bones' ], tolerance = task[ 'tolerance' ],
+		                                                         batch_probes = task[ 'batch_probes' ], pipeline_workers = 0, probe_samples = task[ 'probe_samples' ] )
+		if bone_weights is None:
+			raise RuntimeError( message )
+		return bone_weights
+
+
+class Maya_Backend( batch.Maya_Backend, Probe_Backend ):
+	"""
+	Probes in a headless Maya session, started the same way as batch's.
+	"""
+
+
+class Fake_Backend( Probe_Backend ):
+	"""
+	Probes against the fake Maya, on a skinned cylinder built from the scene name, fake:<verts>x<joints>[x<influences>].
+
+	Tasks can carry a "fake_failures" count, that many attempts at the task fail before one goes through, and a "fake_exits"
+	count, where the worker process dies outright instead.
+	"""
+	def __init__( self ):
+		self.fake_maya = import_fake_maya( )
+		self.fake_maya.install( self.fake_maya.Fake_Scene( ) )
+		import methods
+		self.methods = methods
+
+	def open_scene( self, scene ):
+		sizes = [ int( size ) for size in scene.split( ':', 1 )[ -1 ].split( 'x' ) ]
+		vertex_count, joint_count = sizes[ :2 ]
+		influences = sizes[ 2 ] if len( sizes ) > 2 else 2
+		self.fake_maya.install( self.fake_maya.build_skinned_cylinder( vertex_count = vertex_count, joint_count = joint_count, influences = influences ) )
+
+	def probe( self, task ):
+		if task[ 'attempt' ] <= task.get( 'fake_exits', 0 ):
+			os._exit( 1 )
+		if task[ 'attempt' ] <= task.get( 'fake_failures', 0 ):
+			raise RuntimeError( 'Fake failure {0} for partition {1}'.format( task[ 'attempt' ], task[ 'partition' ] ) )
+		return Probe_Backend.probe( self, task )
+
+
+BACKENDS = { 'maya': Maya_Backend, 'fake': Fake_Backend }
+
+
+def import_fake_maya( ):
+	sys.path.insert( 0, os.path.join( PACKAGE_PATH, 'benchmarks' ) )
+	import fake_maya
+	return fake_maya
+
+
+def get_methods( backend_name ):
+	"""
+	The coordinator only needs methods for the merge, but it imports maya.cmds at the top. The fake backend puts its modules in first.
+	"""
+	if backend_name == 'fake' and 'maya.cmds' not in sys.modules:
+		fake_maya = import_fake_maya( )
+		fake_maya.install( fake_maya.Fake_Scene( ) )
+	import methods
+	return methods
+
+
+####################
+## Worker methods ##
+####################
+
+def run_task( task ):
+	"""
+	Runs one plan or probe task in its scene. Returns a result dictionary, with the traceback in error if it failed.
+	"""
+	result = { 'task': task, 'result': None, 'error': None, 'seconds': 0.0, 'pid': os.getpid( ) }
+	start = time.time( )
+	try:
+		result[ 'result' ] = batch.run_in_scene( task[ 'scene' ], task[ 'kind' ], task )
+	except Exception:
+		result[ 'error' ] = traceback.format_exc( )
+	result[ 'seconds' ] = time.time( ) - start
+	return result
+
+
+#########################
+## Coordinator methods ##
+#########################
+
+def partition_bones( probe_groups, partition_count ):
+	"""
+	Splits the probe groups ( see methods.get_probe_groups ) into at most partition_count contiguous runs of bones, as even as the
+	groups allow. Groups stay whole, so batched probes get split the same way they would be in one session.
+	"""
+	partition_count = max( 1, min( partition_count, len( probe_groups ) ) )
+	bounds = [ len( probe_groups ) * index // partition_count for index in range( partition_count + 1 ) ]
+	return [ [ bone_name for probe_group in probe_groups[ start:end ] for bone_name in probe_group ] for start, end in zip( bounds, bounds[ 1: ] ) if end > start ]
+
+
+def determine_weighting_distributed( scene, transform, root_bone, tolerance = -1, batch_probes = None, max_influences = None, prune_threshold = None,
+                                     probe_samples = None, workers = None, partitions = None, retries = None, backend_name = 'maya', fake_failures = None,
+                                     fake_exits = None ):
+	"""
+	Calculates the transform's weighting like methods.determine_weighting, with the bones split across worker processes that each
+	open scene. workers defaults to the cpu count, partitions to const.DISTRIBUTED_PARTITIONS_PER_WORKER per worker and retries
+	( per partition ) to const.DISTRIBUTED_RETRIES. fake_failures and fake_exits are { partition_index : count } for the fake backend.
+
+	Returns [ data, message ]
+	"""
+	if batch_probes is None:
+		batch_probes = const.BATCH_PROBES
+	if max_influences is None:
+		max_influences = const.MAX_INFLUENCES
+	if prune_threshold is None:
+		prune_threshold = const.PRUNE_THRESHOLD
+	if probe_samples is None:
+		probe_samples = const.PROBE_SAMPLES
+	if retries is None:
+		retries = const.DISTRIBUTED_RETRIES
+	workers = max( 1, workers or multiprocessing.cpu_count( ) )
+	partitions = partitions or workers * const.DISTRIBUTED_PARTITIONS_PER_WORKER
+
+	methods = get_methods( backend_name )
+	import telemetry
+	import weights
+
+	base_task = { 'scene': scene, 'transform': transform, 'root_bone': root_bone, 'tolerance': tolerance, 'batch_probes': batch_probes, 'probe_samples': probe_samples,
+	              'max_influences': max_influences, 'prune_threshold': prune_threshold, 'attempt': 1 }
+
+	with batch.Worker_Pool( workers, batch.init_worker, ( backend_name, BACKENDS ) ) as pool:
+		# Plan on one worker, it opens the scene the same way the rest will.
+		with telemetry.stage( 'distributed_plan' ):
+			pool.submit( run_task, dict( base_task, kind = 'plan' ) )
+			plan_task, plan_result, progress = pool.get( )
+		if not plan_result or plan_result[ 'error' ]:
+			return None, 'Planning failed | {0}'.format( plan_result[ 'error' ] if plan_result else 'Worker process died' )
+		plan = plan_result[ 'result' ]
+
+		bone_partitions = partition_bones( methods.get_probe_groups( plan[ 'bones' ], batch_probes = batch_probes ), partitions )
+		print 'Skonverter Distributed : {0} bones in {1} partitions over {2} workers'.format( len( plan[ 'bones' ] ), len( bone_partitions ), workers )
+
+		# Results come back as each partition finishes, failed ones go straight back in the pool.
+		for partition_index, bone_names in enumerate( bone_partitions ):
+			pool.submit( run_task, dict( base_task, kind = 'probe', partition = partition_index, bones = bone_names,
+			                             fake_failures = ( fake_failures or { } ).get( partition_index, 0 ), fake_exits = ( fake_exits or { } ).get( partition_index, 0 ) ) )
+
+		bone_vert_association = { }
+		retried = 0
+		with telemetry.stage( 'distributed_probe' ):
+			while len( pool ):
+				task, result, progress = pool.get( )
+				# A worker that died took the partition with it, that counts as a failed attempt like any other.
+				error = result[ 'error' ] if result else 'Worker process died'
+				if error:
+					print 'Skonverter Distributed : Partition {0} failed on attempt {1} | {2}'.format( task[ 'partition' ], task[ 'attempt' ], error.strip( ).splitlines( )[ -1 ] )
+					if task[ 'attempt' ] > retries:
+						return None, 'Partition {0} failed after {1} attempts | {2}'.format( task[ 'partition' ], task[ 'attempt' ], error )
+					retried += 1
+					pool.submit( run_task, dict( task, attempt = task[ 'attempt' ] + 1 ) )
+					continue
+
+				bone_vert_association.update( result[ 'result' ] )
+				print 'Skonverter Distributed : Partition {0} done | {1} bones in {2:.2f}s on {3}'.format( task[ 'partition' ], len( task[ 'bones' ] ), result[ 'seconds' ], result[ 'pid' ] )
+
+	# Every bone is in, so the table gets filled root to tip, pruned and normalized the same way a single session does it.
+	data = methods.build_weight_data( weights.Weight_Table( plan[ 'vertex_count' ] ), plan[ 'bones' ], bone_vert_association, fingerprint = plan[ 'fingerprint' ],
+	                                  max_influences = max_influences, prune_threshold = prune_threshold )
+	return data, 'Success | {0} partitions over {1} workers, {2} retried'.format( len( bone_partitions ), workers, retried )
+
+
+def parse_fake_failures( value ):
+	"""
+	Turns "0:1,3:2" into { 0 : 1, 3 : 2 }, for --fake-failures and --fake-exits.
+	"""
+	return dict( tuple( int( number ) for number in pair.split( ':' ) ) for pair in value.split( ',' ) if pair ) if value else { }
+
+
+def main( args = None ):
+	parser = argparse.ArgumentParser( description = 'Skin weight calculation for one mesh, with the bones split across worker processes.' )
+	parser.add_argument( 'scene', help = 'Scene every worker opens, or fake:<verts>x<joints> for the fake backend.' )
+	parser.add_argument( 'transform' )
+	parser.add_argument( 'root_bone' )
+	parser.add_argument( 'output', help = 'Where to save the data.' )
+	parser.add_argument( '--workers', type = int, default = None, help = 'Worker processes, defaults to the cpu count.' )
+	parser.add_argument( '--partitions', type = int, default = None, help = 'How many pieces to split the bones into.' )
+	parser.add_argument( '--retries', type = int, default = None, help = 'How many times a failed partition gets retried.' )
+	parser.add_argument( '--tolerance', type = float, default = -1 )
+	parser.add_argument( '--max-influences', type = int, default = None )
+	parser.add_argument( '--prune-threshold', type = float, default = None )
+	parser.add_argument( '--backend', choices = sorted( BACKENDS ), default = 'maya' )
+	parser.add_argument( '--fake-failures', default = None, help = 'partition:failures pairs for the fake backend, eg. 0:1,3:2' )
+	parser.add_argument( '--fake-exits', default = None, help = 'partition:exits pairs for the fake backend, the worker dies instead of raising.' )
+	args = parser.parse_args( args )
+
+	start = time.time( )
+	data, message = determine_weighting_distributed( args.scene, args.transform, args.root_bone, tolerance = args.tolerance, max_influences = args.max_influences,
+	                                                 prune_threshold = args.prune_threshold, workers = args.workers, partitions = args.partitions,
+	                                                 retries = args.retries, backend_name = args.backend, fake_failures = parse_fake_failures( args.fake_failures ),
+	                                                 fake_exits = parse_fake_failures( args.fake_exits ) )
+	print 'Skonverter Distributed : {0} in {1:.2f}s'.format( message, time.time( ) - start )
+	if not data:
+		return 1
+
+	get_methods( args.backend ).save_data( args.output, data )
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit( main( ) )
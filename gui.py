@@ -7,6 +7,7 @@ Not intended for use outside of the run method.
 '''
 
 # Skonverter module imports
+import cache
 import methods
 import const
 
@@ -14,6 +15,7 @@ import const
 import pymel.core
 
 # UI Lib imports
+import PySide.QtCore
 import PySide.QtGui
 
 # Python std lib imports
@@ -32,10 +34,20 @@ class Skonverter_Interface( ):
 		self.root_bone = None
 		
 		self.tolerance = -1
+		self.max_influences = const.MAX_INFLUENCES
+		self.prune_threshold = const.PRUNE_THRESHOLD
 		
 		# To be filled later.
 		self.data = None
 		
+		# The calculation runs as a job, stepped from a timer so Maya stays responsive.
+		self.job = None
+		self.job_timer = None
+		self.target_file_path = None
+		self.progress_bar = None
+		self.progress_label = None
+		self.cancel_button = None
+		
 	def show( self ):
 		"""
 		Method handles the logic for the generation of the UI
@@ -77,6 +89,17 @@ class Skonverter_Interface( ):
 		self.tolerance_field  = pymel.core.textField( 'tolerance_field', text = '-1', p = tolerance_layout )
 		self.tolerance_field.changeCommand( self.on_tolerance_field_change )		
 		
+		# ------ Pruning Fields -------#
+		influences_layout = pymel.core.horizontalLayout( 'influences_layout', p = main_layout )
+		influences_label  = pymel.core.text( 'Max Influences: ', p = influences_layout )
+		self.influences_field  = pymel.core.textField( 'influences_field', text = str( self.max_influences ), p = influences_layout )
+		self.influences_field.changeCommand( self.on_influences_field_change )
+		
+		prune_layout = pymel.core.horizontalLayout( 'prune_layout', p = main_layout )
+		prune_label  = pymel.core.text( 'Prune Below: ', p = prune_layout )
+		self.prune_field  = pymel.core.textField( 'prune_field', text = str( self.prune_threshold ), p = prune_layout )
+		self.prune_field.changeCommand( self.on_prune_field_change )
+		
 		# ------- File path field -------#
 		file_path_layout = pymel.core.horizontalLayout( 'file_path_layout', p = main_layout )
 		file_path_label  = pymel.core.text( 'Data Path: ', p = file_path_layout )
@@ -87,7 +110,7 @@ class Skonverter_Interface( ):
 		path_button = pymel.core.button( 'file_path_button', label = '<<<', p = file_path_layout, c = path_button_command )
 	
 		# Redistribute the layouts
-		horizontal_layouts = [ transform_layout, root_layout, tolerance_layout, file_path_layout ]
+		horizontal_layouts = [ transform_layout, root_layout, tolerance_layout, influences_layout, prune_layout, file_path_layout ]
 		for layout in horizontal_layouts:
 			layout.redistribute( )
 		
@@ -95,6 +118,11 @@ class Skonverter_Interface( ):
 		calculate_button_command = pymel.core.Callback( self.run_calculate_weighting_command )
 		calculate_button = pymel.core.button('calc_button', l='Calculate Weighting', p = button_layout, c = calculate_button_command )
 		
+		# Progress of the running calculation, with a Cancel button that stops it and puts the skeleton back
+		self.progress_label = pymel.core.text( 'progress_label', label = '', p = button_layout )
+		self.progress_bar = pymel.core.progressBar( 'progress_bar', maxValue = 1, progress = 0, p = button_layout )
+		self.cancel_button = pymel.core.button( 'cancel_button', l = 'Cancel', p = button_layout, enable = False, c = pymel.core.Callback( self.run_cancel_command ) )
+		
 		# Make the Apply button
 		apply_button_command = pymel.core.Callback( self.run_apply_weighting_command )
 		apply_button = pymel.core.button('apply_button', l='Apply Weighting', p = button_layout, c = apply_button_command )
@@ -106,7 +134,7 @@ class Skonverter_Interface( ):
 	######################
 
 	def run_apply_weighting_command( self ):
-		data = methods.load_json( self.file_path_field.getText( ) )
+		data = methods.load_data( self.file_path_field.getText( ) )
 		if not data:
 			self.warning('Data is invalid')
 			return False
@@ -114,19 +142,86 @@ class Skonverter_Interface( ):
 		methods.apply_weighting( self.transform, data = data )
 	
 	def run_calculate_weighting_command( self ):
-		target_file_path, message = PySide.QtGui.QFileDialog( ).getSaveFileName( None, 'Save Location' )
-		data, message = methods.determine_weighting( self.transform, root_bone = self.root_bone, tolerance = self.tolerance )
+		if self.job and not self.job.finished:
+			self.warning( 'A calculation is already running' )
+			return False
+		
+		self.target_file_path, message = PySide.QtGui.QFileDialog( ).getSaveFileName( None, 'Save Location' )
+		if not self.target_file_path:
+			self.warning( 'No save location picked, calculation cancelled' )
+			return False
+
+		self.job = methods.Weighting_Job( self.transform, root_bone = self.root_bone, interactive = True, tolerance = self.tolerance,
+		                                  max_influences = self.max_influences, prune_threshold = self.prune_threshold,
+		                                  result_cache = cache.get_default_cache( ) if const.CACHE_ENABLED else None )
+		
+		# Step the job whenever Maya's event loop is free, rather than blocking it until the whole calculation is done.
+		self.job_timer = PySide.QtCore.QTimer( )
+		self.job_timer.timeout.connect( self.on_job_timer )
+		self.job_timer.start( 0 )
+		self.cancel_button.setEnable( True )
+		self.update_progress( )
+		return True
+	
+	def on_job_timer( self ):
+		# Run steps for a short slice of time, then give the event loop a turn
+		slice_end = self.job.get_elapsed( ) + const.UI_STEP_SECONDS
+		try:
+			while self.job.step( ) and self.job.get_elapsed( ) < slice_end:
+				pass
+		except Exception as excep:
+			self.finish_job( )
+			self.warning( 'Calculation failed : {0}'.format( excep ) )
+			raise
+		
+		self.update_progress( )
+		if self.job.finished:
+			self.finish_job( )
+			self.on_job_complete( )
+	
+	def on_job_complete( self ):
+		data, message = self.job.data, self.job.message
 		if not data:
 			self.warning( message )
 			self.file_path_field.setText( 'Data invalid' )
 			return False
 		
-		methods.save_json( target_file_path, data )
-		if os.path.exists( target_file_path ):
-			self.file_path = target_file_path
-			self.file_path_field.setText( target_file_path )
+		methods.save_data( self.target_file_path, data )
+		if os.path.exists( self.target_file_path ):
+			self.file_path = self.target_file_path
+			self.file_path_field.setText( self.target_file_path )
 		
 		return True
+	
+	def run_cancel_command( self ):
+		if not self.job or self.job.finished:
+			return False
+		
+		self.job.cancel( )
+		self.finish_job( )
+		self.update_progress( )
+		return True
+	
+	def finish_job( self ):
+		if self.job_timer:
+			self.job_timer.stop( )
+			self.job_timer = None
+		self.cancel_button.setEnable( False )
+	
+	def update_progress( self ):
+		job = self.job
+		self.progress_bar.setMaxValue( max( 1, job.total ) )
+		self.progress_bar.setProgress( job.done )
+		
+		if job.cancelled:
+			label = job.message
+		elif job.finished:
+			label = 'Done in {0:.1f}s'.format( job.get_elapsed( ) )
+		elif job.get_eta( ) is None:
+			label = 'Starting...'
+		else:
+			label = '{0}/{1} bones | {2:.0f}s left'.format( job.done, job.total, job.get_eta( ) )
+		self.progress_label.setLabel( label )
 		
 	def fill_field( self, field ):
 		# get the selection
@@ -165,6 +260,14 @@ class Skonverter_Interface( ):
 		self.tolerance = float( self.tolerance_field.getText( ) )
 		return True
 	
+	def on_influences_field_change( self, *args ):
+		self.max_influences = int( self.influences_field.getText( ) or 0 )
+		return True
+	
+	def on_prune_field_change( self, *args ):
+		self.prune_threshold = float( self.prune_field.getText( ) or 0 )
+		return True
+	
 	def on_file_path_field_change( self, *args ):
 		self.file_path = self.file_path_field.getText( )
 		return True
@@ -0,0 +1,108 @@
+"""
+Contains the fingerprinting used for incremental re-conversion.
+
+Each run stores a fingerprint of the mesh, the settings and every bone alongside its data. On the next run the fingerprints are
+compared, and only the bones that changed get probed again.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Maya sdk imports
+import maya.cmds
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import hashlib
+
+# Skonverter module imports
+import const
+
+
+def get_fingerprint( mesh_sampler, bone_names, tolerance, max_influences = None, prune_threshold = None ):
+	"""
+	Builds the fingerprint dictionary for a run. pruned marks runs that prune, their data can't be reused bone by bone ( see
+	get_changed_bones ).
+	"""
+	return {
+		'mesh'     : get_mesh_fingerprint( mesh_sampler ),
+		'settings' : get_settings_fingerprint( tolerance, max_influences = max_influences, prune_threshold = prune_threshold ),
+		'bones'    : dict( ( bone_name, get_bone_fingerprint( bone_name ) ) for bone_name in bone_names ),
+		'pruned'   : bool( max_influences or prune_threshold ),
+	}
+
+
+def get_mesh_fingerprint( mesh_sampler ):
+	"""
+	Hashes the mesh topology and its rest point positions.
+	"""
+	polygon_counts, polygon_connects = mesh_sampler.mfn_mesh.getVertices( )
+
+	digest = hashlib.sha1( )
+	digest.update( numpy.array( polygon_counts, dtype = numpy.int32 ).tostring( ) )
+	digest.update( numpy.array( polygon_connects, dtype = numpy.int32 ).tostring( ) )
+	digest.update( numpy.ascontiguousarray( mesh_sampler.rest_points ).tostring( ) )
+	return digest.hexdigest( )
+
+
+def get_settings_fingerprint( tolerance, max_influences = None, prune_threshold = None ):
+	"""
+	Hashes the settings that change the weights for every bone.
+	"""
+	settings = [ const.BONE_DELTA, tolerance, const.NORMALIZE ]
+	# Only hashed when pruning is on, so data saved before pruning existed still matches an unpruned run.
+	if max_influences or prune_threshold:
+		settings += [ max_influences, prune_threshold ]
+	# Same for the probe sizing and pose count, only hashed once they're off the original fixed delta single pose probes.
+	if const.ADAPTIVE_DELTA or const.PROBE_SAMPLES > 1:
+		settings += [ const.ADAPTIVE_DELTA, const.PROBE_DELTA_SCALE, const.PROBE_SAMPLES ]
+	return hashlib.sha1( repr( settings ) ).hexdigest( )
+
+
+def get_bone_fingerprint( bone_name ):
+	"""
+	Hashes the bone's world matrix along with the names and world matrices of its child joints.
+	"""
+	digest = hashlib.sha1( )
+	digest.update( format_matrix( maya.cmds.xform( bone_name, query = True, matrix = True, worldSpace = True ) ) )
+
+	for child_name in sorted( maya.cmds.listRelatives( bone_name, children = True, type = 'joint' ) or [ ] ):
+		digest.update( child_name )
+		digest.update( format_matrix( maya.cmds.xform( child_name, query = True, matrix = True, worldSpace = True ) ) )
+
+	return digest.hexdigest( )
+
+
+def format_matrix( matrix ):
+	"""
+	Turns a flat matrix into a string for hashing. Values are cut to 6 decimals so float noise doesn't count as a change.
+	"""
+	return ','.join( '{0:.6f}'.format( value ) for value in matrix )
+
+
+def get_changed_bones( previous_data, fingerprint ):
+	"""
+	Compares the fingerprint stored in previous_data against the current one.
+
+	Returns the set of bone names that need probing again, or None if everything does ( the mesh or settings changed, or the
+	previous data can't be reused ).
+	"""
+	previous_fingerprint = previous_data.get( 'fingerprint' )
+	if not previous_fingerprint:
+		return None
+
+	if previous_fingerprint.get( 'mesh' ) != fingerprint[ 'mesh' ] or previous_fingerprint.get( 'settings' ) != fingerprint[ 'settings' ]:
+		return None
+
+	# Pruned data has lost the weights that didn't make the cut, and a changed bone losing influence could bring them back. Only
+	# a full run can tell, so pruned runs are never incremental.
+	if fingerprint.get( 'pruned' ) or previous_fingerprint.get( 'pruned' ):
+		return None
+
+	# Normalized weights can only be reused if we can undo the normalization.
+	if const.NORMALIZE and previous_data.get( 'totals' ) is None:
+		return None
+
+	previous_bones = previous_fingerprint.get( 'bones', { } )
+	return set( bone_name for bone_name, bone_fingerprint in fingerprint[ 'bones' ].iteritems( ) if previous_bones.get( bone_name ) != bone_fingerprint )
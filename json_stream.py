@@ -0,0 +1,210 @@
+"""
+Contains the streaming json writer and reader for weight data.
+
+Files keep the layout save_json has always written ( one line, { "order": [ ... ], "weight": { "vert_id": [ [ bone, weight ], ... ] } } ),
+but they're written a vertex at a time and read back a chunk at a time, so the whole document never has to sit in memory as one string.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import array
+import itertools
+import json
+
+# Skonverter module imports
+import weights
+
+
+CHUNK_SIZE = 1 << 20 # How many bytes get read from the file at a time
+WRITE_BATCH_SIZE = 4096 # How many vertex entries get joined up per write
+STREAMED_KEYS = ( 'totals', 'weight' ) # Top level keys holding { vert_id : value }, written an entry at a time. weight has to be last.
+WHITESPACE = ' \t\n\r'
+
+
+def write_json( file_path, data, default = None ):
+	"""
+	Writes the data dictionary to file_path a vertex entry at a time. Everything but the weights goes first, so readers
+	know the bone order before any weights show up. The per vertex dictionaries ( STREAMED_KEYS ) are written in batches
+	of entries rather than encoded whole.
+	"""
+	encoder = json.JSONEncoder( default = default )
+
+	with open( file_path, 'w' ) as data_file:
+		data_file.write( '{' )
+		for key, value in data.iteritems( ):
+			if key in STREAMED_KEYS:
+				continue
+			data_file.write( '{0}: {1}, '.format( encoder.encode( key ), encoder.encode( value ) ) )
+
+		# The weights are last in STREAMED_KEYS and always get written, even when there aren't any.
+		for key in STREAMED_KEYS:
+			if key != 'weight' and key not in data:
+				continue
+			data_file.write( '{0}: {{'.format( encoder.encode( key ) ) )
+			write_json_entries( data_file, encoder, data.get( key, { } ) )
+			data_file.write( '}}' if key == 'weight' else '}, ' )
+	return True
+
+
+def write_json_entries( data_file, encoder, vertex_data ):
+	"""
+	Writes the "vert_id": value entries of a per vertex dictionary. Entries are written in batches, fewer writes without holding
+	much more than one batch of text at a time.
+
+	vertex_data can also be a dense array indexed by vert id, like the totals a binary file loads as. Only its nonzero rows are written.
+	"""
+	if isinstance( vertex_data, numpy.ndarray ):
+		vert_ids = numpy.flatnonzero( vertex_data )
+		items = itertools.izip( vert_ids.tolist( ), vertex_data[ vert_ids ].tolist( ) )
+	else:
+		items = vertex_data.iteritems( )
+
+	entries = [ ]
+	separator = ''
+	for vert_id, value in items:
+		entries.append( '"{0}": {1}'.format( vert_id, encoder.encode( value ) ) )
+		if len( entries ) == WRITE_BATCH_SIZE:
+			data_file.write( separator + ', '.join( entries ) )
+			entries = [ ]
+			separator = ', '
+	if entries:
+		data_file.write( separator + ', '.join( entries ) )
+
+
+def load_json_table( file_path ):
+	"""
+	Streams a json weight file into a Weight_Table.
+
+	Returns the data dictionary, with data[ 'weight' ] as a Weight_Mapping over the table rather than a dictionary of lists.
+	"""
+	data = { }
+	bone_lookup = { } # bone_name : index in the order the bones show up in the weights
+
+	# Compact typed arrays, a lot smaller than lists of python floats while we don't know the final size.
+	vert_ids = array.array( 'i' )
+	bone_indices = array.array( 'i' )
+	weight_values = array.array( 'd' )
+
+	for event, key, value in iter_json_document( file_path ):
+		if event == 'value':
+			data[ key ] = value
+			continue
+
+		vert_id = int( key )
+		for bone_name, weight in value:
+			if bone_name not in bone_lookup:
+				bone_lookup[ bone_name ] = len( bone_lookup )
+			vert_ids.append( vert_id )
+			bone_indices.append( bone_lookup[ bone_name ] )
+			weight_values.append( weight )
+
+	# Older files list the order after the weights, so the bone indices are only lined up with the order now that it's all read.
+	data[ 'order' ] = data.get( 'order', [ ] )
+	table = weights.Weight_Table( 0, bone_names = data[ 'order' ] )
+	remap = numpy.zeros( len( bone_lookup ), dtype = numpy.int32 )
+	for bone_name, index in bone_lookup.iteritems( ):
+		remap[ index ] = table.get_bone_index( bone_name )
+
+	bone_indices = numpy.frombuffer( bone_indices, dtype = numpy.intc )
+	table.add_entries( numpy.frombuffer( vert_ids, dtype = numpy.intc ), remap[ bone_indices ], numpy.frombuffer( weight_values, dtype = numpy.float64 ) )
+	table.build( sort_bones = True )
+
+	data[ 'weight' ] = weights.Weight_Mapping( table )
+	return data
+
+
+def iter_json_document( file_path ):
+	"""
+	Walks the top level of a json weight file. Yields ( 'weight', vert_id, weight_list ) for each vertex entry and
+	( 'value', key, value ) for every other top level key.
+	"""
+	with open( file_path, 'r' ) as data_file:
+		reader = Json_Stream_Reader( data_file )
+		reader.expect( '{' )
+		while not reader.next_is( '}' ):
+			key = reader.read_value( )
+			reader.expect( ':' )
+
+			if key == 'weight':
+				reader.expect( '{' )
+				while not reader.next_is( '}' ):
+					vert_id = reader.read_value( )
+					reader.expect( ':' )
+					yield 'weight', vert_id, reader.read_value( )
+					reader.next_is( ',' )
+			else:
+				yield 'value', key, reader.read_value( )
+
+			reader.next_is( ',' )
+
+
+class Json_Stream_Reader( object ):
+	"""
+	Decodes json values one at a time from a file, only holding the chunk that's currently being read.
+	"""
+	def __init__( self, data_file ):
+		self.data_file = data_file
+		self.decoder = json.JSONDecoder( )
+		self.buffer = ''
+		self.position = 0
+		self.finished = False
+
+	def read_value( self ):
+		"""
+		Decodes the next json value.
+		"""
+		self._skip_whitespace( )
+		while True:
+			try:
+				value, end = self.decoder.raw_decode( self.buffer, self.position )
+			except ValueError:
+				# The value runs past the end of the buffer, read more and try again
+				if not self._fill( ):
+					raise
+				continue
+
+			# A number at the very end of the buffer might carry on in the next chunk
+			if end == len( self.buffer ) and self._fill( ):
+				continue
+
+			self.position = end
+			return value
+
+	def next_is( self, character ):
+		"""
+		Consumes the next non whitespace character if it matches, returns whether it did.
+		"""
+		self._skip_whitespace( )
+		if self.position < len( self.buffer ) and self.buffer[ self.position ] == character:
+			self.position += 1
+			return True
+		return False
+
+	def expect( self, character ):
+		if not self.next_is( character ):
+			raise ValueError( 'Expected "{0}" at character {1} of the current chunk'.format( character, self.position ) )
+
+	def _skip_whitespace( self ):
+		while True:
+			while self.position < len( self.buffer ) and self.buffer[ self.position ] in WHITESPACE:
+				self.position += 1
+			if self.position < len( self.buffer ) or not self._fill( ):
+				return
+
+	def _fill( self ):
+		"""
+		Drops what's already been read and appends the next chunk of the file. Returns False at the end of the file.
+		"""
+		if self.finished:
+			return False
+		chunk = self.data_file.read( CHUNK_SIZE )
+		if not chunk:
+			self.finished = True
+			return False
+		self.buffer = self.buffer[ self.position: ] + chunk
+		self.position = 0
+		return True
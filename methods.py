@@ -6,22 +6,42 @@ Author : Evan Cox, coxevan90@gmail.com
 
 # Maya sdk imports
 import maya.cmds
-import pymel.core
 import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+# Third party imports
+import numpy
 
 # Python std lib imports
 import pprint
 import json
+import math
 import os
+import timeit
 
 # Skonverter module imports
+import cache
 import const
+import incremental
+import json_stream
+import pipeline
+import probing
+import sampler
+import spatial
+import telemetry
+import transfer
+import weight_file
+import weights
 
 
 BONE_DELTA = const.BONE_DELTA # The amount of distance each bone should be moved to determine weighting.
 FAILURE_THRESHOLD = const.FAILURE_THRESHOLD # How many bones can fail before user is prompted with warning
 DEBUG = const.DEBUG
 NORMALIZE = const.NORMALIZE
+PROBE_AXIS_EPSILON = const.PROBE_AXIS_EPSILON
+
+# The directions each bone in a probe group gets moved, world +Y first so single bone probes match the original behaviour.
+PROBE_AXES = ( 1, 0, 2 )
 
 
 ##################
@@ -29,169 +49,527 @@ NORMALIZE = const.NORMALIZE
 ##################
 
 
-def determine_weighting( transform, root_bone = None, tolerance = -1 ):	
+def determine_weighting( transform, root_bone = None, tolerance = -1, batch_probes = None, previous_data = None, spatial_index = None, spatial_verify = None,
+                         max_influences = None, prune_threshold = None, pipeline_workers = None, result_cache = None, probe_samples = None ):	
+	"""
+	Main method which holds logic for determining the weighting for a given transform. Runs a Weighting_Job start to finish, see
+	iterate_weighting for the kwargs.
+	
+	transform can also be a list of meshes bound to the same skeleton. They all get sampled off one pass over the bones, and data
+	comes back as { mesh_name : data }, with previous_data given the same way.
+	
+	Returns [ data, message ]
+	"""
+	job = Weighting_Job( transform, root_bone, tolerance = tolerance, batch_probes = batch_probes, previous_data = previous_data,
+	                     spatial_index = spatial_index, spatial_verify = spatial_verify, max_influences = max_influences,
+	                     prune_threshold = prune_threshold, pipeline_workers = pipeline_workers, result_cache = result_cache, probe_samples = probe_samples )
+	return job.run( )
+
+
+def probe_bone_weights( transform, root_bone, bone_names, tolerance = -1, batch_probes = None, pipeline_workers = None, probe_samples = None ):
+	"""
+	Probes just the given bones of the skeleton under root_bone. Used by the distributed workers, each of which probes its own share.
+	
+	Returns [ { bone_name : ( vert_ids, weights ) }, message ], the raw weights before any pruning or normalizing.
 	"""
-	Main method which holds logic for determining the weighting for a given transform.
+	job = Weighting_Job( transform, root_bone, tolerance = tolerance, batch_probes = batch_probes, pipeline_workers = pipeline_workers, bone_names = bone_names,
+	                     probe_samples = probe_samples )
+	return job.run( )
+
+
+class Weighting_Job( object ):
+	"""
+	determine_weighting broken into steps, one per probe, so a UI can run it a bit at a time between events and show progress.
+	
+		job = Weighting_Job( transform, root_bone, interactive = True )
+		while job.step( ):
+			progress_bar.setProgress( job.done )
+		data, message = job.data, job.message
+	
+	With interactive on, undo recording and viewport refreshes go back to normal between steps, so Maya stays usable while the job
+	waits. cancel( ) stops the job where it is and puts the skeleton back in its rest pose.
 	"""
-	if not transform or not root_bone:
-		return False, 'One or both objects were not found. Transform : {0} | Root_bone : {1}'.format( transform, root_bone )
+	def __init__( self, transform, root_bone = None, interactive = False, **kwargs ):
+		self.interactive = interactive
+		self.done = 0 # Bones probed so far
+		self.total = 0 # Bones to probe, known once the skeleton has been walked
+		self.data = None
+		self.results = { } # mesh_name : data, filled in as each mesh finishes
+		
+		# A list of transforms shares one pass over the skeleton, and data comes back as { mesh_name : data }.
+		self.multiple_meshes = isinstance( transform, ( list, tuple ) )
+		if not self.multiple_meshes:
+			transform = [ transform ] if transform else [ ]
+			if transform and kwargs.get( 'previous_data' ):
+				kwargs[ 'previous_data' ] = { sampler.get_node_name( transform[ 0 ] ) : kwargs[ 'previous_data' ] }
+		self.message = None
+		self.finished = False
+		self.cancelled = False
+		self.start_time = None
+		self.steps = iterate_weighting( self, transform, root_bone, **kwargs )
 	
-	try:
-		# If it's not a pymel node, we'll make it one for the early stages of data collection about objects, not verts. 
-		if not isinstance( transform, pymel.core.nodetypes.DagNode ):
-			transform = pymel.core.PyNode( transform )
-		if not isinstance( root_bone, pymel.core.nodetypes.DagNode ):
-			root_bone = pymel.core.PyNode( root_bone )
-	except pymel.core.MayaNodeError as exception:
-		return False, '{0}'.format( exception )
+	def step( self ):
+		"""
+		Runs the job up to its next stopping point. Returns False once it's finished or cancelled.
+		"""
+		if self.finished:
+			return False
+		if self.start_time is None:
+			self.start_time = timeit.default_timer( )
 		
-	rest_vert_positions = query_vertex_positions( transform )
+		try:
+			next( self.steps )
+		except StopIteration:
+			self.finished = True
+		except:
+			# Whatever went wrong, the job can't carry on from here
+			self.finished = True
+			raise
+		return not self.finished
+	
+	def run( self ):
+		"""
+		Runs every remaining step. Returns [ data, message ]
+		"""
+		while self.step( ):
+			pass
+		return self.data, self.message
+	
+	def cancel( self ):
+		"""
+		Stops the job. Closing the steps unwinds the probe context, which resets the skeleton.
+		"""
+		if self.finished:
+			return False
+		self.steps.close( )
+		self.finished = True
+		self.cancelled = True
+		self.data, self.message = False, 'Cancelled after {0}/{1} bones'.format( self.done, self.total )
+		print 'Skin Weight Calculation : {0}'.format( self.message )
+		return True
+	
+	def get_data( self ):
+		if self.multiple_meshes:
+			return self.results
+		return self.results.values( )[ 0 ] if self.results else None
+	
+	def get_elapsed( self ):
+		if self.start_time is None:
+			return 0.0
+		return timeit.default_timer( ) - self.start_time
+	
+	def get_eta( self ):
+		"""
+		Seconds left, going by the average time per bone so far. None until the first bone is done.
+		"""
+		if not self.done or not self.total:
+			return None
+		return self.get_elapsed( ) / self.done * ( self.total - self.done )
+
+
+def iterate_weighting( job, transforms, root_bone = None, tolerance = -1, batch_probes = None, previous_data = None, spatial_index = None, spatial_verify = None,
+                       max_influences = None, prune_threshold = None, pipeline_workers = None, result_cache = None, bone_names = None, probe_samples = None ):	
+	"""
+	The steps of a Weighting_Job. Yields after each probe, and leaves { mesh_name : data } in job.results and the message in job.message.
+	
+	Every mesh in transforms is sampled off the same bone moves, so the skeleton only gets probed once however many meshes it
+	drives. Each mesh only needs the bones that changed for it, and the probes cover all of those.
+	
+	batch_probes moves up to three bones per mesh evaluation, each along its own axis, and splits their weights back apart per axis.
+	Only valid for deformers that are linear in the bone translations ( ie. linear skinning ). Defaults to const.BATCH_PROBES.
+	
+	probe_samples is how many poses each probe goes through, each bone along a different axis every time, with the weights solved
+	from all of them at once. The bones move get_probe_delta( ) for these meshes. Defaults to const.PROBE_SAMPLES.
+	
+	previous_data is { mesh_name : data } from an earlier run on the same meshes. When given, only the bones whose fingerprint
+	changed since then get probed again, everything else is reused from the previous data.
+	
+	spatial_index only samples the verts near each bone, once the first few full probes have shown how far bones reach. spatial_verify
+	full scans every probe as well and falls back to the full result wherever they differ. Default to const.SPATIAL_INDEX and
+	const.SPATIAL_INDEX_VERIFY.
+	
+	max_influences keeps only that many of the largest weights per vertex, and prune_threshold drops weights below that fraction of
+	their vertex's total, before normalizing. Default to const.MAX_INFLUENCES and const.PRUNE_THRESHOLD, 0 turns either off.
+	
+	pipeline_workers is how many threads work the weights out while the next bones are probed, defaults to const.PIPELINE_WORKERS.
+	The spatial index needs each probe's result before picking the next one's verts, so it always does the math inline.
+	
+	result_cache is a cache.Result_Cache. Any mesh it already holds a result for, with this skeleton and settings, gets that back
+	without being probed, otherwise the new result gets stored in it.
+	
+	bone_names only probes those bones, for a worker calculating its share of a distributed run ( see distributed.py ). Nothing gets
+	consolidated then, job.results holds each mesh's raw { bone_name : ( vert_ids, weights ) } instead of its data.
+	"""
+	if batch_probes is None:
+		batch_probes = const.BATCH_PROBES
+	if spatial_index is None:
+		spatial_index = const.SPATIAL_INDEX
+	if spatial_verify is None:
+		spatial_verify = const.SPATIAL_INDEX_VERIFY
+	if max_influences is None:
+		max_influences = const.MAX_INFLUENCES
+	if prune_threshold is None:
+		prune_threshold = const.PRUNE_THRESHOLD
+	if pipeline_workers is None:
+		pipeline_workers = const.PIPELINE_WORKERS
+	if probe_samples is None:
+		probe_samples = const.PROBE_SAMPLES
+	
+	if not transforms or not all( transforms ) or not root_bone:
+		job.message = 'One or both objects were not found. Transform : {0} | Root_bone : {1}'.format( transforms, root_bone )
+		return
+	
+	# Everything from here on works with node names, pymel nodes ( from the UI ) get turned into theirs.
+	transforms = [ sampler.get_node_name( transform ) for transform in transforms ]
+	root_bone = sampler.get_node_name( root_bone )
+	for node_name in transforms + [ root_bone ]:
+		if not maya.cmds.objExists( node_name ):
+			job.message = 'No object matches name: {0}'.format( node_name )
+			return
+	
 	ordered_bone_list = get_ordered_bone_list( root_bone, [ root_bone ] )
-	bone_vert_association = { }
 	
 	# Create a list of tuples with each bone and its corresponding locator. We then make an expression locking them. Animation/constraints cannot be on the skeleton.
 	#bone_and_locators = create_locators( ordered_bone_list )
 	#create_expression( bone_and_locators )
 	
-	weight_data = { } # Final data to be sent out, Dictionary to associate verts with bones and weights for application to the skin cluster.
+	# Each mesh keeps its own sampler, fingerprint and weights. Any that are already in the cache are done before probing starts.
+	mesh_weightings = [ ]
+	rest_point_arrays = [ ]
+	for transform in transforms:
+		mesh_weighting = Mesh_Weighting( transform, ordered_bone_list, tolerance, max_influences = max_influences, prune_threshold = prune_threshold,
+		                                 previous_data = ( previous_data or { } ).get( transform ), result_cache = result_cache )
+		rest_point_arrays.append( mesh_weighting.rest_vert_positions )
+		if mesh_weighting.data:
+			job.results[ transform ] = mesh_weighting.data
+		else:
+			mesh_weightings.append( mesh_weighting )
+	
+	if bone_names is not None:
+		for mesh_weighting in mesh_weightings:
+			mesh_weighting.bones_to_probe &= set( bone_names )
+	
+	# Probe every bone any of the meshes still needs, root to tip. Each probe moves one bone, or up to one bone per axis when batching.
+	bones_to_probe = [ bone_name for bone_name in ordered_bone_list if any( bone_name in mesh_weighting.bones_to_probe for mesh_weighting in mesh_weightings ) ]
+	probe_groups = get_probe_groups( bones_to_probe, batch_probes = batch_probes )
+	index = 0
+	job.total = len( bones_to_probe )
+	if not mesh_weightings:
+		job.data, job.message = job.get_data( ), 'Success'
+		return
+	yield # Setup's done, the probes come next
+	
+	if spatial_index:
+		bone_segments = get_bone_segments( ordered_bone_list )
+		for mesh_weighting in mesh_weightings:
+			mesh_weighting.build_influence_index( bone_segments )
+	
+	# Every probe moves the bones the same distance, sized to the meshes, so they all solve against the same probe matrix.
+	probe_delta = get_probe_delta( rest_point_arrays )
+	
+	# The probe context keeps the moves out of the undo queue and puts every bone back, even if something in here fails.
+	# The pipeline takes the full scan snapshots and works their weights out on other threads while the next bones get moved. Every
+	# mesh holds a buffer while the poses get sampled, so the pool needs room for all of them on top of the queue.
+	weight_pipeline = pipeline.Weight_Pipeline( calculate_probe_weights, worker_count = 0 if spatial_index else pipeline_workers, held_buffers = len( mesh_weightings ) )
+	with weight_pipeline, probing.Probe_Context( bones_to_probe ) as probe_context:
+		for probe_group in probe_groups:
+			group_names = [ ]
+		
+			for bone_name in probe_group:
+				group_names.append( bone_name )
+				index += 1
+				print 'Skin Weight Calculation : Processing {0}/{1} | {2}'.format( index, len( bones_to_probe ), bone_name )
+			
+			probe_poses = get_probe_poses( len( group_names ), probe_samples )
+			probe_matrix = get_probe_matrix( probe_poses, probe_delta )
+			
+			# Every mesh that needs one of these bones samples these same poses
+			probe_meshes = [ mesh_weighting for mesh_weighting in mesh_weightings if any( bone_name in mesh_weighting.bones_to_probe for bone_name in group_names ) ]
+			for mesh_weighting in probe_meshes:
+				mesh_weighting.start_probe( group_names, len( probe_poses ), weight_pipeline, spatial_verify = spatial_verify )
+			
+			# A mesh whose influence index missed verts needs every pose sampled again in full, which is rare enough to just repeat them.
+			while probe_meshes:
+				for probe_axes in probe_poses:
+					# Do our movement. The whole group and its children move in one batch against the skeleton snapshot.
+					with telemetry.stage( 'move' ):
+						moved_bones = probe_context.move_bones( group_names, probe_axes, delta = probe_delta )
+					
+					for mesh_weighting in probe_meshes:
+						mesh_weighting.sample_probe( )
+					
+					# Reset the bones and their children to their rest positions, straight from the snapshot.
+					with telemetry.stage( 'reset' ):
+						probe_context.reset( moved_bones )
+				
+				probe_meshes = [ mesh_weighting for mesh_weighting in probe_meshes if not mesh_weighting.finish_probe( probe_matrix, weight_pipeline, spatial_verify = spatial_verify ) ]
+			
+			# Hand control back between probes. Interactive jobs give Maya its undo queue and viewport back while they wait.
+			job.done = index
+			if job.interactive:
+				probe_context.pause( )
+			yield
+			if job.interactive:
+				probe_context.resume( )
+		
+		# Wait on whatever the pipeline still has queued. The tables get filled in bone order below, however the probes finished.
+		with telemetry.stage( 'pipeline_wait' ):
+			for ( mesh_name, group_names ), bone_weights in weight_pipeline.get_results( ).iteritems( ):
+				for mesh_weighting in mesh_weightings:
+					if mesh_weighting.name == mesh_name:
+						mesh_weighting.bone_vert_association.update( zip( group_names, bone_weights ) )
+	
+	for mesh_weighting in mesh_weightings:
+		job.results[ mesh_weighting.name ] = mesh_weighting.finish( ) if bone_names is None else mesh_weighting.bone_vert_association
+	
+	print 'Skin Calculation : Complete'
+	job.data, job.message = job.get_data( ), 'Success'
+
 
-	for index, bone in enumerate( ordered_bone_list ):
-		bone_name = bone.name( )
+class Mesh_Weighting( object ):
+	"""
+	One mesh's part of a weighting run. Holds its sampler, fingerprint and the per bone weights as they come in, and turns them into
+	the mesh's data at the end. If the result cache already has the mesh, data is filled in straight away and nothing needs probing.
+	"""
+	def __init__( self, transform, ordered_bone_list, tolerance, max_influences = None, prune_threshold = None, previous_data = None, result_cache = None ):
+		self.start_time = timeit.default_timer( )
+		self.name = transform
+		self.ordered_bone_list = ordered_bone_list
+		self.tolerance = tolerance
+		self.max_influences = max_influences
+		self.prune_threshold = prune_threshold
+		self.result_cache = result_cache
+		self.data = None
 		
-		# Do our movement and calculation
-		print 'Skin Weight Calculation : Processing {0}/{1} | {2}'.format( index + 1, len( ordered_bone_list ), bone_name )
+		# The sampler resolves the mesh once and hands back the rest positions and each probe's positions as (N,3) arrays.
+		self.mesh_sampler = sampler.Mesh_Sampler( transform )
+		self.rest_vert_positions = self.mesh_sampler.rest_points
+		self.weight_table = weights.Weight_Table( len( self.rest_vert_positions ) ) # Associates verts with bones and weights, turned into the final data at the end.
 		
-		child_bones = [ ]
-		# Move the children to counter the movement of the parent.
-		_children = bone.getChildren( )
-		for _child in _children:
-			_child_bone_name = _child.name( ) 
-			# Get the starting translation for the child, counter translate the children
-			_child_starting_translation = maya.cmds.xform( _child_bone_name, query = True, translation = True, a = True, ws = True )
-			_child_new_translation = add_vector3s( _child_starting_translation, [ 0, -BONE_DELTA, 0 ] )
-			maya.cmds.xform( _child_bone_name, translation = _child_new_translation, a = True, ws = True )
-			
-			# Store the childs bone name and the starting position
-			child_bones.append( ( _child_bone_name, _child_starting_translation ) )			
+		self.influence_index = None
+		self.spatial_mismatches = [ ]
+		
+		# Fingerprint the mesh and skeleton, so this run ( or the next one ) can tell which bones need probing.
+		with telemetry.stage( 'fingerprint' ):
+			self.fingerprint = incremental.get_fingerprint( self.mesh_sampler, ordered_bone_list, tolerance, max_influences = max_influences, prune_threshold = prune_threshold )
+		
+		self.cache_key = None
+		if result_cache:
+			self.cache_key = cache.get_cache_key( self.name, self.fingerprint, ordered_bone_list )
+			with telemetry.stage( 'cache_lookup' ):
+				self.data = result_cache.lookup( self.cache_key )
+			if self.data:
+				print 'Skin Weight Calculation : {0} found in the cache, {1} hits and {2} misses this session'.format( self.name, result_cache.hits, result_cache.misses )
+				return
+		
+		self.bones_to_probe = set( ordered_bone_list )
+		self.bone_vert_association = { } # bone_name : ( vert_ids, weights ), filled by the previous data and the probes.
+		
+		if previous_data:
+			changed_bones = incremental.get_changed_bones( previous_data, self.fingerprint )
+			if changed_bones is None:
+				print 'Skin Weight Calculation : {0} | Previous data is not reusable ( mesh or settings changed, or it was pruned ), processing all bones'.format( self.name )
+			else:
+				with telemetry.stage( 'reuse_previous' ):
+					self.bone_vert_association = get_raw_bone_weights( previous_data )
+				self.bones_to_probe = set( changed_bones ) & self.bones_to_probe
+				print 'Skin Weight Calculation : {0} | Incremental, {1}/{2} bones changed'.format( self.name, len( self.bones_to_probe ), len( ordered_bone_list ) )
+	
+	def build_influence_index( self, bone_segments ):
+		with telemetry.stage( 'spatial_index' ):
+			self.influence_index = spatial.Influence_Index( self.rest_vert_positions, bone_segments )
+	
+	def start_probe( self, group_names, sample_count, weight_pipeline, spatial_verify = False ):
+		"""
+		Gets buffers ready for the group's poses. Only the verts near the bones get sampled if the influence index is ready, plus a
+		full scan when verifying. Without an index the full scans go straight into a pipeline buffer.
+		"""
+		influence_index = self.influence_index
+		self.probe_names = group_names
+		self.sample_index = 0
+		self.candidates = influence_index.get_candidates( group_names ) if influence_index else None
+		self.candidate_points = None
+		self.full_points = None
 		
-		# Get the starting translation so we can reset it back after we move it a bit
-		starting_translation = maya.cmds.xform( bone_name, query = True, translation = True, a = True, worldSpace = True )
-		new_translation = add_vector3s( starting_translation, [ 0, BONE_DELTA, 0 ] )
-		maya.cmds.xform( bone_name, translation = new_translation, a = True, worldSpace = True )
+		full_shape = ( sample_count, ) + self.rest_vert_positions.shape
+		if self.candidates is not None:
+			self.candidate_points = numpy.empty( ( sample_count, len( self.candidates ), 3 ) )
+		if self.candidates is None or spatial_verify:
+			self.full_points = numpy.empty( full_shape ) if influence_index else weight_pipeline.get_buffer( full_shape )
+	
+	def sample_probe( self ):
+		"""
+		Samples the mesh in the pose the bones are in now, into the next free row of the probe's buffers.
+		"""
+		if self.candidate_points is not None:
+			self.candidate_points[ self.sample_index ] = self.mesh_sampler.sample_rows( self.candidates )
+		if self.full_points is not None:
+			self.mesh_sampler.sample( self.full_points[ self.sample_index ] )
+		self.sample_index += 1
+	
+	def finish_probe( self, probe_matrix, weight_pipeline, spatial_verify = False ):
+		"""
+		Works out the group's weights from its samples, straight away or through the pipeline. Returns False if the influence index
+		missed verts and there's no full scan to fall back on, the poses then need sampling again ( in full ) before finishing again.
+		"""
+		group_names = self.probe_names
+		influence_index = self.influence_index
+		rest_vert_positions = self.rest_vert_positions
+		tolerance = self.tolerance
 		
-		# Get the new vert positions and calculate the weights for the specific bone
-		new_vert_positions = query_vertex_positions( transform )
-		new_vert_weights = calculate_vertex_weights( new_vert_positions, rest_vert_positions )
+		candidates = self.candidates
+		if candidates is not None:
+			bone_weights = calculate_probe_weights( self.candidate_points, rest_vert_positions[ candidates ], probe_matrix, tolerance, vert_ids = candidates )
 		
-		# Reset the bone
-		maya.cmds.xform( bone_name, translation = starting_translation, a = True, worldSpace = True )
+			# A vert moved further out than any bone has reached before, so there may be more outside the candidates.
+			if not all( influence_index.is_contained( bone_name, vert_ids ) for bone_name, ( vert_ids, _ ) in zip( group_names, bone_weights ) ):
+				influence_index.rescans += 1
+				candidates = self.candidates = None
+				if self.full_points is None:
+					self.full_points = numpy.empty( ( len( self.candidate_points ), ) + rest_vert_positions.shape )
+					self.candidate_points = None
+					self.sample_index = 0
+					return False
+			elif spatial_verify:
+				full_weights = calculate_probe_weights( self.full_points, rest_vert_positions, probe_matrix, tolerance )
+				if not all( numpy.array_equal( vert_ids, full_ids ) and numpy.array_equal( vert_weights, full_vert_weights ) for ( vert_ids, vert_weights ), ( full_ids, full_vert_weights ) in zip( bone_weights, full_weights ) ):
+					self.spatial_mismatches.extend( group_names )
+					bone_weights = full_weights
+		
+		if candidates is None and influence_index:
+			bone_weights = calculate_probe_weights( self.full_points, rest_vert_positions, probe_matrix, tolerance )
+			for bone_name, ( vert_ids, _ ) in zip( group_names, bone_weights ):
+				influence_index.learn( bone_name, vert_ids )
+		elif candidates is None:
+			# Nothing needs this probe's weights before the next one, so they're left to the pipeline. It's keyed by mesh and the group's bone names.
+			weight_pipeline.submit( ( self.name, tuple( group_names ) ), self.full_points, rest_vert_positions, probe_matrix, tolerance )
+			return True
+		
+		# Save the vert ids and their associated weights for each bone. Weights at or below the tolerance were already masked out.
+		self.bone_vert_association.update( zip( group_names, bone_weights ) )
+		return True
+	
+	def finish( self ):
+		"""
+		Fills the weight table from the probed and reused weights, prunes and normalizes it, and returns the mesh's data.
+		"""
+		influence_index = self.influence_index
+		if influence_index:
+			print 'Skin Weight Calculation : {0} | Spatial index, {1} full scans, {2} rescans, {3} candidate verts sampled'.format( self.name, influence_index.full_scans, influence_index.rescans, influence_index.candidate_count )
+		if self.spatial_mismatches:
+			maya.cmds.warning( 'Spatial index missed verts for {0} bones on {1}, the full scan results were used for them'.format( len( self.spatial_mismatches ), self.name ) )
+			print 'Skin Weight Calculation : Spatial index mismatches | {0}'.format( ', '.join( self.spatial_mismatches ) )
 		
-		# Save the weighting to the association dictionary
-		bone_vert_association[ bone_name ] = new_vert_weights
+		print 'Skin Weight calculation complete | Organizing data for {0} into skinPercent readable format'.format( self.name )
+		data = build_weight_data( self.weight_table, self.ordered_bone_list, self.bone_vert_association, fingerprint = self.fingerprint,
+		                          max_influences = self.max_influences, prune_threshold = self.prune_threshold )
 		
-		# Reset the children to their starting positions
-		if child_bones:
-			for _child, vector in child_bones:
-				maya.cmds.xform( _child, translation = vector, a = True, ws = True )
+		if self.cache_key:
+			with telemetry.stage( 'cache_store' ):
+				self.result_cache.store( self.cache_key, data, seconds = timeit.default_timer( ) - self.start_time )
+		
+		self.data = data
+		return data
+	
 
-		# Get the vert id and it's associated weight for this bone
-		for vert_id, weight in bone_vert_association[ bone_name ].iteritems():
-			# If the weight is below the tolerance, we skip it
-			if weight <= tolerance:
-				continue
-			
-			vert_id_string = str( vert_id )
-			if vert_id_string not in weight_data.keys( ):
-				weight_data[ vert_id_string ] = [ ]
-			weight_data[ vert_id_string ].append( ( bone_name, weight ) )
-			
-	print 'Skin Weight calculation complete | Organizing data into skinPercent readable format'
-	bone_name_list = [ bone.name( ) for bone in ordered_bone_list ] # Make this list so we don't have to keep pymel objs around for the weight application. We only need the names
+def build_weight_data( weight_table, ordered_bone_list, bone_vert_association, fingerprint = None, max_influences = None, prune_threshold = None ):
+	"""
+	Fills the empty weight table from the per bone ( vert_ids, weights ), prunes and normalizes it, and returns the data dictionary.
+	"""
+	# Fill the table root to tip, whether the weights came from a probe or from the previous data, so the sums come out the same either way.
+	with telemetry.stage( 'consolidate' ) as consolidate_stage:
+		for bone_name in ordered_bone_list:
+			vert_ids, vert_weights = bone_vert_association[ bone_name ]
+			weight_table.add_bone( bone_name, vert_ids, vert_weights )
+		weight_table.build( )
+		consolidate_stage.add_bytes( weight_table.get_byte_count( ) )
+	
+	# Trim each vertex down to its largest weights. The totals are taken afterwards, so the kept weights still normalize to 1.0.
+	if max_influences or prune_threshold:
+		with telemetry.stage( 'prune', weight_table.weights.nbytes ):
+			pruned_count = weight_table.prune( max_influences = max_influences, threshold = prune_threshold )
+		print 'Skin Weight Calculation : Pruned {0} weights | Max influences {1}, threshold {2}'.format( pruned_count, max_influences, prune_threshold )
+	totals = weight_table.get_totals( )
 			
 	if NORMALIZE:
-		messages = [ ]
 		print 'Skin Weight organization complete | Normalizing weight data'
-		for vert_id_string in weight_data.keys( ):
-			weight_list = weight_data[ vert_id_string ]
-			normalized_weight_list, message = normalize_vertex_weighting( weight_list )
-			
-			weight_data[ vert_id_string ] = normalized_weight_list
-			messages.append( message )
-		
-		# If we failed at all during the normalization step, we want to know.
-		if False in messages:
-			failures = [ result for result in messages if not result ]
-			print 'Even after normalizing: {0} still are not 1.0'.format( len( failures ) )
-	
-	data = consolidate_data( weight_data, bone_name_list )
-	
-	print 'Skin Calculation : Complete'
-	# Clean up the scene and collect some last minute info.
-	return data, 'Success'
+		with telemetry.stage( 'normalize', weight_table.weights.nbytes ):
+			weight_table.normalize( )
 	
+	# The bone names come from the table, in the same root to tip order.
+	with telemetry.stage( 'consolidate' ):
+		# The weights stay in the table, a Weight_Mapping view hands them out per vertex without building the whole dictionary.
+		data = consolidate_data( weights.Weight_Mapping( weight_table ), weight_table.bone_names )
+		
+		# Extra info for incremental reruns. The totals let the next run undo the normalization on the weights it reuses.
+		if fingerprint:
+			data[ 'fingerprint' ] = fingerprint
+		if NORMALIZE:
+			data[ 'totals' ] = dict( ( str( vert_id ), total ) for vert_id, total in zip( weight_table.get_vertex_ids( ).tolist( ), totals[ weight_table.get_vertex_ids( ) ].tolist( ) ) )
+	return data
+
 
-def apply_weighting( transform, skincluster = None, data = None ):
+def apply_weighting( transform, skincluster = None, data = None, method = None, differential = None, epsilon = None ):
 	"""
 	Main method which holds logic for applying weighting data
+	
+	method picks how the weights get written, 'api' ( bulk MFnSkinCluster.setWeights ) or 'skinpercent' ( one skinPercent per vert ).
+	Defaults to const.APPLY_METHOD. Note the api path writes outside of the undo queue.
+	
+	differential reads the skin cluster's current weights first and only writes the verts and influences that differ from the data
+	by more than epsilon. Defaults to const.APPLY_DIFFERENTIAL and const.APPLY_EPSILON, and needs the api method.
 	"""
-	# If it's not a pymel node, we'll make it one for the early stages of data collection about objects, not verts. 
-	try:
-		if not isinstance( transform, pymel.core.nodetypes.DagNode ):
-			transform = pymel.core.PyNode( transform )
-	except pymel.core.MayaNodeError as exception :
-		return False, '{0}'.format( exception )
+	# Check the settings before anything in the scene gets touched.
+	method = method or const.APPLY_METHOD
+	if differential is None:
+		differential = const.APPLY_DIFFERENTIAL
+	if method not in ( 'api', 'skinpercent' ):
+		return False, 'Unknown application method : {0}'.format( method )
+	if differential and method != 'api':
+		return False, 'Differential application needs the api method, not {0}'.format( method )
+	
+	transform = sampler.get_node_name( transform )
+	if not maya.cmds.objExists( transform ):
+		return False, 'No object matches name: {0}'.format( transform )
 	
 	if not skincluster:
 		print 'Skin Weight Application : Getting the skin cluster'
 		# Get the objects history and then grab the skincluster from it
-		history = maya.cmds.listHistory(  transform.name( ) )
+		history = maya.cmds.listHistory(  transform )
 		skinclusters = maya.cmds.ls( history, type = 'skinCluster' )
 		
 		# If we did not get a skincluster, we need to get out
 		if not skinclusters:
 			return False, 'No skin cluster found, apply one to the mesh passed in'
 		skincluster = skinclusters[ 0 ]
-		py_cluster  = pymel.core.PyNode( skincluster )
+	skincluster = sampler.get_node_name( skincluster )
 	
-	# Unpack the data from the file
-	weight_data = data[ 'weight' ]
+	# Unpack the data from the file into a weight table
+	with telemetry.stage( 'consolidate' ) as consolidate_stage:
+		weight_table = weights.Weight_Table.from_data( data )
+		consolidate_stage.add_bytes( weight_table.get_byte_count( ) )
 	ordered_bone_list = data[ 'order' ]
 	
-	bone_failure = [ ]    # List to catch our failures :(
 	print 'Skin Weight Application : Applying vertex weighting'
 	
-	# Logging variable declaration/initialization
-	notify_total_weights = False
-	vertices_evaluated = [ ] 	
-	total_weights = [ ]	
+	# Normalize the whole table in one go, rather than vert by vert as they're applied
+	if NORMALIZE:
+		with telemetry.stage( 'normalize', weight_table.weights.nbytes ):
+			weight_table.normalize( )
 	
-	# Remove any normalizing that maya will try to do and remove all the weighting on the current skincluster.
-	py_cluster.setNormalizeWeights( 0 )
-	remove_all_weighting( skincluster, transform, ordered_bone_list, weight_data.keys( ) )	
+	# Remove any normalizing that maya will try to do, the writers below clear out the old weighting as they go.
+	maya.cmds.setAttr( skincluster + '.normalizeWeights', 0 )
 	
-	# For each vert, we'll get the list of ( bone_name, weight ) and apply it to the vertex
-	for vert_id in weight_data.keys( ):
-		weight_list = weight_data[ vert_id ]
-		
-		if NORMALIZE:
-			weight_list, message = normalize_vertex_weighting( weight_list )
-			if not message:
-				notify_total_weights = True
-			
-		if DEBUG:
-			total_weight = calculate_total_vertex_weight( weight_list )
-			total_weights.append( calculate_total_vertex_weight( weight_list ) )	
-
-		# We apply the weighting to the skin cluster
-		try:
-			maya.cmds.skinPercent( skincluster, transform + '.vtx[{0}]'.format( vert_id ), tv = weight_data[ vert_id ] )
-			vertices_evaluated.append( vert_id )
-			
-		# If we failed, we catch it and save it to the failure list to notify the user later
-		except RuntimeError as excep:
-			failure_string = 'Bone Failure: {0}'.format( excep )
-			if failure_string not in bone_failure:
-				bone_failure.append( failure_string )
+	message = 'Success'
+	if method == 'api':
+		bone_failure, write_counts = write_weights_api( skincluster, weight_table, ordered_bone_list, differential = differential, epsilon = epsilon )
+		if differential:
+			message = 'Success | {0}/{1} verts changed, {2} weights written'.format( write_counts[ 'written_verts' ], write_counts[ 'verts' ], write_counts[ 'written_weights' ] )
+			print 'Skin Weight Application : Differential | {0}'.format( message.split( ' | ' )[ -1 ] )
+		if write_counts[ 'failed_verts' ]:
+			message = 'Partial | {0}/{1} verts failed to write, see console'.format( write_counts[ 'failed_verts' ], write_counts[ 'verts' ] )
+	else:
+		bone_failure = write_weights_skinpercent( skincluster, transform, weight_table, ordered_bone_list )
 	
 	# Only notify the user of failure if within this level
 	if len( bone_failure ) > FAILURE_THRESHOLD:
@@ -200,17 +578,55 @@ def apply_weighting( transform, skincluster = None, data = None ):
 			print failure_string
 	
 	if DEBUG:
-		non_one_count = 0
-		for weight in total_weights:
-			if weight != 1.0:
-				non_one_count += 1
+		non_one_count = weight_table.count_unnormalized( )
 		print 'Verts not exactly normalized to 1.0 :', non_one_count
 	
-		if notify_total_weights:
-			pprint.pprint( total_weights )
+		if non_one_count:
+			pprint.pprint( weight_table.get_totals( )[ weight_table.get_vertex_ids( ) ].tolist( ) )
 	print 'Skin Weight Application : Complete'
 	
-	return True, 'Success'
+	return True, message
+
+
+def transfer_weighting( source_transform, target_transform, data = None, mode = None, neighbours = None, use_cache = None ):
+	"""
+	Maps the source mesh's calculated data onto the target mesh without probing anything, for LODs and other meshes with the same
+	shape as the one that was converted. Both meshes need to line up in object space. See transfer.py.
+	
+	mode is 'barycentric' ( the closest source triangle ) or 'nearest' ( the neighbours nearest source verts ), they default to
+	const.TRANSFER_MODE and const.TRANSFER_NEIGHBOURS. use_cache keeps the correspondence between the meshes on disk, defaults to
+	const.TRANSFER_CACHE_ENABLED.
+	
+	Returns [ data, message ]
+	"""
+	source_transform = sampler.get_node_name( source_transform )
+	target_transform = sampler.get_node_name( target_transform )
+	for node_name in ( source_transform, target_transform ):
+		if not maya.cmds.objExists( node_name ):
+			return None, 'No object matches name: {0}'.format( node_name )
+	
+	with telemetry.stage( 'sample' ):
+		source_sampler = sampler.Mesh_Sampler( source_transform )
+		source_points = source_sampler.rest_points
+		target_points = sampler.Mesh_Sampler( target_transform ).rest_points
+	
+	with telemetry.stage( 'correspondence' ):
+		correspondence = transfer.get_correspondence( source_points, target_points, neighbours = neighbours, mode = mode, use_cache = use_cache,
+		                                              source_topology = source_sampler.mfn_mesh.getVertices( ) )
+	
+	print 'Skin Weight Transfer : {0} -> {1} | {2} verts from {3}'.format( source_transform, target_transform, len( target_points ), len( source_points ) )
+	with telemetry.stage( 'consolidate' ) as consolidate_stage:
+		source_table = weights.Weight_Table.from_data( data )
+		weight_table = correspondence.transfer( source_table )
+		consolidate_stage.add_bytes( weight_table.get_byte_count( ) )
+	
+	if NORMALIZE:
+		with telemetry.stage( 'normalize', weight_table.weights.nbytes ):
+			weight_table.normalize( )
+	
+	with telemetry.stage( 'consolidate' ):
+		target_data = consolidate_data( weights.Weight_Mapping( weight_table ), weight_table.bone_names )
+	return target_data, 'Success'
 
 
 #####################
@@ -219,17 +635,13 @@ def apply_weighting( transform, skincluster = None, data = None ):
 
 def get_ordered_bone_list( bone, bone_list = None ):
 	'''
-	Recursive search for children of the <bone> and places them in the <bone_list>.
+	Recursive search for the child joints of the <bone> and places their names in the <bone_list>.
 	'''
 	# We didn't get a bone_list passed in, so we'll just make one to return later
 	if bone_list == None:
 		bone_list = [ ]
 			
-	for child in bone.getChildren( ):
-		# If the child we got isn't a Joint, we're going to pass on it.
-		if not isinstance( child, pymel.core.nodetypes.Joint ):
-			continue
-			
+	for child in get_child_joints( bone ):
 		# Add the child to the list and run the method again
 		bone_list.append( child )
 		get_ordered_bone_list( child, bone_list )
@@ -237,47 +649,133 @@ def get_ordered_bone_list( bone, bone_list = None ):
 	return bone_list
 
 
-def query_vertex_positions( transform ):
-	"""
-	Queries all vertex positions from a given transform
+def get_child_joints( bone ):
+	'''
+	Returns the names of the bone's child joints, as short as they can be while still being unique.
+	'''
+	children = maya.cmds.listRelatives( bone, children = True, type = 'joint', fullPath = True ) or [ ]
+	return maya.cmds.ls( children ) if children else [ ]
 
-	Using Maya Python API 2.0
+
+def get_raw_bone_weights( data ):
+	"""
+	Splits previously calculated data back into per bone ( vert_ids, weights ) arrays, as they were before normalization.
 	"""
+	weight_table = weights.Weight_Table.from_data( data )
+	if data.get( 'totals' ) is not None:
+		# The raw weights were rounded before they were normalized, so rounding again takes out the error from the divide and multiply.
+		weight_table.scale_rows( weights.get_totals_array( data[ 'totals' ], weight_table.vertex_count ) )
+		weight_table.weights = round_float_array( weight_table.weights )
+		
+	return weight_table.get_bone_columns( )
 
-	# Create a selectionList and add our transform to it
-	sel_list = om2.MSelectionList()
-	sel_list.add( transform.name() )
 
-	# Get the dag path of the first item in the selection list
-	sel_obj = sel_list.getDagPath( 0 )
+def get_bone_segments( ordered_bone_list ):
+	"""
+	Returns { bone_name : ( segments, length ) } for the spatial index. Segments run from each bone to its child joints, a bone with
+	no child joints is a single point and borrows its parent's length.
+	"""
+	positions = dict( ( bone_name, numpy.array( maya.cmds.xform( bone_name, query = True, translation = True, a = True, ws = True ) ) ) for bone_name in ordered_bone_list )
+	parent_lengths = { }
+	bone_segments = { }
+	
+	# Root to tip, so every parent's length is known before its children need it.
+	for bone_name in ordered_bone_list:
+		position = positions[ bone_name ]
+		children = [ child_name for child_name in get_child_joints( bone_name ) if child_name in positions ]
+		
+		segments = [ ( position, positions[ child_name ] ) for child_name in children ] or [ ( position, position ) ]
+		length = max( [ numpy.linalg.norm( positions[ child_name ] - position ) for child_name in children ] or [ parent_lengths.get( bone_name, 0.0 ) ] )
+		for child_name in children:
+			parent_lengths[ child_name ] = length
+		bone_segments[ bone_name ] = ( numpy.array( segments ), length )
+	
+	return bone_segments
 
-	# create a Mesh functionset from our dag object
-	mfn_object = om2.MFnMesh( sel_obj )
 
-	return mfn_object.getPoints()
+def get_probe_groups( ordered_bone_list, batch_probes = False ):
+	"""
+	Splits the ordered bone list into the groups of bones that get probed together. One bone per group unless batching,
+	then up to one bone per axis in PROBE_AXES. Order is kept so weights still land in the table root to tip.
+	"""
+	group_size = len( PROBE_AXES ) if batch_probes else 1
+	return [ ordered_bone_list[ index:index + group_size ] for index in xrange( 0, len( ordered_bone_list ), group_size ) ]
 
 
-def calculate_vertex_distance( vector1, vector2 ):
-	"""
-	Calculate the absolute distance between two vectors.
+def calculate_probe_weights( new_positions, rest_positions, probe_matrix, tolerance, vert_ids = None ):
 	"""
-	#x = ( round_float( vector1[ 0 ] ) - round_float( vector2[ 0 ] ) ) ** 2
-	#y = ( round_float( vector1[ 1 ] ) - round_float( vector2[ 1 ] ) ) ** 2
-	#z = ( round_float( vector1[ 2 ] ) - round_float( vector2[ 2 ] ) ) ** 2
+	Works out the weights for each bone in a probe group from its poses. new_positions is (S,N,3), the mesh sampled in each of the
+	S poses, and probe_matrix the (S*3,B) offsets the bones got in them ( see get_probe_matrix ). rest_positions and new_positions
+	can be a subset of the mesh, in which case vert_ids maps their rows back to the mesh's vert ids.
 	
-	difference_x = vector1[ 0 ] - vector2[ 0 ]
-	difference_y = vector1[ 1 ] - vector2[ 1 ]
-	difference_z = vector1[ 2 ] - vector2[ 2 ]
+	A vert's displacements, stacked pose by pose, are the probe matrix times its weights. So every vert's weights come out of one
+	least squares solve, one matrix multiply with the probe matrix's pseudo inverse. Weights that moved the vert less than
+	PROBE_AXIS_EPSILON along their bone's offsets are treated as noise.
 	
-	difference_x_sqr = difference_x ** 2
-	difference_y_sqr = difference_y ** 2
-	difference_z_sqr = difference_z ** 2
-	
-	sum_of_deltas = difference_x_sqr + difference_y_sqr + difference_z_sqr
+	Returns [ ( vert_ids, weights ), ... ] one per bone in the group.
+	"""
+	with telemetry.stage( 'weight_math' ) as math_stage:
+		sample_count = len( new_positions )
+		displacements = ( new_positions - rest_positions ).transpose( 1, 0, 2 ).reshape( -1, sample_count * 3 )
+		solved_weights = numpy.dot( displacements, numpy.linalg.pinv( probe_matrix ).T )
+		rounded_weights = round_float_array( solved_weights )
+		
+		# round_float_array can't promise the same answer as round_float when a value sits right on a half step, so those few go through round_float.
+		for index in numpy.flatnonzero( _is_rounding_tie( solved_weights ) ):
+			rounded_weights.flat[ index ] = round_float( solved_weights.flat[ index ] )
+		
+		# How far each bone moved, on average over the poses, per unit of weight.
+		bone_deltas = numpy.sqrt( ( probe_matrix ** 2 ).sum( axis = 0 ) / sample_count )
+		
+		bone_weights = [ ]
+		for column, bone_delta in enumerate( bone_deltas ):
+			rows = numpy.flatnonzero( solved_weights[ :, column ] * bone_delta > PROBE_AXIS_EPSILON )
+			weights = rounded_weights[ rows, column ]
+			
+			# If the weight is below the tolerance, we skip it
+			if tolerance is not None:
+				keep = weights > tolerance
+				rows = rows[ keep ]
+				weights = weights[ keep ]
+			bone_weights.append( ( rows if vert_ids is None else vert_ids[ rows ], weights ) )
+		math_stage.add_bytes( sum( bone_ids.nbytes + bone_weight.nbytes for bone_ids, bone_weight in bone_weights ) )
 	
-	distance = sum_of_deltas ** 0.5
+	return bone_weights
+
+
+def get_probe_delta( rest_point_arrays ):
+	"""
+	Picks how far the bones get moved while probing the meshes. With const.ADAPTIVE_DELTA it's const.PROBE_DELTA_SCALE of the
+	largest mesh's bounding box diagonal, snapped to a power of two so dividing the displacements back down by it is exact.
+	Otherwise, or for meshes with no size at all, it's BONE_DELTA.
+	"""
+	if not const.ADAPTIVE_DELTA:
+		return BONE_DELTA
 	
-	return distance
+	diagonals = [ numpy.linalg.norm( rest_points.max( axis = 0 ) - rest_points.min( axis = 0 ) ) for rest_points in rest_point_arrays if len( rest_points ) ]
+	if not diagonals or not max( diagonals ) > 0:
+		return BONE_DELTA
+	return 2.0 ** round( math.log( const.PROBE_DELTA_SCALE * max( diagonals ), 2 ) )
+
+
+def get_probe_poses( group_size, sample_count = 1 ):
+	"""
+	Returns the world axis each bone of a probe group moves along, per pose. The bones are on different axes in every pose, and
+	each pose turns them all one axis further, so a lone bone's first pose is world +Y like it's always been.
+	"""
+	return [ [ PROBE_AXES[ ( bone_index + pose_index ) % len( PROBE_AXES ) ] for bone_index in range( group_size ) ] for pose_index in range( max( 1, sample_count ) ) ]
+
+
+def get_probe_matrix( probe_poses, delta ):
+	"""
+	Returns the (S*3,B) matrix of world offsets each bone gets in each pose. Rows go pose by pose, x y z, to line up with the stacked
+	vertex displacements in calculate_probe_weights.
+	"""
+	probe_matrix = numpy.zeros( ( len( probe_poses ) * 3, len( probe_poses[ 0 ] ) ) )
+	for pose_index, probe_axes in enumerate( probe_poses ):
+		for bone_index, axis in enumerate( probe_axes ):
+			probe_matrix[ pose_index * 3 + axis, bone_index ] = delta
+	return probe_matrix
 
 
 def round_float( number ):
@@ -289,47 +787,19 @@ def round_float( number ):
 	return rounded
 	
 
-def calculate_vertex_weights( new_positions, rest_positions ):
+def round_float_array( numbers ):
 	"""
-	Here we do some really simple math to determine the weights we want to associate with this bone. The weights being spit out here
-	will not be perfect as it's the amount of movement th1at this bone causes in the verts ( between 0 and 1 ). 
-	
-	Why won't it be perfect? The hierarchy says the root bone will move all other bones below, etc. That means, even if the root bone has no weighting to it
-	from many of the vertices, it'll stay say all verts will be 1.0 because the root bone moves each bone. We don't worry about this though, as the application 
-	process goes from the root bone to the tips, meaning that weight is applied to the root bone at first, and then slowly chipped away by other bones, similar 
-	to the way some people choose to paint their weights in a normal situation.
+	Rounds a float array to 3 decimals, the array counterpart to round_float.
 	"""
-	# We make a dictionary to store weights in
-	list_of_weights = {}
+	return numpy.round( numbers, 3 )
 
-	# Get list of indexes to get distance on
-	index_list = [(i) for i, j in enumerate(zip(new_positions, rest_positions)) if j[0] != j[1]]
-	
-	for index in index_list:
-		# Calculate the vertex distance and divide by the bone's movement (Default is 1 unit)
-		weight = calculate_vertex_distance( new_positions[index], rest_positions[index] ) / BONE_DELTA
-		
-		# Round the weighting.
-		weight = round_float( weight )
-				
-		# TODO: Probably need more checks here to ensure that the weighting is valid
-		list_of_weights[index] = weight 
-		
-	return list_of_weights
 
-
-def add_vector3s( vector1, vector2 ):
+def _is_rounding_tie( numbers ):
 	"""
-	Adds two vector 3's together.
+	Flags the values that are close enough to a rounding half step that numpy and string formatting might not agree on them.
 	"""
-	x1, y1, z1 = vector1[ : ]
-	x2, y2, z2 = vector2[ : ]
-	
-	x = x1 + x2
-	y = y1 + y2
-	z = z1 + z2
-	
-	return [ x, y, z ]
+	scaled = numpy.abs( numbers ) * 1000.0
+	return numpy.abs( scaled - numpy.floor( scaled ) - 0.5 ) < 1e-6
 
 
 def remove_all_weighting( skincluster, transform, bone_list, vert_list ):
@@ -339,12 +809,175 @@ def remove_all_weighting( skincluster, transform, bone_list, vert_list ):
 	# Make a weight list with each bone being set to 0.0
 	zero_value_list = [ ( bone_name, 0.0 ) for bone_name in bone_list ]
 	
-	# For each vert in the vert_list passed in, we reset all the weighting to zero. This skin cluster should already be set to not normalize, so the weighting will be completely gone.
-	for vert_id in vert_list:
-		maya.cmds.skinPercent( skincluster, transform + '.vtx[{0}]'.format( vert_id ), tv = zero_value_list )
+	# Every vert gets the same zero list, so runs of consecutive verts go in as one range component rather than a skinPercent per vert.
+	# This skin cluster should already be set to not normalize, so the weighting will be completely gone.
+	vert_ids = numpy.unique( numpy.asarray( vert_list ).astype( numpy.int64 ) )
+	for components in get_component_chunks( sampler.get_node_name( transform ), vert_ids ):
+		maya.cmds.skinPercent( skincluster, *components, tv = zero_value_list )
 	return True
 
 
+def write_weights_skinpercent( skincluster, transform, weight_table, bone_list ):
+	"""
+	Writes the weight table to the skin cluster through skinPercent. Slow, but undoable and the most forgiving path.
+	
+	Verts with exactly the same weights share a skinPercent call, which after rounding is a good chunk of most meshes.
+	Returns a list of failure strings.
+	"""
+	bone_failure = [ ]    # List to catch our failures :(
+	mesh_name = sampler.get_node_name( transform )
+	
+	# Remove all the weighting on the current skincluster.
+	with telemetry.stage( 'zero' ):
+		remove_all_weighting( skincluster, transform, bone_list, weight_table.get_vertex_ids( ) )	
+	
+	# Group the verts by their ( bone indices, weights ) row, straight off the table's arrays.
+	weight_groups = { }
+	offsets = weight_table.offsets.tolist( )
+	bone_indices = weight_table.bone_indices.tolist( )
+	weight_values = weight_table.weights.tolist( )
+	for vert_id in weight_table.get_vertex_ids( ).tolist( ):
+		start, end = offsets[ vert_id ], offsets[ vert_id + 1 ]
+		weight_groups.setdefault( ( tuple( bone_indices[ start:end ] ), tuple( weight_values[ start:end ] ) ), [ ] ).append( vert_id )
+	
+	# For each group, we'll make the list of ( bone_name, weight ) and apply it to the verts
+	with telemetry.stage( 'write', weight_table.weights.nbytes ):
+		for ( group_bone_indices, group_weights ), vert_ids in weight_groups.iteritems( ):
+			weight_list = zip( [ weight_table.bone_names[ bone_index ] for bone_index in group_bone_indices ], group_weights )
+			for components in get_component_chunks( mesh_name, vert_ids ):
+				# We apply the weighting to the skin cluster
+				try:
+					maya.cmds.skinPercent( skincluster, *components, tv = weight_list )
+					
+				# If we failed, we catch it and save it to the failure list to notify the user later
+				except RuntimeError as excep:
+					failure_string = 'Bone Failure: {0}'.format( excep )
+					if failure_string not in bone_failure:
+						bone_failure.append( failure_string )
+	
+	return bone_failure
+
+
+def get_component_chunks( mesh_name, vert_ids, chunk_size = None ):
+	"""
+	Turns sorted vert ids into "mesh.vtx[start:end]" component strings, one per run of consecutive ids, and yields them in lists of
+	at most chunk_size ( const.SKINPERCENT_COMPONENTS ) so no single command gets too long.
+	"""
+	chunk_size = chunk_size or const.SKINPERCENT_COMPONENTS
+	vert_ids = numpy.asarray( vert_ids, dtype = numpy.int64 )
+	if not len( vert_ids ):
+		return
+	
+	breaks = numpy.flatnonzero( numpy.diff( vert_ids ) != 1 ) + 1
+	starts = vert_ids[ numpy.concatenate( [ [ 0 ], breaks ] ) ].tolist( )
+	ends = vert_ids[ numpy.concatenate( [ breaks - 1, [ len( vert_ids ) - 1 ] ] ) ].tolist( )
+	components = [ '{0}.vtx[{1}:{2}]'.format( mesh_name, start, end ) if end != start else '{0}.vtx[{1}]'.format( mesh_name, start ) for start, end in zip( starts, ends ) ]
+	
+	for index in xrange( 0, len( components ), chunk_size ):
+		yield components[ index:index + chunk_size ]
+
+
+def write_weights_api( skincluster, weight_table, bone_list, differential = False, epsilon = None ):
+	"""
+	Writes the weight table to the skin cluster with MFnSkinCluster.setWeights, a chunk of verts at a time.
+	
+	Every bone in the bone_list gets a value for every vert written, so zeroing out the old weighting happens in the same call.
+	With differential on, each chunk's current weights are read back with getWeights first and only what changed gets written,
+	see write_weight_blocks.
+	Returns [ list of failure strings, write counts ]
+	"""
+	bone_failure = [ ]
+	
+	sel_list = om2.MSelectionList( )
+	sel_list.add( skincluster )
+	fn_skin = oma2.MFnSkinCluster( sel_list.getDependNode( 0 ) )
+	shape_path = fn_skin.getPathAtIndex( fn_skin.indexForOutputConnection( 0 ) )
+	
+	# Influence indices are the positions in influenceObjects( ), look them up by name.
+	influence_lookup = dict( ( path.partialPathName( ), index ) for index, path in enumerate( fn_skin.influenceObjects( ) ) )
+	bone_names = [ ]
+	influence_indices = [ ]
+	for bone_name in bone_list:
+		if bone_name not in influence_lookup:
+			bone_failure.append( 'Bone Failure: {0} is not an influence of {1}'.format( bone_name, skincluster ) )
+			continue
+		bone_names.append( bone_name )
+		influence_indices.append( influence_lookup[ bone_name ] )
+	
+	def get_components( vert_ids ):
+		component_fn = om2.MFnSingleIndexedComponent( )
+		components = component_fn.create( om2.MFn.kMeshVertComponent )
+		component_fn.addElements( vert_ids )
+		return components
+	
+	def set_weights( vert_ids, influence_indices, flat_weights ):
+		fn_skin.setWeights( shape_path, get_components( vert_ids ), om2.MIntArray( influence_indices ), om2.MDoubleArray( flat_weights ), False )
+	
+	def get_weights( vert_ids, influence_indices ):
+		return fn_skin.getWeights( shape_path, get_components( vert_ids ), om2.MIntArray( influence_indices ) )
+	
+	write_counts = write_weight_blocks( set_weights, weight_table, bone_names, influence_indices, get_weights = get_weights if differential else None, epsilon = epsilon )
+	bone_failure.extend( 'Bone Failure: {0}'.format( failure ) for failure in write_counts[ 'failures' ] )
+	
+	return bone_failure, write_counts
+
+
+def write_weight_blocks( set_weights, weight_table, bone_names, influence_indices, chunk_size = None, get_weights = None, epsilon = None ):
+	"""
+	Splits the weight table into dense vert x influence blocks and hands each one to set_weights( vert_ids, influence_indices, flat_weights ).
+	
+	Given get_weights( vert_ids, influence_indices ), which returns the current flat weights, each block is compared against what's
+	already there first. Only the verts with a weight more than epsilon ( const.APPLY_EPSILON ) off get written, and only for the
+	influences that changed on them.
+	
+	A block that raises a RuntimeError ( on its read or its write ) is recorded in failures and skipped, the rest still get written.
+	
+	Kept separate from the maya calls so the batching can be driven by anything that looks like a skin cluster.
+	Returns { 'calls', 'verts', 'written_verts', 'written_weights', 'failed_verts', 'failures' }
+	"""
+	# Blocks are dense, so the chunk shrinks as the bone count grows to keep each block ( and its list copy ) a bounded size.
+	chunk_size = chunk_size or min( const.APPLY_CHUNK_SIZE, max( 1, const.APPLY_BLOCK_SIZE // max( 1, len( bone_names ) ) ) )
+	epsilon = const.APPLY_EPSILON if epsilon is None else epsilon
+	vert_ids = weight_table.get_vertex_ids( )
+	
+	write_counts = { 'calls': 0, 'verts': len( vert_ids ), 'written_verts': 0, 'written_weights': 0, 'failed_verts': 0, 'failures': [ ] }
+	for start in xrange( 0, len( vert_ids ), chunk_size ):
+		chunk_ids = vert_ids[ start:start + chunk_size ]
+		block = weight_table.get_dense_block( chunk_ids, bone_names )
+		chunk_influences = influence_indices
+		
+		if get_weights:
+			try:
+				with telemetry.stage( 'read', block.nbytes ):
+					current = numpy.array( get_weights( chunk_ids.tolist( ), influence_indices ), dtype = numpy.float64 ).reshape( block.shape )
+			except RuntimeError as excep:
+				write_counts[ 'failed_verts' ] += len( chunk_ids )
+				write_counts[ 'failures' ].append( 'Reading verts {0}-{1} failed : {2}'.format( chunk_ids[ 0 ], chunk_ids[ -1 ], excep ) )
+				continue
+			changed = numpy.abs( block - current ) > epsilon
+			changed_rows = changed.any( axis = 1 )
+			if not changed_rows.any( ):
+				continue
+			changed_columns = changed[ changed_rows ].any( axis = 0 )
+			chunk_ids = chunk_ids[ changed_rows ]
+			block = block[ changed_rows ][ :, changed_columns ]
+			chunk_influences = [ influence_index for influence_index, column_changed in zip( influence_indices, changed_columns.tolist( ) ) if column_changed ]
+		
+		try:
+			with telemetry.stage( 'write' ) as write_stage:
+				write_stage.add_bytes( block.nbytes )
+				set_weights( chunk_ids.tolist( ), chunk_influences, block.ravel( ).tolist( ) )
+		except RuntimeError as excep:
+			write_counts[ 'failed_verts' ] += len( chunk_ids )
+			write_counts[ 'failures' ].append( 'Writing verts {0}-{1} failed : {2}'.format( chunk_ids[ 0 ], chunk_ids[ -1 ], excep ) )
+			continue
+		write_counts[ 'calls' ] += 1
+		write_counts[ 'written_verts' ] += len( chunk_ids )
+		write_counts[ 'written_weights' ] += block.size
+	
+	return write_counts
+
+
 def normalize_vertex_weighting( weight_list ):
 	"""
 	Normalizes vertex weights if they are above or below 1.0 by dividing each individual weight value by the sum of all the weights associated with that vertex.
@@ -381,23 +1014,52 @@ def calculate_total_vertex_weight( weight_list ):
 			weight += bone_weight
 	return weight
 
+###################################
+## Data File Writing & Loading ##
+###################################
+
+def save_data( file_path, content ):
+	"""
+	Saves the content to the file_path, in the binary format if the path ends with const.BINARY_EXTENSION and as json otherwise.
+	"""
+	with telemetry.stage( 'save' ) as save_stage:
+		if os.path.splitext( file_path )[ 1 ].lower( ) == const.BINARY_EXTENSION:
+			result = weight_file.save_binary( file_path, content )
+		else:
+			result = save_json( file_path, content )
+		save_stage.add_bytes( os.path.getsize( file_path ) )
+	return result
+
+
+def load_data( file_path ):
+	"""
+	Checks file path, loads the data from either a binary or json file, returns data
+	"""
+	if not os.path.exists( file_path ):
+		return None
+	
+	with telemetry.stage( 'load', os.path.getsize( file_path ) ):
+		if weight_file.is_binary_file( file_path ):
+			return weight_file.load_binary( file_path )
+		return json_stream.load_json_table( file_path )
+
+
 ############################
 ## JSON Writing & Loading ##
 ############################
 
 def save_json( file_path, content ):
 	"""
-	Saves the content to the file_path in the json format
+	Saves the content to the file_path in the json format. Written a vertex at a time, so the full json string is never built.
 	"""
-	with open( file_path, 'w' ) as data_file:
-		json_data = json.dumps( content )
-		data_file.write( json_data )
-	return True
+	return json_stream.write_json( file_path, content, default = to_json_value )
 		
 		
 def load_json( file_path ):
 	"""
 	Checks file path, loads json file, returns data
+	
+	Parses the whole file into plain dictionaries. load_data streams it into a weight table instead, which is much lighter.
 	"""
 	if not os.path.exists( file_path ):
 		return None
@@ -408,6 +1070,17 @@ def load_json( file_path ):
 		
 	return json_data
 
+
+def to_json_value( value ):
+	"""
+	Converts the values json doesn't know about ( the data loaded from binary files ) when exporting to json.
+	"""
+	if isinstance( value, weights.Weight_Mapping ):
+		return dict( value.iteritems( ) )
+	if isinstance( value, numpy.ndarray ):
+		return value.tolist( )
+	raise TypeError( '{0} is not JSON serializable'.format( repr( value ) ) )
+
 ###########################
 ## Data handling methods ##
 ###########################
@@ -476,7 +1149,7 @@ def determine_data_to_source( data, file_path ):
 
 def load_data_from_file( file_path ):
 	# Load the data
-	file_data = load_json( file_path )
+	file_data = load_data( file_path )
 	
 	# Verify it
 	result, message = verify_data( file_data )
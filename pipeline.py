@@ -0,0 +1,184 @@
+"""
+Contains the weight pipeline, which does the weight math for bone probes on worker threads while the main thread keeps probing.
+
+Moving bones and sampling the mesh have to happen on Maya's main thread, but working the weights out from a sampled snapshot is
+plain numpy math. So rather than the main thread waiting on the math between probes, each snapshot goes into a queue and the
+next bone gets moved right away:
+
+	with pipeline.Weight_Pipeline( calculate_probe_weights ) as weight_pipeline:
+		for key, bones in enumerate( probes ):
+			... move bones ...
+			points = weight_pipeline.get_buffer( ( 1, ) + rest_points.shape )
+			mesh_sampler.sample( points[ 0 ] )
+			weight_pipeline.submit( key, points, rest_points, probe_matrix, tolerance )
+			... reset bones ...
+		results = weight_pipeline.get_results( ) # { key : whatever calculate_probe_weights returned }
+
+Snapshots are written into a fixed pool of buffers, and get_buffer( ) waits for a free one, so memory stays capped at the pool size
+no matter how far ahead of the workers the probing gets. The pool keeps its free buffers by shape, so runs over several meshes reuse
+each mesh's buffers rather than reallocating whenever the shape changes. numpy lets go of the GIL for the heavy array math, so plain threads are
+enough to spread it over the cores. With no workers the jobs just run as they're submitted.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import Queue
+import sys
+import threading
+
+# Skonverter module imports
+import const
+
+
+class Weight_Pipeline( object ):
+	"""
+	Runs work_function( points, *args ) for each submitted snapshot on a pool of worker threads.
+
+	worker_count and queue_size default to const.PIPELINE_WORKERS and const.PIPELINE_QUEUE_SIZE, 0 workers runs everything inline.
+	held_buffers is how many buffers the caller holds on to at once before submitting them, one per mesh when several meshes sample
+	the same probe. The buffer pool is queue_size + worker_count + held_buffers buffers, enough for the queue, the ones being worked
+	on and the ones being filled, so get_buffer( ) only ever waits on a worker.
+	"""
+	def __init__( self, work_function, worker_count = None, queue_size = None, held_buffers = 1 ):
+		self.work_function = work_function
+		self.worker_count = max( 0, const.PIPELINE_WORKERS if worker_count is None else worker_count )
+		self.queue_size = max( 1, queue_size or const.PIPELINE_QUEUE_SIZE )
+
+		self.jobs = Queue.Queue( maxsize = self.queue_size )
+		self.buffer_lock = threading.Condition( )
+		self.free_buffers = { } # shape : [ free buffers ]
+		self.lent_buffers = set( ) # ids of the buffers handed out by get_buffer
+		self.buffer_count = 0
+		self.buffer_limit = self.queue_size + self.worker_count + max( 1, held_buffers )
+
+		self.results = { } # key : work_function's result
+		self.error = None # exc_info of the first job that failed
+		self.workers = [ ]
+		self.stopping = False
+
+	def __enter__( self ):
+		for worker_index in range( self.worker_count ):
+			worker = threading.Thread( target = self.run_worker, name = 'skonverter_weights_{0}'.format( worker_index ) )
+			worker.daemon = True
+			worker.start( )
+			self.workers.append( worker )
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ):
+		# On the way out because of an error, the queued snapshots aren't worth finishing.
+		if exception_type is not None:
+			self.stopping = True
+		self.stop_workers( )
+		return False
+
+	def get_buffer( self, shape ):
+		"""
+		Returns a free float64 buffer of the given shape to sample the next probe into. Once the pool is used up, a free buffer of
+		another shape gets dropped to make room, or it waits for a worker to hand one back.
+		"""
+		shape = tuple( shape )
+		self.raise_error( )
+		with self.buffer_lock:
+			while True:
+				if self.free_buffers.get( shape ):
+					points = self.free_buffers[ shape ].pop( )
+				elif self.buffer_count < self.buffer_limit or self.drop_free_buffer( ):
+					self.buffer_count += 1
+					points = numpy.empty( shape, dtype = numpy.float64 )
+				else:
+					self.buffer_lock.wait( 0.1 )
+					self.raise_error( )
+					continue
+
+				self.lent_buffers.add( id( points ) )
+				return points
+
+	def drop_free_buffer( self ):
+		"""
+		Lets go of one free buffer, from whichever shape has the most of them. Returns False if there weren't any free.
+		Call with buffer_lock held.
+		"""
+		shape = max( self.free_buffers, key = lambda shape: len( self.free_buffers[ shape ] ) ) if self.free_buffers else None
+		if shape is None or not self.free_buffers[ shape ]:
+			return False
+
+		self.free_buffers[ shape ].pop( )
+		if not self.free_buffers[ shape ]:
+			del self.free_buffers[ shape ]
+		self.buffer_count -= 1
+		return True
+
+	def return_buffer( self, points ):
+		"""
+		Puts a buffer from get_buffer( ) back on the free list for its shape. Anything else is left alone.
+		"""
+		with self.buffer_lock:
+			if id( points ) not in self.lent_buffers:
+				return
+			self.lent_buffers.discard( id( points ) )
+			self.free_buffers.setdefault( points.shape, [ ] ).append( points )
+			self.buffer_lock.notify( )
+
+	def submit( self, key, points, *args, **kwargs ):
+		"""
+		Queues a snapshot for the workers. points should come from get_buffer( ), it goes back in the pool once the job is done.
+		Blocks while the queue is full.
+		"""
+		self.raise_error( )
+		if not self.workers:
+			self.run_job( key, points, args, kwargs )
+			self.raise_error( )
+			return True
+
+		while True:
+			try:
+				self.jobs.put( ( key, points, args, kwargs ), timeout = 0.1 )
+				return True
+			except Queue.Full:
+				self.raise_error( )
+
+	def get_results( self ):
+		"""
+		Waits for every queued job to finish, then returns { key : result }. Raises the first error a job hit.
+		"""
+		self.stop_workers( )
+		self.raise_error( )
+		return self.results
+
+	def run_worker( self ):
+		while True:
+			job = self.jobs.get( )
+			if job is None:
+				return
+
+			self.run_job( *job )
+
+	def run_job( self, key, points, args, kwargs ):
+		try:
+			if not self.stopping:
+				self.results[ key ] = self.work_function( points, *args, **kwargs )
+		except:
+			if self.error is None:
+				self.error = sys.exc_info( )
+			self.stopping = True
+		finally:
+			self.return_buffer( points )
+
+	def stop_workers( self ):
+		"""
+		Lets the workers finish what's queued, then shuts them down.
+		"""
+		for worker in self.workers:
+			self.jobs.put( None )
+		for worker in self.workers:
+			worker.join( )
+		self.workers = [ ]
+
+	def raise_error( self ):
+		if self.error is not None:
+			exception_type, exception, traceback = self.error
+			raise exception_type, exception, traceback
@@ -0,0 +1,274 @@
+"""
+Contains the probe context, which moves and resets bones for determine_weighting while keeping the scene's undo queue and viewport out of it.
+
+	with probing.Probe_Context( bone_names ) as probe_context:
+		moved_bones = probe_context.move_bones( bone_names, axes, delta )
+		...
+		probe_context.reset( moved_bones )
+
+Inside the context undo recording is off ( or folded into one chunk ) and viewport refreshes are suspended. The skeleton is
+captured once up front in a Skeleton_Snapshot, every probed bone and child with its rest translation and world matrix, so moves
+and resets are worked out from the snapshot's arrays and only ever set translations, never query them. Leaving the context, even
+through an exception, puts back every bone that's still moved, checks the skeleton is exactly back in its rest pose, and then
+puts back the undo and refresh state.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Maya sdk imports
+import maya.cmds
+import maya.api.OpenMaya as om2
+
+# Third party imports
+import numpy
+
+# Skonverter module imports
+import const
+
+
+UNDO_MODES = ( 'off', 'chunk', 'keep' )
+
+
+class Skeleton_Snapshot( object ):
+	"""
+	Rest pose of a set of transforms, held in arrays. Rows follow the order of names.
+
+	rest_translations : (M,3) local translations, in each transform's parent space
+	rest_matrices     : (M,4,4) world matrices, for the integrity check
+	world_to_local    : (M,3,3) turns a world space offset into an offset in each transform's parent space
+
+	The world_to_local matrices stay valid while probing because moves only ever translate, and a translation doesn't change how
+	any child's parent space is rotated or scaled.
+	"""
+	def __init__( self, names, use_api = True ):
+		self.names = list( names )
+		self.rows = dict( ( name, row ) for row, name in enumerate( self.names ) )
+		self.use_api = use_api
+
+		self.transforms = [ ]
+		if self.use_api:
+			for name in self.names:
+				sel_list = om2.MSelectionList( )
+				sel_list.add( name )
+				self.transforms.append( om2.MFnTransform( sel_list.getDagPath( 0 ) ) )
+
+		self.rest_matrices = self.get_world_matrices( )
+		self.rest_translations = self.get_translations( )
+		self.world_to_local = numpy.tile( numpy.identity( 3 ), ( len( self.names ), 1, 1 ) )
+		for row, name in enumerate( self.names ):
+			parent_names = maya.cmds.listRelatives( name, parent = True ) or [ ]
+			if not parent_names:
+				continue
+			# Most parents are in the snapshot already, no need to ask for their matrix again
+			if parent_names[ 0 ] in self.rows:
+				parent_matrix = self.rest_matrices[ self.rows[ parent_names[ 0 ] ] ]
+			else:
+				parent_matrix = numpy.array( maya.cmds.xform( parent_names[ 0 ], query = True, matrix = True, worldSpace = True ), dtype = numpy.float64 ).reshape( 4, 4 )
+			self.world_to_local[ row ] = numpy.linalg.inv( parent_matrix[ :3, :3 ] )
+
+		self.translations = self.rest_translations.copy( ) # Where every row is now, as far as the snapshot has moved it
+
+	def get_world_matrices( self ):
+		"""
+		Queries the world matrix of every row, as a (M,4,4) array in Maya's row vector layout.
+		"""
+		matrices = [ maya.cmds.xform( name, query = True, matrix = True, worldSpace = True ) for name in self.names ]
+		return numpy.array( matrices, dtype = numpy.float64 ).reshape( -1, 4, 4 )
+
+	def get_translations( self ):
+		"""
+		Queries the local translation of every row.
+		"""
+		if self.use_api:
+			translations = [ list( transform.translation( om2.MSpace.kTransform ) ) for transform in self.transforms ]
+		else:
+			translations = [ maya.cmds.xform( name, query = True, translation = True, objectSpace = True ) for name in self.names ]
+		return numpy.array( translations, dtype = numpy.float64 ).reshape( -1, 3 )
+
+	def translate( self, names, world_offsets ):
+		"""
+		Moves each named transform by its (3,) world space offset, worked out from the snapshot without querying anything.
+		A name can show up more than once, its offsets add up.
+		"""
+		rows = [ self.rows[ name ] for name in names ]
+		world_offsets = numpy.asarray( world_offsets, dtype = numpy.float64 ).reshape( -1, 3 )
+		# Row vectors, so the offset goes on the left of each world_to_local matrix
+		numpy.add.at( self.translations, rows, numpy.einsum( 'ij,ijk->ik', world_offsets, self.world_to_local[ rows ] ) )
+		self.set_rows( rows )
+
+	def restore( self, names ):
+		"""
+		Puts the named transforms back to their rest translations.
+		"""
+		rows = [ self.rows[ name ] for name in names ]
+		self.translations[ rows ] = self.rest_translations[ rows ]
+		self.set_rows( rows )
+
+	def set_rows( self, rows ):
+		for row in sorted( set( rows ) ):
+			if self.use_api:
+				self.transforms[ row ].setTranslation( om2.MVector( *self.translations[ row ].tolist( ) ), om2.MSpace.kTransform )
+			else:
+				maya.cmds.xform( self.names[ row ], translation = self.translations[ row ].tolist( ), objectSpace = True )
+
+	def get_mismatches( self, tolerance = 1e-9 ):
+		"""
+		Returns the names of the transforms that aren't in their rest pose. Local translations have to match exactly, since they're
+		put back from the very values that were read. World matrices get the tolerance, Maya recomputes them.
+		"""
+		translation_errors = numpy.abs( self.get_translations( ) - self.rest_translations ).max( axis = 1 )
+		matrix_errors = numpy.abs( self.get_world_matrices( ) - self.rest_matrices ).reshape( -1, 16 ).max( axis = 1 )
+		bad_rows = numpy.flatnonzero( ( translation_errors > 0.0 ) | ( matrix_errors > tolerance ) )
+		return [ self.names[ row ] for row in bad_rows ]
+
+
+class Probe_Context( object ):
+	"""
+	Moves bones along world axes for probing, and resets them exactly.
+
+	undo_mode is 'off' ( stop recording without flushing the queue ), 'chunk' ( record the probing as one undo entry ) or 'keep'.
+	use_api sets translations through MFnTransform instead of xform. Both default to the const settings.
+	"""
+	def __init__( self, bone_names, undo_mode = None, use_api = None, suspend_refresh = None ):
+		self.bone_names = list( bone_names )
+		self.undo_mode = undo_mode or const.PROBE_UNDO_MODE
+		self.use_api = const.PROBE_USE_API if use_api is None else use_api
+		self.suspend_refresh = const.PROBE_SUSPEND_REFRESH if suspend_refresh is None else suspend_refresh
+		if self.undo_mode not in UNDO_MODES:
+			raise ValueError( 'Unknown undo mode : {0}'.format( self.undo_mode ) )
+
+		self.snapshot = None # Skeleton_Snapshot of the bones and their children, taken on enter
+		self.children = { } # bone_name : [ child transform names ]
+		self.outstanding = [ ] # Names moved and not reset yet, in the order they were moved
+		self.undo_state = None
+		self.chunk_open = False
+		self.refresh_suspended = False
+
+	def __enter__( self ):
+		self.apply_state( )
+		try:
+			names = [ ]
+			for bone_name in self.bone_names:
+				names.extend( name for name in [ bone_name ] + self.get_children( bone_name ) if name not in names )
+			self.snapshot = Skeleton_Snapshot( names, use_api = self.use_api )
+		except:
+			self.restore_state( )
+			raise
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ):
+		try:
+			# Anything still moved goes back, then the whole skeleton gets checked against the snapshot.
+			self.reset( list( self.outstanding ) )
+			self.check_rest_pose( raise_error = exception_type is None )
+		finally:
+			self.restore_state( )
+		return False
+
+	def check_rest_pose( self, raise_error = True ):
+		"""
+		Checks every snapshot transform is back in its rest pose. Anything that isn't gets put back once more, and if that still
+		doesn't do it, raises ( or just warns, when raise_error is off ).
+		"""
+		mismatches = self.snapshot.get_mismatches( )
+		if not mismatches:
+			return True
+
+		self.snapshot.restore( mismatches )
+		mismatches = self.snapshot.get_mismatches( )
+		if not mismatches:
+			return True
+
+		message = 'Skeleton did not return to its rest pose after probing : {0}'.format( ', '.join( mismatches ) )
+		if raise_error:
+			raise RuntimeError( message )
+		maya.cmds.warning( message )
+		return False
+
+	def get_children( self, bone_name ):
+		"""
+		Returns the bone's child transforms, joints or not, since anything parented to the bone would otherwise move with it.
+		"""
+		if bone_name not in self.children:
+			self.children[ bone_name ] = maya.cmds.listRelatives( bone_name, children = True, type = 'transform' ) or [ ]
+		return self.children[ bone_name ]
+
+	def apply_state( self ):
+		"""
+		Turns undo recording off ( or opens the chunk ) and suspends refreshes, per the settings.
+		"""
+		if self.undo_mode == 'off' and self.undo_state is None:
+			self.undo_state = maya.cmds.undoInfo( query = True, state = True )
+			maya.cmds.undoInfo( stateWithoutFlush = False )
+		elif self.undo_mode == 'chunk' and not self.chunk_open:
+			maya.cmds.undoInfo( openChunk = True, chunkName = 'skonverter_probe' )
+			self.chunk_open = True
+
+		try:
+			if self.suspend_refresh and not self.refresh_suspended:
+				maya.cmds.refresh( suspend = True )
+				self.refresh_suspended = True
+		except:
+			self.restore_state( )
+			raise
+
+	def restore_state( self ):
+		"""
+		Puts the undo and refresh state back the way it was. Safe to call more than once.
+		"""
+		if self.refresh_suspended:
+			maya.cmds.refresh( suspend = False )
+			self.refresh_suspended = False
+
+		if self.undo_mode == 'off' and self.undo_state is not None:
+			maya.cmds.undoInfo( stateWithoutFlush = self.undo_state )
+			self.undo_state = None
+		elif self.undo_mode == 'chunk' and self.chunk_open:
+			maya.cmds.undoInfo( closeChunk = True )
+			self.chunk_open = False
+
+	def pause( self ):
+		"""
+		Gives Maya its undo queue and viewport back while the probing waits, for jobs that run between UI events. Every bone has to
+		be reset first.
+		"""
+		self.restore_state( )
+
+	def resume( self ):
+		"""
+		Picks the probing back up after a pause( ).
+		"""
+		self.apply_state( )
+
+	def move_bones( self, bone_names, axes, delta = None ):
+		"""
+		Moves each bone delta ( const.BONE_DELTA by default ) along its world axis and counter moves its children so only the bone
+		itself has moved. All of the bones and children go in one batch against the snapshot.
+
+		Returns the names moved, children before their bone, in the order they were moved.
+		"""
+		if delta is None:
+			delta = const.BONE_DELTA
+
+		moved_names = [ ]
+		world_offsets = [ ]
+		for bone_name, axis in zip( bone_names, axes ):
+			offset = numpy.zeros( 3 )
+			offset[ axis ] = delta
+			for child_name in self.get_children( bone_name ):
+				moved_names.append( child_name )
+				world_offsets.append( -offset )
+			moved_names.append( bone_name )
+			world_offsets.append( offset )
+
+		self.snapshot.translate( moved_names, world_offsets )
+		self.outstanding.extend( moved_names )
+		return moved_names
+
+	def reset( self, moved_bones ):
+		"""
+		Puts the moved bones back to their rest translations in one batch.
+		"""
+		self.snapshot.restore( moved_bones )
+		reset_names = set( moved_bones )
+		self.outstanding = [ name for name in self.outstanding if name not in reset_names ]
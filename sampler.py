@@ -0,0 +1,122 @@
+"""
+Contains the mesh sampler, which reads vertex positions from a mesh into numpy arrays for the weight calculation.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Maya sdk imports
+import maya.OpenMaya as om1
+import maya.api.OpenMaya as om2
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import ctypes
+
+# Skonverter module imports
+import const
+import telemetry
+
+
+class Mesh_Sampler( object ):
+	"""
+	Resolves a mesh once and reads its object space vertex positions into reusable (N,3) float64 buffers.
+
+	When the API 1.0 getRawPoints pointer is available, the points are copied straight out of Maya's own float buffer,
+	so each sample is a single copy with no MPointArray in between. Otherwise falls back to MFnMesh.getPoints.
+	"""
+	def __init__( self, transform ):
+		self.name = get_node_name( transform )
+
+		# Resolve the dag path and function set once, rather than once per sample
+		sel_list = om2.MSelectionList( )
+		sel_list.add( self.name )
+		self.dag_path = sel_list.getDagPath( 0 )
+		self.mfn_mesh = om2.MFnMesh( self.dag_path )
+		self.vertex_count = self.mfn_mesh.numVertices
+
+		self.raw_mesh = None
+		if const.SAMPLE_RAW_POINTS:
+			self.raw_mesh = get_raw_mesh( self.name )
+
+		# Rest positions are kept, the probe buffer gets overwritten by every sample( ) call.
+		self.rest_points = self.sample( numpy.empty( ( self.vertex_count, 3 ), dtype = numpy.float64 ) )
+		self.probe_points = numpy.empty( ( self.vertex_count, 3 ), dtype = numpy.float64 )
+
+	def sample( self, out = None ):
+		"""
+		Reads the current vertex positions into out ( the probe buffer by default ) and returns it.
+		"""
+		if out is None:
+			out = self.probe_points
+
+		with telemetry.stage( 'sample', out.nbytes ):
+			# Make sure we're looking at the mesh as it is now, after whatever bone moves happened since the last sample
+			self.mfn_mesh.syncObject( )
+
+			if self.raw_mesh is not None:
+				try:
+					self.raw_mesh.syncObject( )
+					numpy.copyto( out, get_raw_points_view( self.raw_mesh, self.vertex_count ) )
+					return out
+				except RuntimeError:
+					# Raw points aren't available for this mesh, stick with getPoints from here on out.
+					self.raw_mesh = None
+
+			out[ : ] = [ ( point.x, point.y, point.z ) for point in self.mfn_mesh.getPoints( ) ]
+		return out
+
+
+	def sample_rows( self, vert_ids ):
+		"""
+		Reads the current positions of just the given verts. Returns a (len( vert_ids ),3) slice of the probe buffer.
+		"""
+		out = self.probe_points[ :len( vert_ids ) ]
+		with telemetry.stage( 'sample', out.nbytes ):
+			self.mfn_mesh.syncObject( )
+
+			if self.raw_mesh is not None:
+				try:
+					self.raw_mesh.syncObject( )
+					out[ : ] = get_raw_points_view( self.raw_mesh, self.vertex_count )[ vert_ids ]
+					return out
+				except RuntimeError:
+					self.raw_mesh = None
+
+		# No raw points, so the whole mesh has to come through getPoints anyway
+		return self.sample( )[ vert_ids ]
+
+
+def get_node_name( node ):
+	"""
+	Returns the name of a node, whether it was passed in as a string or a pymel node.
+	"""
+	if hasattr( node, 'name' ):
+		return node.name( )
+	return str( node )
+
+
+def get_raw_mesh( name ):
+	"""
+	Returns an API 1.0 MFnMesh for the named mesh, or None if it can't be made.
+	"""
+	try:
+		sel_list = om1.MSelectionList( )
+		sel_list.add( name )
+		dag_path = om1.MDagPath( )
+		sel_list.getDagPath( 0, dag_path )
+		return om1.MFnMesh( dag_path )
+	except RuntimeError:
+		return None
+
+
+def get_raw_points_view( raw_mesh, vertex_count ):
+	"""
+	Wraps the mesh's internal float point buffer in an (N,3) float32 array without copying it.
+
+	The view is only good until the mesh is evaluated again, so copy it before moving any bones.
+	"""
+	pointer = raw_mesh.getRawPoints( )
+	float_buffer = ( ctypes.c_float * ( vertex_count * 3 ) ).from_address( int( pointer ) )
+	return numpy.ctypeslib.as_array( float_buffer ).reshape( vertex_count, 3 )
@@ -0,0 +1,173 @@
+"""
+Contains the spatial index used to narrow down which vertices a bone probe can move.
+
+The rest pose points are bucketed into a uniform grid. Each bone's region of influence is treated as a capsule around the segments
+from the bone to its child joints, with a radius that's learned from the bones probed with a full scan:
+
+	radius = influence_ratio * bone_length * margin
+
+where influence_ratio is the furthest any vertex moved by a probed bone sat from its segments, relative to that bone's length.
+Later probes only sample and compare the vertices inside their capsule.
+
+This assumes influence falls off with distance from the bone, which is how skinning almost always looks. Any probe that moves a
+vertex further out than the bones seen so far gets redone with a full scan, and verify mode full scans every probe and compares.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Skonverter module imports
+import const
+
+
+class Spatial_Grid( object ):
+	"""
+	Uniform grid over a set of points. Vertex ids are sorted by cell, so each occupied cell is a contiguous slice of vert_ids.
+	"""
+	def __init__( self, points, cell_size = None ):
+		self.points = numpy.asarray( points, dtype = numpy.float64 )
+		if not len( self.points ):
+			self.points = numpy.zeros( ( 0, 3 ) )
+
+		self.minimum = self.points.min( axis = 0 ) if len( self.points ) else numpy.zeros( 3 )
+		maximum = self.points.max( axis = 0 ) if len( self.points ) else numpy.zeros( 3 )
+		if not cell_size:
+			# Roughly a couple dozen points per occupied cell for a surface mesh
+			diagonal = numpy.sqrt( ( ( maximum - self.minimum ) ** 2 ).sum( ) )
+			cell_size = diagonal / max( 1.0, len( self.points ) ** ( 1.0 / 3.0 ) )
+		self.cell_size = float( cell_size ) or 1.0
+		self.dimensions = numpy.floor( ( maximum - self.minimum ) / self.cell_size ).astype( numpy.int64 ) + 1
+
+		cell_keys = self.get_cell_keys( self.get_cell_coordinates( self.points ) )
+		self.vert_ids = numpy.argsort( cell_keys, kind = 'mergesort' )
+		self.cell_keys, self.cell_starts, counts = numpy.unique( cell_keys[ self.vert_ids ], return_index = True, return_counts = True )
+		self.cell_ends = self.cell_starts + counts
+
+	def get_cell_coordinates( self, points ):
+		coordinates = numpy.floor( ( numpy.asarray( points ) - self.minimum ) / self.cell_size ).astype( numpy.int64 )
+		return numpy.clip( coordinates, 0, self.dimensions - 1 )
+
+	def get_cell_keys( self, coordinates ):
+		return ( coordinates[ ..., 0 ] * self.dimensions[ 1 ] + coordinates[ ..., 1 ] ) * self.dimensions[ 2 ] + coordinates[ ..., 2 ]
+
+	def query_box( self, low, high ):
+		"""
+		Returns the ids of the points in every cell the box touches, sorted. Can include points just outside the box.
+		"""
+		low_cell = self.get_cell_coordinates( low )
+		high_cell = self.get_cell_coordinates( high )
+		if numpy.prod( high_cell - low_cell + 1 ) > len( self.cell_keys ):
+			# The box covers more cells than are occupied, quicker to just check every point
+			inside = numpy.all( ( self.points >= low ) & ( self.points <= high ), axis = 1 )
+			return numpy.flatnonzero( inside )
+		return self.query_cells( low_cell, high_cell )
+
+	def query_cells( self, low_cell, high_cell ):
+		"""
+		Returns the ids of the points in the block of cells from low_cell to high_cell ( inclusive grid coordinates ), sorted.
+		"""
+		ranges = [ numpy.arange( low_cell[ axis ], high_cell[ axis ] + 1 ) for axis in range( 3 ) ]
+		grid = numpy.stack( numpy.meshgrid( *ranges, indexing = 'ij' ), axis = -1 ).reshape( -1, 3 )
+		keys = self.get_cell_keys( grid )
+		positions = numpy.clip( numpy.searchsorted( self.cell_keys, keys ), 0, max( 0, len( self.cell_keys ) - 1 ) )
+		found = positions[ self.cell_keys[ positions ] == keys ] if len( self.cell_keys ) else positions[ : 0 ]
+
+		# Concatenate the vert_ids slices of the occupied cells
+		starts = self.cell_starts[ found ]
+		counts = self.cell_ends[ found ] - starts
+		offsets = numpy.repeat( starts - numpy.concatenate( [ [ 0 ], numpy.cumsum( counts )[ :-1 ] ] ), counts )
+		return numpy.sort( self.vert_ids[ numpy.arange( counts.sum( ) ) + offsets ] )
+
+	def query_segments( self, segments, radius ):
+		"""
+		Returns the sorted ids of the points within radius of any of the ( start, end ) segments, along with their distances.
+		"""
+		segments = numpy.asarray( segments, dtype = numpy.float64 ).reshape( -1, 2, 3 )
+		low = segments.reshape( -1, 3 ).min( axis = 0 ) - radius
+		high = segments.reshape( -1, 3 ).max( axis = 0 ) + radius
+		vert_ids = self.query_box( low, high )
+
+		distances = get_segment_distances( self.points[ vert_ids ], segments )
+		keep = distances <= radius
+		return vert_ids[ keep ], distances[ keep ]
+
+
+class Influence_Index( object ):
+	"""
+	Picks the candidate vertices for each bone probe, and learns how far bones reach from the probes that scanned the whole mesh.
+	"""
+	def __init__( self, rest_points, bone_segments, cell_size = None, margin = None, warmup = None, max_fraction = None ):
+		self.rest_points = rest_points
+		self.grid = Spatial_Grid( rest_points, cell_size = cell_size )
+		self.bone_segments = bone_segments # bone_name : ( (S,2,3) segments, bone_length )
+		self.margin = margin or const.SPATIAL_INDEX_MARGIN
+		self.warmup = const.SPATIAL_INDEX_WARMUP if warmup is None else warmup
+		self.max_fraction = max_fraction or const.SPATIAL_INDEX_MAX_FRACTION
+
+		self.influence_ratio = 0.0 # Furthest reach seen so far, in bone lengths
+		self.learned_bones = 0
+		self.full_scans = 0
+		self.rescans = 0
+		self.candidate_count = 0
+
+	def get_candidates( self, bone_names ):
+		"""
+		Returns the sorted vert ids that can move when these bones are probed, or None when the whole mesh should be scanned.
+		"""
+		if self.learned_bones < self.warmup or not self.influence_ratio:
+			return None
+
+		candidates = [ ]
+		for bone_name in bone_names:
+			segments, length = self.bone_segments.get( bone_name, ( None, 0.0 ) )
+			if segments is None or not length:
+				return None
+			vert_ids, _ = self.grid.query_segments( segments, self.influence_ratio * length * self.margin )
+			candidates.append( vert_ids )
+
+		candidates = numpy.unique( numpy.concatenate( candidates ) ) if len( candidates ) > 1 else candidates[ 0 ]
+		if len( candidates ) > self.max_fraction * len( self.rest_points ):
+			return None
+		self.candidate_count += len( candidates )
+		return candidates
+
+	def learn( self, bone_name, vert_ids ):
+		"""
+		Takes the result of a full scan probe into account. vert_ids are the verts the bone moved.
+		"""
+		self.full_scans += 1
+		segments, length = self.bone_segments.get( bone_name, ( None, 0.0 ) )
+		if segments is None or not length or not len( vert_ids ):
+			return
+		reach = get_segment_distances( self.rest_points[ vert_ids ], segments ).max( )
+		self.influence_ratio = max( self.influence_ratio, reach / length )
+		self.learned_bones += 1
+
+	def is_contained( self, bone_name, vert_ids ):
+		"""
+		Checks a candidate probe's result stays within the reach learned so far. If a moved vert is out in the margin, the bone
+		might reach past the candidates too, so the probe has to be redone with a full scan.
+		"""
+		segments, length = self.bone_segments[ bone_name ]
+		if not len( vert_ids ):
+			return True
+		reach = get_segment_distances( self.rest_points[ vert_ids ], segments ).max( )
+		return reach <= self.influence_ratio * length
+
+
+def get_segment_distances( points, segments ):
+	"""
+	Returns the distance from each point to the closest of the ( start, end ) segments.
+	"""
+	distances = numpy.full( len( points ), numpy.inf )
+	for start, end in numpy.asarray( segments, dtype = numpy.float64 ).reshape( -1, 2, 3 ):
+		direction = end - start
+		length_squared = direction.dot( direction )
+		offsets = points - start
+		if length_squared:
+			along = numpy.clip( offsets.dot( direction ) / length_squared, 0.0, 1.0 )
+			offsets = offsets - along[ :, None ] * direction
+		numpy.minimum( distances, numpy.sqrt( ( offsets ** 2 ).sum( axis = 1 ) ), out = distances )
+	return distances
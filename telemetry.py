@@ -0,0 +1,189 @@
+"""
+Contains the timing telemetry for the converter's stages.
+
+Stages are wrapped in "with telemetry.stage( 'sample' ):" blocks. While nothing is recording, stage( ) hands back a shared object
+whose enter and exit do nothing, so the instrumentation can stay in the code for good.
+
+	with telemetry.recording( trace_file = 'convert_trace.json', callback = my_callback ) as recorder:
+		methods.determine_weighting( transform, root_bone )
+	print recorder.get_summary( )
+
+Callbacks are called with ( stage_name, seconds, byte_count ) as each stage finishes. Trace files are in the chrome trace event
+format ( chrome://tracing or speedscope ) with the per stage summary alongside.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import json
+import os
+import threading
+import timeit
+
+
+_recorder = None # The recorder stages report to, None while telemetry is off
+
+
+class Telemetry_Recorder( object ):
+	"""
+	Collects the wall time, call count and byte count of each stage, and optionally every individual stage call for a trace.
+	"""
+	def __init__( self, callback = None, keep_events = False ):
+		self.callbacks = [ callback ] if callback else [ ]
+		self.keep_events = keep_events
+		self.stages = { } # stage_name : [ calls, seconds, byte_count ]
+		self.events = [ ] # ( stage_name, start, seconds, byte_count, thread_index ), only filled when keep_events is on
+		self.start = timeit.default_timer( )
+
+		# Stages can finish on the pipeline's worker threads too. Each thread gets its own row in the trace.
+		self.lock = threading.Lock( )
+		self.thread_indices = { }
+
+	def record( self, name, start, seconds, byte_count = 0 ):
+		with self.lock:
+			totals = self.stages.get( name )
+			if totals is None:
+				totals = self.stages[ name ] = [ 0, 0.0, 0 ]
+			totals[ 0 ] += 1
+			totals[ 1 ] += seconds
+			totals[ 2 ] += byte_count
+
+			if self.keep_events:
+				thread_index = self.thread_indices.setdefault( threading.current_thread( ).ident, len( self.thread_indices ) )
+				self.events.append( ( name, start, seconds, byte_count, thread_index ) )
+		for callback in self.callbacks:
+			callback( name, seconds, byte_count )
+
+	def get_summary( self ):
+		"""
+		Returns { stage_name : { 'calls', 'seconds', 'bytes' } } plus the total wall time under 'total_seconds'.
+		"""
+		summary = dict( ( name, { 'calls': calls, 'seconds': seconds, 'bytes': byte_count } ) for name, ( calls, seconds, byte_count ) in self.stages.iteritems( ) )
+		return { 'stages': summary, 'total_seconds': timeit.default_timer( ) - self.start }
+
+	def save_trace( self, file_path ):
+		"""
+		Writes the recorded stage calls out as a chrome trace event json file, with the summary under "skonverter".
+		"""
+		trace_events = [ ]
+		for name, start, seconds, byte_count, thread_index in self.events:
+			trace_events.append( {
+				'name' : name,
+				'ph'   : 'X',
+				'ts'   : ( start - self.start ) * 1e6,
+				'dur'  : seconds * 1e6,
+				'pid'  : os.getpid( ),
+				'tid'  : thread_index,
+				'args' : { 'bytes': byte_count },
+			} )
+
+		with open( file_path, 'w' ) as trace_file:
+			json.dump( { 'traceEvents': trace_events, 'skonverter': self.get_summary( ) }, trace_file )
+		return True
+
+
+class Stage( object ):
+	"""
+	Times one stage call. Bytes the stage allocated or moved can be added with add_bytes( ) while it runs.
+	"""
+	__slots__ = ( 'recorder', 'name', 'byte_count', 'start' )
+
+	def __init__( self, recorder, name, byte_count ):
+		self.recorder = recorder
+		self.name = name
+		self.byte_count = byte_count
+		self.start = None
+
+	def __enter__( self ):
+		self.start = timeit.default_timer( )
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ):
+		self.recorder.record( self.name, self.start, timeit.default_timer( ) - self.start, self.byte_count )
+		return False
+
+	def add_bytes( self, byte_count ):
+		self.byte_count += byte_count
+
+
+class Null_Stage( object ):
+	"""
+	What stage( ) returns while telemetry is off. Does nothing.
+	"""
+	__slots__ = ( )
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ):
+		return False
+
+	def add_bytes( self, byte_count ):
+		pass
+
+
+NULL_STAGE = Null_Stage( )
+
+
+def stage( name, byte_count = 0 ):
+	"""
+	Returns a context manager timing the named stage, or the shared do nothing stage while telemetry is off.
+	"""
+	if _recorder is None:
+		return NULL_STAGE
+	return Stage( _recorder, name, byte_count )
+
+
+def is_enabled( ):
+	return _recorder is not None
+
+
+def enable( callback = None, keep_events = False ):
+	"""
+	Starts recording stages. Returns the recorder.
+	"""
+	global _recorder
+	_recorder = Telemetry_Recorder( callback = callback, keep_events = keep_events )
+	return _recorder
+
+
+def disable( ):
+	"""
+	Stops recording stages. Returns the recorder that was running, if any.
+	"""
+	global _recorder
+	recorder = _recorder
+	_recorder = None
+	return recorder
+
+
+class Recording( object ):
+	"""
+	Records stages for the duration of the block, then writes the trace file if one was given. Whatever recorder was running before
+	is put back afterwards, so recordings can nest.
+	"""
+	def __init__( self, trace_file = None, callback = None ):
+		self.trace_file = trace_file
+		self.callback = callback
+		self.recorder = None
+		self.previous = None
+
+	def __enter__( self ):
+		global _recorder
+		self.previous = _recorder
+		self.recorder = _recorder = Telemetry_Recorder( callback = self.callback, keep_events = bool( self.trace_file ) )
+		return self.recorder
+
+	def __exit__( self, exception_type, exception, traceback ):
+		global _recorder
+		_recorder = self.previous
+		if self.trace_file:
+			self.recorder.save_trace( self.trace_file )
+		return False
+
+
+def recording( trace_file = None, callback = None ):
+	"""
+	Returns a context manager recording stages for the duration of the block, handing back the recorder. See Recording.
+	"""
+	return Recording( trace_file = trace_file, callback = callback )
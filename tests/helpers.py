@@ -0,0 +1,40 @@
+"""
+Shared setup for the tests. Puts the package and the benchmarks' numpy fake of Maya on the path and installs an empty fake scene,
+so the Skonverter modules import without Maya. Tests build the scene they need with install_cylinder, and compare data as dense
+arrays with get_dense_weights.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Python std lib imports
+import os
+import sys
+
+
+PACKAGE_PATH = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, PACKAGE_PATH )
+sys.path.insert( 0, os.path.join( PACKAGE_PATH, 'benchmarks' ) )
+
+import fake_maya
+fake_maya.install( fake_maya.Fake_Scene( ) )
+
+# Third party imports
+import numpy
+
+# Skonverter module imports, once there's a Maya for them to import
+import weights
+
+
+def install_cylinder( **kwargs ):
+	"""
+	Installs a fresh skinned cylinder ( see fake_maya.build_skinned_cylinder ) and returns its scene.
+	"""
+	return fake_maya.install( fake_maya.build_skinned_cylinder( **kwargs ) )
+
+
+def get_dense_weights( data ):
+	"""
+	The data's weights as a dense verts x bones array, in the data's bone order.
+	"""
+	weight_table = weights.Weight_Table.from_data( data )
+	return weight_table.get_dense_block( numpy.arange( weight_table.vertex_count ), data[ 'order' ] )
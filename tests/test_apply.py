@@ -0,0 +1,95 @@
+"""
+Weight application against the fake skin cluster, including blocks that fail to write.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import const
+import methods
+import weights
+
+
+class Apply_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 1000, joint_count = 8, influences = 2 )
+		self.mesh = self.scene.meshes[ 'mesh' ]
+		self.cluster = self.scene.skin_clusters[ 'mesh_skinCluster' ]
+
+		# The ground truth weights as converted data, so the tests don't depend on the probing.
+		joint_order = self.scene.joint_order
+		self.data = {
+			'order'  : list( joint_order ),
+			'weight' : dict( ( str( vert_id ), [ ( joint_order[ column ], weight ) for column, weight in zip( columns, weight_row ) if weight ] )
+			                 for vert_id, ( columns, weight_row ) in enumerate( zip( self.mesh.joint_index.tolist( ), self.mesh.joint_weight.tolist( ) ) ) ),
+		}
+		self.expected = numpy.zeros( self.cluster.weights.shape )
+		rows = numpy.arange( len( self.mesh.rest_points ) )[ :, None ]
+		numpy.add.at( self.expected, ( rows, self.mesh.joint_index ), self.mesh.joint_weight )
+
+		self.chunk_size = const.APPLY_CHUNK_SIZE
+		const.APPLY_CHUNK_SIZE = 100
+
+	def tearDown( self ):
+		const.APPLY_CHUNK_SIZE = self.chunk_size
+
+	def test_apply_writes_every_block( self ):
+		success, message = methods.apply_weighting( 'mesh', data = self.data )
+		self.assertTrue( success )
+		self.assertEqual( message, 'Success' )
+		self.assertEqual( self.cluster.write_calls, 10 )
+		numpy.testing.assert_allclose( self.cluster.weights, self.expected, atol = 1e-6 )
+
+	def test_failed_block_does_not_skip_the_rest( self ):
+		self.cluster.failing_writes = set( [ 1 ] )
+		success, message = methods.apply_weighting( 'mesh', data = self.data )
+		self.assertTrue( message.startswith( 'Partial' ), message )
+		self.assertIn( '100/992', message )
+		self.assertEqual( self.cluster.write_calls, 9 )
+
+		# Only the failed block's verts are left unwritten.
+		self.assertFalse( self.cluster.weights[ 100:200 ].any( ) )
+		numpy.testing.assert_allclose( self.cluster.weights[ :100 ], self.expected[ :100 ], atol = 1e-6 )
+		numpy.testing.assert_allclose( self.cluster.weights[ 200: ], self.expected[ 200: ], atol = 1e-6 )
+
+	def test_differential_rewrites_failed_block( self ):
+		self.cluster.failing_writes = set( [ 3 ] )
+		methods.apply_weighting( 'mesh', data = self.data )
+
+		# A differential rerun only has the verts that failed the first time left to write.
+		self.cluster.write_calls = 0
+		success, message = methods.apply_weighting( 'mesh', data = self.data, differential = True )
+		self.assertTrue( success )
+		self.assertIn( '100/992 verts changed', message )
+		self.assertEqual( self.cluster.write_calls, 1 )
+		numpy.testing.assert_allclose( self.cluster.weights, self.expected, atol = 1e-6 )
+
+	def test_bad_settings_leave_the_skin_cluster_alone( self ):
+		for kwargs in ( { 'method': 'unknown' }, { 'method': 'skinpercent', 'differential': True } ):
+			success, message = methods.apply_weighting( 'mesh', data = self.data, **kwargs )
+			self.assertFalse( success )
+			self.assertEqual( self.cluster.normalize_weights, 1 )
+			self.assertEqual( self.cluster.write_calls, 0 )
+
+	def test_write_blocks_records_failures( self ):
+		table = weights.Weight_Table.from_data( self.data )
+		written = [ ]
+		def set_weights( vert_ids, influence_indices, flat_weights ):
+			if vert_ids[ 0 ] == 500:
+				raise RuntimeError( 'no' )
+			written.extend( vert_ids )
+
+		write_counts = methods.write_weight_blocks( set_weights, table, self.data[ 'order' ], range( len( self.data[ 'order' ] ) ), chunk_size = 250 )
+		self.assertEqual( write_counts[ 'calls' ], 3 )
+		self.assertEqual( write_counts[ 'failed_verts' ], 250 )
+		self.assertEqual( write_counts[ 'failures' ], [ 'Writing verts 500-749 failed : no' ] )
+		self.assertEqual( sorted( written ), range( 500 ) + range( 750, 992 ) )
+
+
+if __name__ == '__main__':
+	unittest.main( )
@@ -0,0 +1,93 @@
+"""
+Batch scheduling with the stub backend, no Maya needed.
+"""
+
+# Python std lib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# Skonverter module imports
+import helpers
+import batch
+
+
+class Batch_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.folder = tempfile.mkdtemp( )
+
+	def tearDown( self ):
+		shutil.rmtree( self.folder )
+
+	def make_jobs( self, scene, count, **kwargs ):
+		return [ dict( { 'scene': scene, 'transform': 'mesh_{0}'.format( index ), 'root_bone': 'root',
+		                 'output': os.path.join( self.folder, '{0}_{1}.json'.format( scene, index ) ) }, **kwargs ) for index in range( count ) ]
+
+	def test_one_scene_spreads_over_workers( self ):
+		tasks = batch.group_jobs_by_scene( self.make_jobs( 'a', 5 ) + self.make_jobs( 'b', 1 ), task_count = 4 )
+		self.assertEqual( len( tasks ), 4 )
+		self.assertEqual( sorted( len( jobs ) for scene, jobs, retries in tasks ), [ 1, 1, 2, 2 ] )
+
+		# Every job is still there, in manifest order within its scene
+		outputs = [ job[ 'output' ] for scene, jobs, retries in sorted( tasks, key = lambda task: task[ 1 ][ 0 ][ 'output' ] ) for job in jobs ]
+		self.assertEqual( outputs, sorted( outputs ) )
+
+	def test_few_jobs_are_not_split_further( self ):
+		self.assertEqual( len( batch.group_jobs_by_scene( self.make_jobs( 'a', 2 ), task_count = 8 ) ), 2 )
+
+	def test_retries( self ):
+		report = batch.run_batch( self.make_jobs( 'a', 2, stub_failures = 1 ), workers = 2, retries = 1, backend_name = 'stub' )
+		self.assertEqual( ( report[ 'succeeded' ], report[ 'failed' ], report[ 'retried' ] ), ( 2, 0, 2 ) )
+
+	def test_dead_worker_fails_its_jobs( self ):
+		jobs = self.make_jobs( 'a', 3 ) + self.make_jobs( 'crash', 1, stub_exit = True )
+		report = batch.run_batch( jobs, workers = 2, backend_name = 'stub' )
+		self.assertEqual( ( report[ 'jobs' ], report[ 'succeeded' ], report[ 'failed' ] ), ( 4, 3, 1 ) )
+		failure = [ result for result in report[ 'results' ] if not result[ 'success' ] ][ 0 ]
+		self.assertEqual( failure[ 'scene' ], 'crash' )
+		self.assertIn( 'Worker process died', failure[ 'error' ] )
+
+	def get_attempts( self, report ):
+		return dict( ( os.path.basename( result[ 'job' ][ 'output' ] ), ( result[ 'success' ], result[ 'attempts' ] ) ) for result in report[ 'results' ] )
+
+	def test_dead_worker_keeps_finished_jobs( self ):
+		jobs = self.make_jobs( 'a', 3 )
+		jobs[ 2 ][ 'stub_exit' ] = True
+		report = batch.run_batch( jobs, workers = 1, backend_name = 'stub' )
+		self.assertEqual( self.get_attempts( report ), { 'a_0.json': ( True, 1 ), 'a_1.json': ( True, 1 ), 'a_2.json': ( False, 1 ) } )
+		self.assertTrue( os.path.exists( jobs[ 0 ][ 'output' ] ) and os.path.exists( jobs[ 1 ][ 'output' ] ) )
+
+	def test_dead_worker_requeues_the_rest( self ):
+		jobs = self.make_jobs( 'a', 3 )
+		jobs[ 1 ][ 'stub_exit' ] = True
+		report = batch.run_batch( jobs, workers = 1, backend_name = 'stub' )
+		self.assertEqual( self.get_attempts( report ), { 'a_0.json': ( True, 1 ), 'a_1.json': ( False, 1 ), 'a_2.json': ( True, 1 ) } )
+
+	def test_dead_worker_retries( self ):
+		jobs = self.make_jobs( 'a', 3 )
+		jobs[ 1 ][ 'stub_exits' ] = 1
+		report = batch.run_batch( jobs, workers = 1, retries = 1, backend_name = 'stub' )
+		self.assertEqual( self.get_attempts( report ), { 'a_0.json': ( True, 1 ), 'a_1.json': ( True, 2 ), 'a_2.json': ( True, 1 ) } )
+		self.assertEqual( ( report[ 'succeeded' ], report[ 'retried' ] ), ( 3, 1 ) )
+
+		# Out of retries, it fails for good
+		jobs = self.make_jobs( 'b', 1, stub_exits = 3 )
+		report = batch.run_batch( jobs, workers = 1, retries = 1, backend_name = 'stub' )
+		self.assertEqual( self.get_attempts( report ), { 'b_0.json': ( False, 2 ) } )
+
+	def test_scene_stays_open_until_a_job_fails( self ):
+		batch.init_worker( 'stub' )
+		try:
+			jobs = self.make_jobs( 'a', 3 ) + self.make_jobs( 'b', 1 )
+			jobs[ 1 ][ 'stub_failures' ] = 1
+			results = batch.run_scene_jobs( ( 'a', jobs[ :3 ], 1 ) ) + batch.run_scene_jobs( ( 'b', jobs[ 3: ], 1 ) )
+			self.assertTrue( all( result[ 'success' ] for result in results ) )
+			# Opened once, again after the failed attempt, then once for the next scene
+			self.assertEqual( batch._backend.open_scenes, [ 'a', 'a', 'b' ] )
+		finally:
+			batch._backend = batch._open_scene = None
+
+
+if __name__ == '__main__':
+	unittest.main( )
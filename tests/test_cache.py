@@ -0,0 +1,138 @@
+"""
+The result cache's hit and miss counting, least recently used eviction and the fingerprint key it stores conversions under.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# Skonverter module imports
+import helpers
+import cache
+import incremental
+import methods
+import sampler
+
+
+class Result_Cache_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.folder = tempfile.mkdtemp( )
+		helpers.install_cylinder( vertex_count = 500, joint_count = 6, influences = 2 )
+		self.data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0' )
+
+	def tearDown( self ):
+		shutil.rmtree( self.folder )
+
+	def get_cache( self, **kwargs ):
+		return cache.Result_Cache( self.folder, **kwargs )
+
+	def store_entries( self, keys ):
+		"""
+		Stores the data under each key with no limits, then backdates them so each one was used a minute after the last.
+		"""
+		result_cache = self.get_cache( max_bytes = 0, max_age = 0 )
+		now = time.time( )
+		for index, key in enumerate( keys ):
+			result_cache.store( key, self.data )
+			modified_time = now - 60 * ( len( keys ) - index )
+			os.utime( result_cache.get_entry_path( key ), ( modified_time, modified_time ) )
+
+	def get_keys( self, result_cache ):
+		return sorted( os.path.basename( entry_path ).split( '.' )[ 0 ] for _, _, entry_path in result_cache.get_entries( ) )
+
+	def test_hits_and_misses( self ):
+		result_cache = self.get_cache( )
+		self.assertIsNone( result_cache.lookup( 'abc' ) )
+		result_cache.store( 'abc', self.data, seconds = 2.5 )
+		data = result_cache.lookup( 'abc' )
+		self.assertEqual( data[ 'order' ], self.data[ 'order' ] )
+		self.assertNotIn( 'cache_seconds', data )
+		self.assertIsNone( result_cache.lookup( 'def' ) )
+		self.assertEqual( ( result_cache.hits, result_cache.misses, result_cache.seconds_saved ), ( 1, 2, 2.5 ) )
+
+		# The saved stats add up across caches on the same folder
+		other_cache = self.get_cache( )
+		other_cache.lookup( 'abc' )
+		stats = other_cache.get_stats( )
+		self.assertEqual( ( stats[ 'hits' ], stats[ 'misses' ], stats[ 'seconds_saved' ], stats[ 'entries' ] ), ( 2, 2, 5.0, 1 ) )
+		self.assertEqual( ( other_cache.hits, other_cache.misses ), ( 1, 0 ) )
+
+		other_cache.clear( )
+		self.assertEqual( other_cache.get_stats( )[ 'hits' ], 0 )
+		self.assertIsNone( other_cache.lookup( 'abc' ) )
+
+	def test_evicts_least_recently_used( self ):
+		self.store_entries( [ 'a', 'b', 'c' ] )
+		result_cache = self.get_cache( max_age = 0 )
+		entry_size = os.path.getsize( result_cache.get_entry_path( 'a' ) )
+
+		# A hit makes a the most recently used, so b is the first to go once only three entries fit
+		result_cache.lookup( 'a' )
+		result_cache.max_bytes = 3 * entry_size
+		result_cache.store( 'd', self.data )
+		self.assertEqual( self.get_keys( result_cache ), [ 'a', 'c', 'd' ] )
+
+		result_cache.max_bytes = entry_size
+		self.assertEqual( result_cache.evict( keep = result_cache.get_entry_path( 'c' ) ), 2 )
+		self.assertEqual( self.get_keys( result_cache ), [ 'c' ] )
+		self.assertEqual( result_cache.get_stats( )[ 'evictions' ], 3 )
+
+	def test_evicts_old_entries( self ):
+		self.store_entries( [ 'a', 'b', 'c' ] )
+		result_cache = self.get_cache( max_bytes = 0, max_age = 90 )
+		self.assertEqual( result_cache.evict( ), 2 )
+		self.assertEqual( self.get_keys( result_cache ), [ 'c' ] )
+
+	def test_cache_hit_skips_probing( self ):
+		result_cache = self.get_cache( )
+		methods.determine_weighting( 'mesh', 'mesh_joint_0', result_cache = result_cache )
+		data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0', result_cache = result_cache )
+		self.assertEqual( ( result_cache.hits, result_cache.misses ), ( 1, 1 ) )
+		self.assertEqual( message, 'Success' )
+		self.assertEqual( data[ 'order' ], self.data[ 'order' ] )
+		numpy.testing.assert_allclose( helpers.get_dense_weights( data ), helpers.get_dense_weights( self.data ), atol = 1e-6 )
+
+
+class Cache_Key_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 500, joint_count = 6, influences = 2 )
+		self.bone_names = [ 'mesh_joint_{0}'.format( index ) for index in range( 6 ) ]
+
+	def get_key( self, bone_names = None, tolerance = -1, **kwargs ):
+		bone_names = bone_names or self.bone_names
+		fingerprint = incremental.get_fingerprint( sampler.Mesh_Sampler( 'mesh' ), bone_names, tolerance, **kwargs )
+		return cache.get_cache_key( 'mesh', fingerprint, bone_names )
+
+	def test_same_scene_same_key( self ):
+		self.assertEqual( self.get_key( ), self.get_key( ) )
+
+	def test_settings_change_the_key( self ):
+		key = self.get_key( )
+		self.assertNotEqual( self.get_key( tolerance = 0.01 ), key )
+		self.assertNotEqual( self.get_key( max_influences = 4 ), key )
+		self.assertNotEqual( self.get_key( prune_threshold = 0.01 ), key )
+
+	def test_skeleton_changes_the_key( self ):
+		key = self.get_key( )
+		self.assertNotEqual( self.get_key( bone_names = self.bone_names[ :-1 ] ), key )
+		self.assertNotEqual( self.get_key( bone_names = list( reversed( self.bone_names ) ) ), key )
+
+		self.scene.joints[ 'mesh_joint_3' ].translation[ 0 ] += 1.0
+		self.scene.dirty( )
+		self.assertNotEqual( self.get_key( ), key )
+
+	def test_mesh_changes_the_key( self ):
+		key = self.get_key( )
+		self.scene.meshes[ 'mesh' ].rest_points[ 0, 1 ] += 0.5
+		self.scene.dirty( )
+		self.assertNotEqual( self.get_key( ), key )
+
+
+if __name__ == '__main__':
+	unittest.main( )
@@ -0,0 +1,53 @@
+"""
+Distributed probing with the fake backend, against a single session run.
+"""
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import distributed
+import methods
+
+
+SCENE = 'fake:2000x12x3'
+
+
+class Distributed_Test( unittest.TestCase ):
+	@classmethod
+	def setUpClass( cls ):
+		helpers.install_cylinder( vertex_count = 2000, joint_count = 12, influences = 3 )
+		cls.single_data, message = methods.determine_weighting( 'mesh', root_bone = 'mesh_joint_0' )
+
+	def run_distributed( self, **kwargs ):
+		return distributed.determine_weighting_distributed( SCENE, 'mesh', 'mesh_joint_0', backend_name = 'fake', workers = 2, **kwargs )
+
+	def test_partitions( self ):
+		self.assertEqual( distributed.partition_bones( [ [ 1 ], [ 2, 3, 4 ], [ 5 ], [ 6 ] ], 3 ), [ [ 1 ], [ 2, 3, 4 ], [ 5, 6 ] ] )
+		self.assertEqual( distributed.partition_bones( [ [ 1 ] ], 5 ), [ [ 1 ] ] )
+
+	def test_matches_single_session( self ):
+		data, message = self.run_distributed( )
+		self.assertEqual( data[ 'weight' ], self.single_data[ 'weight' ] )
+		self.assertEqual( data[ 'totals' ], self.single_data[ 'totals' ] )
+		self.assertEqual( data[ 'order' ], self.single_data[ 'order' ] )
+
+	def test_failed_partition_is_retried( self ):
+		data, message = self.run_distributed( retries = 1, fake_failures = { 0: 1 } )
+		self.assertEqual( data[ 'weight' ], self.single_data[ 'weight' ] )
+		self.assertIn( '1 retried', message )
+
+	def test_dead_worker_partition_is_retried( self ):
+		data, message = self.run_distributed( retries = 1, fake_exits = { 1: 1 } )
+		self.assertEqual( data[ 'weight' ], self.single_data[ 'weight' ] )
+		self.assertIn( '1 retried', message )
+
+	def test_gives_up_after_retries( self ):
+		data, message = self.run_distributed( retries = 1, fake_exits = { 0: 2 } )
+		self.assertIsNone( data )
+		self.assertIn( 'Worker process died', message )
+
+
+if __name__ == '__main__':
+	unittest.main( )
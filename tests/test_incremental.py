@@ -0,0 +1,57 @@
+"""
+Incremental reruns against full runs, on the fake skinned cylinder.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import methods
+
+
+class Incremental_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 2000, joint_count = 12, influences = 3 )
+		self.mesh = self.scene.meshes[ 'mesh' ]
+
+	def rebind_joint( self, joint_name, offset, weight_scale ):
+		"""
+		Moves the joint's bind position and scales down its skin weights, so it's a changed bone that lost influence.
+		"""
+		joint = self.scene.joints[ joint_name ]
+		joint.translation = joint.translation + numpy.asarray( offset, dtype = numpy.float64 )
+		for name in self.scene.joint_order:
+			self.scene.joints[ name ].rest_world = self.scene.get_world_translation( name )
+		column = self.scene.joint_order.index( joint_name )
+		self.mesh.joint_weight = numpy.where( self.mesh.joint_index == column, numpy.round( self.mesh.joint_weight * weight_scale, 3 ), self.mesh.joint_weight )
+		self.scene.dirty( )
+
+	def run_pair( self, **kwargs ):
+		previous_data, message = methods.determine_weighting( 'mesh', root_bone = 'mesh_joint_0', **kwargs )
+		self.rebind_joint( 'mesh_joint_5', ( 0.5, 0, 0 ), 0.1 )
+		incremental_data, message = methods.determine_weighting( 'mesh', root_bone = 'mesh_joint_0', previous_data = previous_data, **kwargs )
+		full_data, message = methods.determine_weighting( 'mesh', root_bone = 'mesh_joint_0', **kwargs )
+		return incremental_data, full_data
+
+	def test_incremental_matches_full_run( self ):
+		incremental_data, full_data = self.run_pair( )
+		self.assertEqual( incremental_data[ 'weight' ], full_data[ 'weight' ] )
+
+	def test_pruned_incremental_matches_full_run( self ):
+		incremental_data, full_data = self.run_pair( max_influences = 2 )
+		self.assertEqual( incremental_data[ 'weight' ], full_data[ 'weight' ] )
+		self.assertEqual( incremental_data[ 'totals' ], full_data[ 'totals' ] )
+
+	def test_pruned_data_is_not_reused( self ):
+		previous_data, message = methods.determine_weighting( 'mesh', root_bone = 'mesh_joint_0', prune_threshold = 0.05 )
+		fingerprint = dict( previous_data[ 'fingerprint' ] )
+		self.assertTrue( fingerprint[ 'pruned' ] )
+		self.assertIsNone( methods.incremental.get_changed_bones( previous_data, fingerprint ) )
+
+
+if __name__ == '__main__':
+	unittest.main( )
@@ -0,0 +1,104 @@
+"""
+The streaming json writer against plain json, with the per vertex dictionaries split over several batches, and data round tripping
+between the json and binary files.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# Skonverter module imports
+import helpers
+import cache
+import json_stream
+import methods
+import weights
+
+
+class Json_Stream_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.folder = tempfile.mkdtemp( )
+		self.file_path = os.path.join( self.folder, 'data.json' )
+		self.batch_size = json_stream.WRITE_BATCH_SIZE
+		json_stream.WRITE_BATCH_SIZE = 3
+
+	def tearDown( self ):
+		json_stream.WRITE_BATCH_SIZE = self.batch_size
+		shutil.rmtree( self.folder )
+
+	def write_and_load( self, data ):
+		json_stream.write_json( self.file_path, data )
+		with open( self.file_path, 'r' ) as data_file:
+			return json.load( data_file )
+
+	def test_weights_and_totals_round_trip( self ):
+		data = {
+			'order'       : [ 'root', 'spine' ],
+			'fingerprint' : { 'mesh': 'abc', 'pruned': False },
+			'weight'      : dict( ( str( vert_id ), [ [ 'root', 0.25 ], [ 'spine', 0.75 ] ] ) for vert_id in range( 10 ) ),
+			'totals'      : dict( ( str( vert_id ), 1.0 + vert_id / 8.0 ) for vert_id in range( 7 ) ),
+		}
+		self.assertEqual( self.write_and_load( data ), data )
+
+	def test_weight_comes_last( self ):
+		data = { 'weight': { '0': [ [ 'root', 1.0 ] ] }, 'totals': { '0': 1.0 }, 'order': [ 'root' ] }
+		json_stream.write_json( self.file_path, data )
+		keys = [ key for event, key, value in json_stream.iter_json_document( self.file_path ) if event == 'value' ]
+		self.assertEqual( sorted( keys ), [ 'order', 'totals' ] )
+		with open( self.file_path, 'r' ) as data_file:
+			self.assertTrue( data_file.read( ).startswith( '{"order": ["root"], "totals": {"0": 1.0}, "weight": {' ) )
+
+	def test_empty_dictionaries( self ):
+		self.assertEqual( self.write_and_load( { 'order': [ ] } ), { 'order': [ ], 'weight': { } } )
+		self.assertEqual( self.write_and_load( { 'order': [ ], 'totals': { }, 'weight': { } } ), { 'order': [ ], 'totals': { }, 'weight': { } } )
+
+
+class Data_File_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.folder = tempfile.mkdtemp( )
+		helpers.install_cylinder( vertex_count = 500, joint_count = 6, influences = 2 )
+		self.data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0' )
+
+	def tearDown( self ):
+		shutil.rmtree( self.folder )
+
+	def get_path( self, file_name ):
+		return os.path.join( self.folder, file_name )
+
+	def assert_same_data( self, data, expected ):
+		self.assertEqual( list( data[ 'order' ] ), list( expected[ 'order' ] ) )
+		numpy.testing.assert_allclose( helpers.get_dense_weights( data ), helpers.get_dense_weights( expected ), atol = 1e-6 )
+		vertex_count = weights.Weight_Table.from_data( expected ).vertex_count
+		numpy.testing.assert_allclose( weights.get_totals_array( data[ 'totals' ], vertex_count )[ :vertex_count ],
+		                               weights.get_totals_array( expected[ 'totals' ], vertex_count ) )
+
+	def test_binary_json_binary_round_trip( self ):
+		methods.save_data( self.get_path( 'first.skw' ), self.data )
+		binary_data = methods.load_data( self.get_path( 'first.skw' ) )
+		self.assertIsInstance( binary_data[ 'totals' ], numpy.ndarray )
+
+		methods.save_data( self.get_path( 'middle.json' ), binary_data )
+		json_data = methods.load_data( self.get_path( 'middle.json' ) )
+		self.assertEqual( sorted( json_data[ 'totals' ] ), sorted( self.data[ 'totals' ] ) )
+
+		methods.save_data( self.get_path( 'last.skw' ), json_data )
+		for data in ( binary_data, json_data, methods.load_data( self.get_path( 'last.skw' ) ) ):
+			self.assert_same_data( data, self.data )
+
+	def test_cache_hit_saves_as_json( self ):
+		result_cache = cache.Result_Cache( self.get_path( 'cache' ) )
+		for attempt in range( 2 ):
+			data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0', result_cache = result_cache )
+			methods.save_data( self.get_path( 'cached.json' ), data )
+		self.assertEqual( result_cache.hits, 1 )
+		self.assert_same_data( methods.load_data( self.get_path( 'cached.json' ) ), self.data )
+
+
+if __name__ == '__main__':
+	unittest.main( )
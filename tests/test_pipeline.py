@@ -0,0 +1,101 @@
+"""
+The weight pipeline's buffer pool, with snapshots of more than one shape.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import threading
+import unittest
+
+# Skonverter module imports
+import helpers
+import fake_maya
+import methods
+import pipeline
+
+
+def sum_points( points, offset ):
+	return points.sum( ) + offset
+
+
+class Pipeline_Test( unittest.TestCase ):
+	def run_meshes( self, weight_pipeline, shapes, probe_count ):
+		buffer_ids = set( )
+		for key in range( probe_count ):
+			for shape in shapes:
+				points = weight_pipeline.get_buffer( shape )
+				points[ : ] = key
+				buffer_ids.add( id( points ) )
+				weight_pipeline.submit( ( key, shape ), points, 0.5 )
+				self.assertLessEqual( weight_pipeline.buffer_count, weight_pipeline.buffer_limit )
+		return buffer_ids
+
+	def test_shapes_keep_their_buffers( self ):
+		shapes = [ ( 1, 10, 3 ), ( 1, 20, 3 ) ]
+		with pipeline.Weight_Pipeline( sum_points, worker_count = 0, queue_size = 2 ) as weight_pipeline:
+			buffer_ids = self.run_meshes( weight_pipeline, shapes, 20 )
+			results = weight_pipeline.get_results( )
+
+		# Inline, every buffer is back before the next one's asked for, so one per shape covers the whole run.
+		self.assertEqual( len( buffer_ids ), 2 )
+		self.assertEqual( results[ ( 19, ( 1, 20, 3 ) ) ], 19 * 60 + 0.5 )
+
+	def test_total_is_capped( self ):
+		shapes = [ ( 1, index + 1, 3 ) for index in range( 6 ) ]
+		with pipeline.Weight_Pipeline( sum_points, worker_count = 2, queue_size = 1 ) as weight_pipeline:
+			self.run_meshes( weight_pipeline, shapes, 10 )
+			results = weight_pipeline.get_results( )
+
+		self.assertEqual( len( results ), 60 )
+		self.assertEqual( results[ ( 9, ( 1, 6, 3 ) ) ], 9 * 18 + 0.5 )
+		self.assertLessEqual( sum( len( free_buffers ) for free_buffers in weight_pipeline.free_buffers.values( ) ), weight_pipeline.buffer_limit )
+
+	def test_foreign_arrays_stay_out_of_the_pool( self ):
+		with pipeline.Weight_Pipeline( sum_points, worker_count = 0 ) as weight_pipeline:
+			weight_pipeline.submit( 0, numpy.zeros( ( 1, 4, 3 ) ), 0.0 )
+			weight_pipeline.get_results( )
+		self.assertEqual( weight_pipeline.free_buffers, { } )
+
+	def test_held_buffers_fit_the_pool( self ):
+		with pipeline.Weight_Pipeline( sum_points, worker_count = 0, queue_size = 1, held_buffers = 8 ) as weight_pipeline:
+			held = [ weight_pipeline.get_buffer( ( 1, 4, 3 ) ) for index in range( 8 ) ]
+			for index, points in enumerate( held ):
+				points[ : ] = 1
+				weight_pipeline.submit( index, points, 0.0 )
+			self.assertEqual( weight_pipeline.get_results( ), dict( ( index, 12.0 ) for index in range( 8 ) ) )
+
+
+class Multi_Mesh_Test( unittest.TestCase ):
+	def run_meshes( self, mesh_count, **kwargs ):
+		"""
+		Runs determine_weighting over mesh_count meshes on one skeleton, more than the default buffer pool has room for. Runs on a
+		thread so a pool that's too small fails the test rather than hanging it.
+		"""
+		scene = fake_maya.build_skinned_cylinder( vertex_count = 200, joint_count = 4 )
+		mesh_names = [ 'mesh' ]
+		for index in range( 1, mesh_count ):
+			mesh_names.append( 'mesh_{0}'.format( index ) )
+			fake_maya.build_skinned_cylinder( vertex_count = 200, joint_count = 4, scene = scene, mesh_name = mesh_names[ -1 ], skeleton_name = 'mesh' )
+		fake_maya.install( scene )
+
+		results = [ ]
+		thread = threading.Thread( target = lambda: results.append( methods.determine_weighting( mesh_names, 'mesh_joint_0', **kwargs ) ) )
+		thread.daemon = True
+		thread.start( )
+		thread.join( 60 )
+		self.assertTrue( results, 'determine_weighting did not finish' )
+		data, message = results[ 0 ]
+		self.assertEqual( message, 'Success' )
+		self.assertEqual( sorted( data ), sorted( mesh_names ) )
+
+	def test_more_meshes_than_the_pool( self ):
+		self.run_meshes( 12 )
+
+	def test_more_meshes_than_the_pool_inline( self ):
+		self.run_meshes( 8, pipeline_workers = 0 )
+
+
+if __name__ == '__main__':
+	unittest.main( )
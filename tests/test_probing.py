@@ -0,0 +1,101 @@
+"""
+The probe context putting the skeleton, undo and refresh state back when probing stops early, from an error in the middle of a probe
+or a job cancelled part way through.
+"""
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import const
+import methods
+import probing
+import sampler
+
+
+class Probe_Error( Exception ):
+	pass
+
+
+class Restore_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 500, joint_count = 6, influences = 2 )
+		self.rest_translations = dict( ( name, joint.translation.copy( ) ) for name, joint in self.scene.joints.iteritems( ) )
+		self.sample = sampler.Mesh_Sampler.sample
+		self.undo_mode = const.PROBE_UNDO_MODE
+
+	def tearDown( self ):
+		sampler.Mesh_Sampler.sample = self.sample
+		const.PROBE_UNDO_MODE = self.undo_mode
+
+	def fail_sample( self, sample_count ):
+		"""
+		Makes the mesh sampler raise on its sample_count'th call, with bones still moved.
+		"""
+		calls = [ ]
+		def sample( mesh_sampler, out = None ):
+			calls.append( None )
+			if len( calls ) >= sample_count:
+				raise Probe_Error( 'Sample failed' )
+			return self.sample( mesh_sampler, out )
+		sampler.Mesh_Sampler.sample = sample
+
+	def assert_restored( self ):
+		for name, joint in self.scene.joints.iteritems( ):
+			self.assertEqual( joint.translation.tolist( ), self.rest_translations[ name ].tolist( ), name )
+			self.assertEqual( self.scene.get_world_translation( name ).tolist( ), joint.rest_world.tolist( ), name )
+		self.assertTrue( self.scene.undo_state )
+		self.assertEqual( self.scene.undo_chunks, 0 )
+		self.assertFalse( self.scene.refresh_suspended )
+
+	def test_error_inside_the_context( self ):
+		for undo_mode in probing.UNDO_MODES:
+			for use_api in ( True, False ):
+				with self.assertRaises( Probe_Error ):
+					with probing.Probe_Context( [ 'mesh_joint_1', 'mesh_joint_3' ], undo_mode = undo_mode, use_api = use_api ) as probe_context:
+						probe_context.move_bones( [ 'mesh_joint_1', 'mesh_joint_3' ], [ 1, 0 ] )
+						if undo_mode == 'off':
+							self.assertFalse( self.scene.undo_state )
+						elif undo_mode == 'chunk':
+							self.assertEqual( self.scene.undo_chunks, 1 )
+						self.assertTrue( self.scene.refresh_suspended )
+						raise Probe_Error( 'Probe failed' )
+				self.assert_restored( )
+
+	def test_error_mid_probe( self ):
+		for undo_mode in probing.UNDO_MODES:
+			const.PROBE_UNDO_MODE = undo_mode
+			self.fail_sample( 2 )
+			with self.assertRaises( Probe_Error ):
+				methods.determine_weighting( 'mesh', 'mesh_joint_0', batch_probes = 2 )
+			self.assert_restored( )
+
+	def test_error_mid_interactive_job( self ):
+		self.fail_sample( 3 )
+		job = methods.Weighting_Job( 'mesh', 'mesh_joint_0', interactive = True )
+		with self.assertRaises( Probe_Error ):
+			while job.step( ):
+				pass
+		self.assertTrue( job.finished )
+		self.assert_restored( )
+
+	def test_cancel_mid_job( self ):
+		for interactive in ( True, False ):
+			for undo_mode in probing.UNDO_MODES:
+				const.PROBE_UNDO_MODE = undo_mode
+				job = methods.Weighting_Job( 'mesh', 'mesh_joint_0', interactive = interactive )
+				for step in range( 3 ):
+					self.assertTrue( job.step( ) )
+				self.assertTrue( 0 < job.done < job.total )
+				# Non interactive jobs hold the undo and refresh state between steps, cancelling has to give it back.
+				self.assertEqual( self.scene.refresh_suspended, not interactive )
+
+				self.assertTrue( job.cancel( ) )
+				self.assertTrue( job.cancelled )
+				self.assertFalse( job.data )
+				self.assert_restored( )
+
+
+if __name__ == '__main__':
+	unittest.main( )
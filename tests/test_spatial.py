@@ -0,0 +1,71 @@
+"""
+The spatial index's verify mode against a plain full scan of the cylinder, with the index's candidates as they come and with
+candidates that miss verts.
+"""
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import methods
+import spatial
+
+
+class Verify_Test( unittest.TestCase ):
+	def setUp( self ):
+		helpers.install_cylinder( vertex_count = 2000, joint_count = 16, influences = 2 )
+		self.full_data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0', spatial_index = False )
+
+		# Keep hold of each run's Mesh_Weighting, to see what the index did
+		self.mesh_weightings = [ ]
+		self.finish = methods.Mesh_Weighting.finish
+		def finish( mesh_weighting ):
+			self.mesh_weightings.append( mesh_weighting )
+			return self.finish( mesh_weighting )
+		methods.Mesh_Weighting.finish = finish
+		self.get_candidates = spatial.Influence_Index.get_candidates
+
+	def tearDown( self ):
+		methods.Mesh_Weighting.finish = self.finish
+		spatial.Influence_Index.get_candidates = self.get_candidates
+
+	def run_index( self, spatial_verify ):
+		data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0', spatial_index = True, spatial_verify = spatial_verify )
+		self.assertEqual( message, 'Success' )
+		self.assertEqual( data[ 'order' ], self.full_data[ 'order' ] )
+		return data, self.mesh_weightings[ -1 ]
+
+	def miss_candidates( self ):
+		"""
+		Drops every other candidate, so the index misses verts the bones do move.
+		"""
+		get_candidates = self.get_candidates
+		def miss_candidates( influence_index, bone_names ):
+			candidates = get_candidates( influence_index, bone_names )
+			return candidates if candidates is None else candidates[ ::2 ]
+		spatial.Influence_Index.get_candidates = miss_candidates
+
+	def test_verify_matches_full_scan( self ):
+		data, mesh_weighting = self.run_index( True )
+		self.assertGreater( mesh_weighting.influence_index.candidate_count, 0 )
+		self.assertEqual( mesh_weighting.spatial_mismatches, [ ] )
+		self.assertEqual( data[ 'weight' ], self.full_data[ 'weight' ] )
+
+	def test_index_matches_full_scan( self ):
+		data, mesh_weighting = self.run_index( False )
+		self.assertGreater( mesh_weighting.influence_index.candidate_count, 0 )
+		self.assertEqual( data[ 'weight' ], self.full_data[ 'weight' ] )
+
+	def test_verify_replaces_missed_verts( self ):
+		self.miss_candidates( )
+		data, mesh_weighting = self.run_index( False )
+		self.assertNotEqual( data[ 'weight' ], self.full_data[ 'weight' ] )
+
+		data, mesh_weighting = self.run_index( True )
+		self.assertTrue( mesh_weighting.spatial_mismatches )
+		self.assertEqual( data[ 'weight' ], self.full_data[ 'weight' ] )
+
+
+if __name__ == '__main__':
+	unittest.main( )
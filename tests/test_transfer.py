@@ -0,0 +1,144 @@
+"""
+Transferring converted weights onto other meshes through a correspondence, and keeping the correspondence on disk when asked to.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# Skonverter module imports
+import helpers
+import fake_maya
+import const
+import methods
+import transfer
+import weights
+
+
+class Correspondence_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 500, joint_count = 6, influences = 2 )
+		self.mesh = self.scene.meshes[ 'mesh' ]
+		self.topology = ( self.mesh.polygon_counts, self.mesh.polygon_connects )
+		self.data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0' )
+
+	def test_same_points_map_one_to_one( self ):
+		points = self.mesh.rest_points
+		for source_topology in ( self.topology, None ):
+			correspondence = transfer.get_correspondence( points, points, source_topology = source_topology, use_cache = False )
+			# Every target takes all of one source vertex, wherever it sits among the neighbours
+			columns = correspondence.blend.argmax( axis = 1 )
+			self.assertEqual( correspondence.neighbour_ids[ numpy.arange( len( points ) ), columns ].tolist( ), range( len( points ) ) )
+			self.assertTrue( ( correspondence.blend.max( axis = 1 ) == 1.0 ).all( ) )
+			self.assertTrue( ( correspondence.blend.sum( axis = 1 ) == 1.0 ).all( ) )
+
+			source_table = weights.Weight_Table.from_data( self.data )
+			target_table = correspondence.transfer( source_table )
+			numpy.testing.assert_array_equal( target_table.get_dense_block( numpy.arange( len( points ) ), self.data[ 'order' ] ),
+			                                  helpers.get_dense_weights( self.data ) )
+
+	def test_face_centres_blend_their_corners( self ):
+		points = self.mesh.rest_points
+		quads = numpy.asarray( self.mesh.polygon_connects ).reshape( -1, 4 )[ :20 ]
+		centres = points[ quads ].mean( axis = 1 )
+		correspondence = transfer.get_correspondence( points, centres, source_topology = self.topology, use_cache = False )
+		for quad, neighbour_ids, blend in zip( quads, correspondence.neighbour_ids, correspondence.blend ):
+			self.assertTrue( set( neighbour_ids[ blend > 0 ] ) <= set( quad ) )
+			numpy.testing.assert_allclose( numpy.dot( blend, points[ neighbour_ids ] ), points[ quad ].mean( axis = 0 ), atol = 1e-9 )
+		numpy.testing.assert_allclose( correspondence.blend.sum( axis = 1 ), 1.0 )
+
+	def test_nearest_blends_by_distance( self ):
+		points = self.mesh.rest_points
+		correspondence = transfer.get_correspondence( points, points + 0.01, mode = 'nearest', neighbours = 4, use_cache = False )
+		self.assertEqual( correspondence.neighbour_ids.shape, ( len( points ), 4 ) )
+		distances = numpy.linalg.norm( points[ correspondence.neighbour_ids ] - ( points + 0.01 )[ :, None ], axis = 2 )
+		self.assertTrue( ( numpy.diff( distances, axis = 1 ) >= 0 ).all( ) )
+		self.assertTrue( ( numpy.diff( correspondence.blend, axis = 1 ) <= 0 ).all( ) )
+		numpy.testing.assert_allclose( correspondence.blend.sum( axis = 1 ), 1.0 )
+
+
+class Transfer_Weighting_Test( unittest.TestCase ):
+	def setUp( self ):
+		self.scene = helpers.install_cylinder( vertex_count = 2000, joint_count = 8, influences = 2 )
+		fake_maya.build_skinned_cylinder( vertex_count = 500, joint_count = 8, influences = 2, scene = self.scene, mesh_name = 'mesh_lod', skeleton_name = 'mesh' )
+		self.data, message = methods.determine_weighting( 'mesh', 'mesh_joint_0' )
+
+		self.folder = tempfile.mkdtemp( )
+		self.cache_dir = const.CACHE_DIR
+		const.CACHE_DIR = self.folder
+
+	def tearDown( self ):
+		const.CACHE_DIR = self.cache_dir
+		shutil.rmtree( self.folder )
+
+	def get_expected_weights( self, data ):
+		"""
+		The LOD's ground truth weights, in the data's bone order.
+		"""
+		mesh = self.scene.meshes[ 'mesh_lod' ]
+		expected = numpy.zeros( ( len( mesh.rest_points ), len( self.scene.joint_order ) ) )
+		numpy.add.at( expected, ( numpy.arange( len( mesh.rest_points ) )[ :, None ], mesh.joint_index ), mesh.joint_weight )
+		return expected[ :, [ self.scene.joint_order.index( bone_name ) for bone_name in data[ 'order' ] ] ]
+
+	def get_cache_files( self ):
+		cache_folder = os.path.join( self.folder, transfer.CACHE_FOLDER )
+		return sorted( os.listdir( cache_folder ) ) if os.path.isdir( cache_folder ) else [ ]
+
+	def test_transfer_onto_lod( self ):
+		for mode in ( 'barycentric', 'nearest' ):
+			lod_data, message = methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, mode = mode )
+			self.assertEqual( message, 'Success' )
+			lod_weights = helpers.get_dense_weights( lod_data )
+			self.assertEqual( lod_weights.shape, ( len( self.scene.meshes[ 'mesh_lod' ].rest_points ), len( self.data[ 'order' ] ) ) )
+			numpy.testing.assert_allclose( lod_weights.sum( axis = 1 ), 1.0, atol = 1e-6 )
+			# The LOD's rings sit between the source's, so weights near a joint get blended a little across it
+			errors = numpy.abs( lod_weights - self.get_expected_weights( lod_data ) )
+			self.assertLess( errors.max( ), 0.1 )
+			self.assertLess( errors.mean( ), 0.01 )
+
+	def test_missing_mesh( self ):
+		self.assertEqual( methods.transfer_weighting( 'mesh', 'nothing', self.data ), ( None, 'No object matches name: nothing' ) )
+
+	def test_cache_off_by_default( self ):
+		methods.transfer_weighting( 'mesh', 'mesh_lod', self.data )
+		self.assertEqual( self.get_cache_files( ), [ ] )
+
+	def test_cached_correspondence( self ):
+		lod_data, message = methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, use_cache = True )
+		cache_files = self.get_cache_files( )
+		self.assertEqual( len( cache_files ), 1 )
+		self.assertTrue( cache_files[ 0 ].endswith( '.npz' ) )
+
+		# The second run has to load it rather than build it again
+		build = transfer.Correspondence.__dict__[ 'build' ]
+		def fail_build( cls, *args, **kwargs ):
+			raise AssertionError( 'Correspondence was rebuilt' )
+		transfer.Correspondence.build = classmethod( fail_build )
+		try:
+			cached_data, message = methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, use_cache = True )
+		finally:
+			transfer.Correspondence.build = build
+		numpy.testing.assert_array_equal( helpers.get_dense_weights( cached_data ), helpers.get_dense_weights( lod_data ) )
+
+		# A different mode is a different correspondence
+		methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, mode = 'nearest', use_cache = True )
+		self.assertEqual( len( self.get_cache_files( ) ), 2 )
+
+	def test_unreadable_correspondence_is_rebuilt( self ):
+		methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, use_cache = True )
+		cache_path = os.path.join( self.folder, transfer.CACHE_FOLDER, self.get_cache_files( )[ 0 ] )
+		with open( cache_path, 'wb' ) as cache_file:
+			cache_file.write( 'not a correspondence' )
+
+		lod_data, message = methods.transfer_weighting( 'mesh', 'mesh_lod', self.data, use_cache = True )
+		self.assertEqual( message, 'Success' )
+		self.assertEqual( transfer.Correspondence.load( cache_path ).neighbour_ids.shape[ 0 ], len( self.scene.meshes[ 'mesh_lod' ].rest_points ) )
+
+
+if __name__ == '__main__':
+	unittest.main( )
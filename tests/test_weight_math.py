@@ -0,0 +1,117 @@
+"""
+The probe weight solve against the math it replaced. A single +Y pose has to give what the original per vertex loop gave, the
+distance each vert moved over BONE_DELTA rounded through round_float. Multi pose solves are checked against numpy's own least squares.
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import unittest
+
+# Skonverter module imports
+import helpers
+import methods
+
+
+def calculate_vertex_distance( vector1, vector2 ):
+	"""
+	The original distance between two points, axis by axis.
+	"""
+	difference_x = vector1[ 0 ] - vector2[ 0 ]
+	difference_y = vector1[ 1 ] - vector2[ 1 ]
+	difference_z = vector1[ 2 ] - vector2[ 2 ]
+	return ( difference_x ** 2 + difference_y ** 2 + difference_z ** 2 ) ** 0.5
+
+
+def get_baseline_weights( new_positions, rest_positions, delta, tolerance = None ):
+	"""
+	The original per vertex loop, { vert_id : weight } for every vert that moved, dropping the ones at or below the tolerance.
+	"""
+	baseline_weights = { }
+	for vert_id, ( new_position, rest_position ) in enumerate( zip( new_positions.tolist( ), rest_positions.tolist( ) ) ):
+		if new_position == rest_position:
+			continue
+		weight = methods.round_float( calculate_vertex_distance( new_position, rest_position ) / delta )
+		if tolerance is not None and weight <= tolerance:
+			continue
+		baseline_weights[ vert_id ] = weight
+	return baseline_weights
+
+
+class Single_Pose_Test( unittest.TestCase ):
+	def setUp( self ):
+		random_state = numpy.random.RandomState( 7 )
+		self.rest_positions = random_state.uniform( -50, 50, ( 3000, 3 ) )
+		self.new_positions = self.rest_positions.copy( )
+		moved = random_state.rand( 3000 ) < 0.6
+		self.new_positions[ moved, 1 ] += random_state.rand( moved.sum( ) ) * methods.BONE_DELTA
+
+	def get_tie_positions( self, delta ):
+		"""
+		Verts moved along +Y so their weight lands on a 3 decimal half step, where numpy.round and string formatting disagree.
+		"""
+		half_steps = ( numpy.arange( 1000 ) + 0.5 ) / 1000.0
+		rest_positions = numpy.zeros( ( len( half_steps ), 3 ) )
+		new_positions = rest_positions.copy( )
+		new_positions[ :, 1 ] = half_steps * delta
+		return new_positions, rest_positions
+
+	def check_weights( self, new_positions, rest_positions, delta = methods.BONE_DELTA, tolerance = None ):
+		probe_matrix = methods.get_probe_matrix( methods.get_probe_poses( 1 ), delta )
+		[ ( vert_ids, weights ) ] = methods.calculate_probe_weights( new_positions[ None ], rest_positions, probe_matrix, tolerance )
+		self.assertEqual( dict( zip( vert_ids.tolist( ), weights.tolist( ) ) ), get_baseline_weights( new_positions, rest_positions, delta, tolerance = tolerance ) )
+
+	def test_weights_match_baseline( self ):
+		self.check_weights( self.new_positions, self.rest_positions )
+
+	def test_rounding_ties_match_baseline( self ):
+		for delta in ( methods.BONE_DELTA, 0.25 ):
+			new_positions, rest_positions = self.get_tie_positions( delta )
+			raw_weights = ( new_positions[ :, 1 ] - rest_positions[ :, 1 ] ) / delta
+			self.assertTrue( ( methods.round_float_array( raw_weights ) != numpy.array( [ methods.round_float( weight ) for weight in raw_weights ] ) ).any( ) )
+			self.check_weights( new_positions, rest_positions, delta = delta )
+
+	def test_tolerance( self ):
+		self.check_weights( self.new_positions, self.rest_positions, tolerance = 0.25 )
+
+
+class Multi_Pose_Test( unittest.TestCase ):
+	def setUp( self ):
+		random_state = numpy.random.RandomState( 11 )
+		self.delta = 0.5
+		self.probe_matrix = methods.get_probe_matrix( methods.get_probe_poses( 3, 4 ), self.delta )
+
+		# Three bones probed together over four poses. Every vert moves by its weights times each pose's offsets, plus some noise
+		# the least squares solve has to average out.
+		self.rest_positions = random_state.uniform( -50, 50, ( 2000, 3 ) )
+		self.true_weights = random_state.rand( 2000, 3 ) * ( random_state.rand( 2000, 3 ) < 0.7 )
+		offsets = numpy.dot( self.true_weights, self.probe_matrix.T ).reshape( 2000, 4, 3 ).transpose( 1, 0, 2 )
+		self.new_positions = self.rest_positions[ None ] + offsets + random_state.normal( 0, 1e-4, offsets.shape )
+
+	def get_reference_weights( self ):
+		"""
+		Solves each vert on its own with numpy.linalg.lstsq. Returns the unrounded weights, (N,B).
+		"""
+		displacements = ( self.new_positions - self.rest_positions[ None ] ).transpose( 1, 0, 2 ).reshape( len( self.rest_positions ), -1 )
+		return numpy.array( [ numpy.linalg.lstsq( self.probe_matrix, displacement, rcond = -1 )[ 0 ] for displacement in displacements ] )
+
+	def test_solve_matches_lstsq( self ):
+		reference_weights = self.get_reference_weights( )
+		bone_weights = methods.calculate_probe_weights( self.new_positions, self.rest_positions, self.probe_matrix, 0.05 )
+		for column, ( vert_ids, weights ) in enumerate( bone_weights ):
+			reference = reference_weights[ :, column ]
+			self.assertEqual( vert_ids.tolist( ), numpy.flatnonzero( numpy.round( reference, 3 ) > 0.05 ).tolist( ) )
+			# Rounded to 3 decimals, so within half a step of the unrounded solve.
+			numpy.testing.assert_allclose( weights, reference[ vert_ids ], atol = 5e-4 + 1e-9 )
+
+	def test_solve_recovers_the_weights( self ):
+		bone_weights = methods.calculate_probe_weights( self.new_positions, self.rest_positions, self.probe_matrix, None )
+		for column, ( vert_ids, weights ) in enumerate( bone_weights ):
+			moved = numpy.flatnonzero( self.true_weights[ :, column ] > 1e-3 )
+			self.assertTrue( set( moved.tolist( ) ) <= set( vert_ids.tolist( ) ) )
+			numpy.testing.assert_allclose( weights, self.true_weights[ vert_ids, column ], atol = 1e-3 )
+
+
+if __name__ == '__main__':
+	unittest.main( )
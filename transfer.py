@@ -0,0 +1,315 @@
+"""
+Contains the correspondence used to transfer a converted mesh's weights onto other meshes of the same shape, like its LODs.
+
+Probing has to move every joint and sample the mesh each time, which is a waste on LOD1-4 when LOD0 already has the answer. A
+correspondence instead maps each target vertex to a few source vertices with blend weights, in rest pose object space. Each target
+row of the transferred table is the blend of those source rows, so only the base mesh ever needs probing:
+
+	correspondence = transfer.get_correspondence( lod0_points, lod1_points, source_topology = ( polygon_counts, polygon_connects ) )
+	lod1_table = correspondence.transfer( lod0_table )
+
+Two ways to pick them ( const.TRANSFER_MODE ):
+	barycentric  : the closest point on the source surface, out of the triangles around the nearest source vertex. The blend is that
+	               point's barycentric coordinates, so weights interpolate smoothly across the source faces. Needs the source topology.
+	nearest      : the const.TRANSFER_NEIGHBOURS nearest source vertices, blended by inverse distance.
+
+A target vertex sitting right on a source vertex takes that vertex's weights as they are either way.
+
+The nearest points come out of the same uniform grid the spatial index uses, searched in growing blocks of cells around each target
+vertex's cell, so the distance math is all done a cell at a time rather than a vertex at a time. Building the correspondence is
+still the slowest part of a transfer, so it's kept on disk in const.CACHE_DIR, keyed on both meshes.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import hashlib
+import os
+
+# Skonverter module imports
+import const
+import spatial
+import weights
+
+
+KEY_VERSION = 1 # Bump when the way correspondences are built changes, so old files stop matching
+CACHE_FOLDER = 'correspondence'
+
+
+class Correspondence( object ):
+	"""
+	For each target vertex, the ids of its nearest source vertices ( neighbour_ids, (N,k) ) and how much of each to take ( blend, (N,k) ).
+	"""
+	def __init__( self, neighbour_ids, blend ):
+		self.neighbour_ids = numpy.asarray( neighbour_ids, dtype = numpy.int64 )
+		self.blend = numpy.asarray( blend, dtype = numpy.float64 )
+
+	@classmethod
+	def build( cls, source_points, target_points, neighbours = None, source_topology = None ):
+		"""
+		Barycentric on the closest source triangle when source_topology ( polygon_counts, polygon_connects ) is given, otherwise
+		inverse distance over the neighbours ( defaults to const.TRANSFER_NEIGHBOURS ) nearest source points.
+		"""
+		grid = spatial.Spatial_Grid( source_points )
+		if source_topology:
+			nearest_ids, _ = get_nearest_points( grid, target_points, 1 )
+			return cls( *get_closest_triangles( grid.points, target_points, nearest_ids[ :, 0 ], *source_topology ) )
+
+		neighbour_ids, distances = get_nearest_points( grid, target_points, neighbours or const.TRANSFER_NEIGHBOURS )
+
+		# Inverse distance blend. Anything right on top of a source point just takes that point.
+		blend = 1.0 / numpy.maximum( distances, const.TRANSFER_EPSILON )
+		exact = distances[ :, 0 ] <= const.TRANSFER_EPSILON
+		blend[ exact ] = 0.0
+		blend[ exact, 0 ] = 1.0
+		blend /= blend.sum( axis = 1, keepdims = True )
+		return cls( neighbour_ids, blend )
+
+	@classmethod
+	def load( cls, file_path ):
+		with open( file_path, 'rb' ) as correspondence_file:
+			arrays = numpy.load( correspondence_file )
+			return cls( arrays[ 'neighbour_ids' ], arrays[ 'blend' ] )
+
+	def save( self, file_path ):
+		# Written under a temporary name first, so another process never loads half a file
+		temporary_path = '{0}.{1}.tmp'.format( file_path, os.getpid( ) )
+		with open( temporary_path, 'wb' ) as correspondence_file:
+			numpy.savez( correspondence_file, neighbour_ids = self.neighbour_ids, blend = self.blend )
+		if os.path.exists( file_path ):
+			os.remove( file_path )
+		os.rename( temporary_path, file_path )
+		return True
+
+	def transfer( self, table ):
+		"""
+		Returns a new Weight_Table for the target mesh, each row blended from the source table's rows. The bones keep the source's
+		order, and the rows aren't renormalized.
+		"""
+		table.build( )
+		target_count, neighbour_count = self.neighbour_ids.shape
+
+		# Expand every ( target vertex, neighbour ) pair into the neighbour's stored weights. Trailing source verts with no weights
+		# aren't in the table's offsets, so they get padded on as empty rows.
+		source_ids = self.neighbour_ids.ravel( )
+		offsets = table.offsets
+		if len( source_ids ) and source_ids.max( ) >= table.vertex_count:
+			offsets = numpy.concatenate( [ offsets, numpy.full( source_ids.max( ) + 1 - table.vertex_count, offsets[ -1 ], dtype = offsets.dtype ) ] )
+		row_starts = offsets[ source_ids ]
+		row_counts = offsets[ source_ids + 1 ] - row_starts
+		positions = numpy.arange( row_counts.sum( ) ) + numpy.repeat( row_starts - numpy.concatenate( [ [ 0 ], numpy.cumsum( row_counts )[ :-1 ] ] ), row_counts )
+		vert_ids = numpy.repeat( numpy.repeat( numpy.arange( target_count ), neighbour_count ), row_counts )
+		bone_indices = table.bone_indices[ positions ]
+		blended = table.weights[ positions ] * numpy.repeat( self.blend.ravel( ), row_counts )
+
+		# Neighbours sharing a bone add up into one weight. Neighbours with no blend at all don't leave empty weights behind.
+		bone_count = max( 1, len( table.bone_names ) )
+		keys, inverse = numpy.unique( vert_ids * bone_count + bone_indices, return_inverse = True )
+		summed = numpy.bincount( inverse, weights = blended, minlength = len( keys ) )
+		keys, summed = keys[ summed > 0 ], summed[ summed > 0 ]
+
+		target_table = weights.Weight_Table( target_count, bone_names = table.bone_names )
+		target_table.add_entries( keys // bone_count, keys % bone_count, summed )
+		return target_table.build( sort_bones = True )
+
+
+def get_nearest_points( grid, points, count ):
+	"""
+	Returns the ids of the count nearest grid points to each of the points, nearest first, and their distances. Both (N,count).
+
+	Points are handled a cell at a time. Each pass looks through a block of cells around the cell, and a point is done once its
+	furthest neighbour is closer than the edge of the block, since nothing outside the block can be any closer. The rest go again with
+	a block twice the size.
+	"""
+	points = numpy.asarray( points, dtype = numpy.float64 ).reshape( -1, 3 )
+	count = min( count, len( grid.points ) )
+	neighbour_ids = numpy.zeros( ( len( points ), count ), dtype = numpy.int64 )
+	distances = numpy.zeros( ( len( points ), count ), dtype = numpy.float64 )
+	if not count:
+		return neighbour_ids, distances
+
+	# Left unclipped, points outside the grid are measured from where their cell really is
+	cells = numpy.floor( ( points - grid.minimum ) / grid.cell_size ).astype( numpy.int64 )
+	highest_cell = grid.dimensions - 1
+	pending = numpy.arange( len( points ) )
+	ring = 1
+	while len( pending ):
+		unique_cells, inverse = numpy.unique( cells[ pending ], axis = 0, return_inverse = True )
+		order = numpy.argsort( inverse, kind = 'mergesort' )
+		group_ends = numpy.cumsum( numpy.bincount( inverse, minlength = len( unique_cells ) ) )
+
+		unresolved = [ ]
+		group_start = 0
+		for cell, group_end in zip( unique_cells, group_ends ):
+			members = pending[ order[ group_start:group_end ] ]
+			group_start = group_end
+
+			low_cell = numpy.clip( cell - ring, 0, highest_cell )
+			high_cell = numpy.clip( cell + ring, 0, highest_cell )
+			candidates = grid.query_cells( low_cell, high_cell )
+			whole_grid = ( low_cell == 0 ).all( ) and ( high_cell == highest_cell ).all( )
+			if len( candidates ) < count and not whole_grid:
+				unresolved.append( members )
+				continue
+
+			# Squared distances, and only the nearest few get sorted
+			offsets = points[ members, None, : ] - grid.points[ None, candidates, : ]
+			candidate_distances = numpy.einsum( 'ijk,ijk->ij', offsets, offsets )
+			rows = numpy.arange( len( members ) )[ :, None ]
+			nearest = numpy.argpartition( candidate_distances, count - 1, axis = 1 )[ :, :count ] if count < len( candidates ) else numpy.tile( numpy.arange( len( candidates ) ), ( len( members ), 1 ) )
+			nearest = nearest[ rows, numpy.argsort( candidate_distances[ rows, nearest ], axis = 1, kind = 'mergesort' ) ]
+			member_distances = numpy.sqrt( candidate_distances[ rows, nearest ] )
+
+			done = numpy.ones( len( members ), dtype = bool ) if whole_grid else member_distances[ :, -1 ] <= ring * grid.cell_size
+			neighbour_ids[ members[ done ] ] = candidates[ nearest[ done ] ]
+			distances[ members[ done ] ] = member_distances[ done ]
+			unresolved.append( members[ ~done ] )
+
+		pending = numpy.concatenate( unresolved ) if unresolved else pending[ : 0 ]
+		ring *= 2
+	return neighbour_ids, distances
+
+
+def get_triangles( polygon_counts, polygon_connects ):
+	"""
+	Fans every polygon out into triangles from its first vertex. Returns the (T,3) vertex ids.
+	"""
+	counts = numpy.asarray( polygon_counts, dtype = numpy.int64 )
+	connects = numpy.asarray( polygon_connects, dtype = numpy.int64 )
+	starts = numpy.concatenate( [ [ 0 ], numpy.cumsum( counts )[ :-1 ] ] )
+	fan_counts = numpy.maximum( counts - 2, 0 )
+	polygon_starts = numpy.repeat( starts, fan_counts )
+	corners = numpy.arange( fan_counts.sum( ) ) - numpy.repeat( numpy.cumsum( fan_counts ) - fan_counts, fan_counts ) + 1
+	return numpy.stack( [ connects[ polygon_starts ], connects[ polygon_starts + corners ], connects[ polygon_starts + corners + 1 ] ], axis = 1 )
+
+
+def get_closest_triangles( source_points, target_points, nearest_ids, polygon_counts, polygon_connects ):
+	"""
+	For each target point, finds the closest point on the triangles that use its nearest source vertex. Returns the (N,3) triangle
+	vertex ids and the closest point's (N,3) barycentric coordinates. Points whose nearest vertex isn't on any face get that vertex.
+	"""
+	target_points = numpy.asarray( target_points, dtype = numpy.float64 ).reshape( -1, 3 )
+	triangles = get_triangles( polygon_counts, polygon_connects )
+
+	# Triangles around each vertex, as csr arrays
+	corner_vertices = triangles.ravel( )
+	vertex_order = numpy.argsort( corner_vertices, kind = 'mergesort' )
+	vertex_offsets = numpy.zeros( len( source_points ) + 1, dtype = numpy.int64 )
+	numpy.cumsum( numpy.bincount( corner_vertices, minlength = len( source_points ) ), out = vertex_offsets[ 1: ] )
+
+	# Every ( target, triangle ) pair to check
+	starts = vertex_offsets[ nearest_ids ]
+	counts = vertex_offsets[ nearest_ids + 1 ] - starts
+	pair_targets = numpy.repeat( numpy.arange( len( target_points ) ), counts )
+	pair_triangles = vertex_order[ numpy.arange( counts.sum( ) ) + numpy.repeat( starts - numpy.concatenate( [ [ 0 ], numpy.cumsum( counts )[ :-1 ] ] ), counts ) ] // 3
+	corners = source_points[ triangles[ pair_triangles ] ]
+	coordinates = get_barycentric_coordinates( target_points[ pair_targets ], corners[ :, 0 ], corners[ :, 1 ], corners[ :, 2 ] )
+	closest_points = ( corners * coordinates[ :, :, None ] ).sum( axis = 1 )
+	pair_distances = ( ( closest_points - target_points[ pair_targets ] ) ** 2 ).sum( axis = 1 )
+
+	# The closest pair per target. Sorting by target then distance puts it first in each target's run.
+	order = numpy.lexsort( ( pair_distances, pair_targets ) )
+	first = order[ numpy.concatenate( [ [ 0 ], numpy.cumsum( counts[ counts > 0 ] )[ :-1 ] ] ) ] if len( order ) else order
+
+	neighbour_ids = numpy.repeat( numpy.asarray( nearest_ids, dtype = numpy.int64 )[ :, None ], 3, axis = 1 )
+	blend = numpy.zeros( ( len( target_points ), 3 ) )
+	blend[ :, 0 ] = 1.0
+	has_faces = counts > 0
+	neighbour_ids[ has_faces ] = triangles[ pair_triangles[ first ] ]
+	blend[ has_faces ] = coordinates[ first ]
+
+	# Right on top of a source vertex, take it as it is rather than a near one hot blend
+	on_vertex = blend >= 1.0 - const.TRANSFER_EPSILON
+	blend[ on_vertex.any( axis = 1 ) ] = on_vertex[ on_vertex.any( axis = 1 ) ]
+	return neighbour_ids, blend
+
+
+def get_barycentric_coordinates( points, a, b, c ):
+	"""
+	Barycentric coordinates (N,3) of the closest point on each triangle ( a, b, c ) to each point, all (N,3) arrays. Works through
+	the vertex, edge and face regions the way Ericson's closest point on triangle does, just on whole arrays.
+	"""
+	def dot( first, second ):
+		return ( first * second ).sum( axis = 1 )
+
+	def divide( numerator, denominator ):
+		return numerator / numpy.where( denominator == 0, 1.0, denominator )
+
+	ab, ac = b - a, c - a
+	ap, bp, cp = points - a, points - b, points - c
+	d1, d2 = dot( ab, ap ), dot( ac, ap )
+	d3, d4 = dot( ab, bp ), dot( ac, bp )
+	d5, d6 = dot( ab, cp ), dot( ac, cp )
+	va = d3 * d6 - d5 * d4
+	vb = d5 * d2 - d1 * d6
+	vc = d1 * d4 - d3 * d2
+
+	# Inside the face
+	denominator = divide( 1.0, va + vb + vc )
+	v, w = vb * denominator, vc * denominator
+	coordinates = numpy.stack( [ 1.0 - v - w, v, w ], axis = 1 )
+
+	# Then each region in reverse order of precedence, so the vertex regions win
+	zeros = numpy.zeros( len( points ) )
+	ones = numpy.ones( len( points ) )
+	edge_bc = divide( d4 - d3, ( d4 - d3 ) + ( d5 - d6 ) )
+	edge_ac = divide( d2, d2 - d6 )
+	edge_ab = divide( d1, d1 - d3 )
+	regions = [
+		( ( va <= 0 ) & ( d4 - d3 >= 0 ) & ( d5 - d6 >= 0 ), ( zeros, 1.0 - edge_bc, edge_bc ) ),
+		( ( vb <= 0 ) & ( d2 >= 0 ) & ( d6 <= 0 ), ( 1.0 - edge_ac, zeros, edge_ac ) ),
+		( ( d6 >= 0 ) & ( d5 <= d6 ), ( zeros, zeros, ones ) ),
+		( ( vc <= 0 ) & ( d1 >= 0 ) & ( d3 <= 0 ), ( 1.0 - edge_ab, edge_ab, zeros ) ),
+		( ( d3 >= 0 ) & ( d4 <= d3 ), ( zeros, ones, zeros ) ),
+		( ( d1 <= 0 ) & ( d2 <= 0 ), ( ones, zeros, zeros ) ),
+	]
+	for mask, region_coordinates in regions:
+		coordinates[ mask ] = numpy.stack( region_coordinates, axis = 1 )[ mask ]
+	return coordinates
+
+
+def get_correspondence( source_points, target_points, neighbours = None, source_topology = None, mode = None, use_cache = None ):
+	"""
+	Returns the Correspondence from the source points to the target points, loaded from const.CACHE_DIR if it's been built before.
+	mode defaults to const.TRANSFER_MODE, 'barycentric' needs source_topology ( polygon_counts, polygon_connects ) and falls back to
+	'nearest' without it. use_cache defaults to const.TRANSFER_CACHE_ENABLED.
+	"""
+	neighbours = neighbours or const.TRANSFER_NEIGHBOURS
+	mode = mode or const.TRANSFER_MODE
+	if mode != 'barycentric':
+		source_topology = None
+	if use_cache is None:
+		use_cache = const.TRANSFER_CACHE_ENABLED
+	if not use_cache:
+		return Correspondence.build( source_points, target_points, neighbours = neighbours, source_topology = source_topology )
+
+	file_path = get_cache_path( source_points, target_points, neighbours, source_topology )
+	if os.path.exists( file_path ):
+		try:
+			return Correspondence.load( file_path )
+		except ( IOError, ValueError, KeyError ) as exception:
+			print 'Skonverter Transfer : Unreadable correspondence, rebuilding it | {0}'.format( exception )
+
+	correspondence = Correspondence.build( source_points, target_points, neighbours = neighbours, source_topology = source_topology )
+	if not os.path.isdir( os.path.dirname( file_path ) ):
+		os.makedirs( os.path.dirname( file_path ) )
+	correspondence.save( file_path )
+	return correspondence
+
+
+def get_cache_path( source_points, target_points, neighbours, source_topology = None ):
+	"""
+	Where the correspondence between these meshes is kept. The meshes themselves are the key, the same two always map the same way.
+	"""
+	digest = hashlib.sha1( )
+	digest.update( repr( ( KEY_VERSION, neighbours, const.TRANSFER_EPSILON, bool( source_topology ) ) ) )
+	arrays = [ numpy.asarray( points, dtype = numpy.float64 ) for points in ( source_points, target_points ) ]
+	arrays.extend( numpy.asarray( values, dtype = numpy.int64 ) for values in source_topology or ( ) )
+	for array in arrays:
+		array = numpy.ascontiguousarray( array )
+		digest.update( repr( array.shape ) )
+		digest.update( array.tostring( ) )
+	return os.path.join( os.path.expanduser( const.CACHE_DIR ), CACHE_FOLDER, digest.hexdigest( ) + '.npz' )
@@ -0,0 +1,143 @@
+"""
+Contains the binary weight file format.
+
+Layout ( little endian ), every array section starts on an 8 byte boundary:
+	header       : magic, version, vertex count, bone count, row count, entry count, totals count, bone table size, metadata size
+	bone table   : utf-8 bone names, each followed by a null byte, in bone order
+	metadata     : utf-8 json, anything else stored with the data ( fingerprints, etc. )
+	vert ids     : uint32 x row count, the vertices that have weights
+	row offsets  : uint32 x ( row count + 1 ), the slice of the entries each of those vertices owns
+	bone indices : uint16 x entry count, index into the bone table
+	weights      : float32 x entry count
+	totals       : float64 x totals count, pre-normalization weight totals for the rows ( zero or row count )
+
+Loading memory maps the file and wraps each section in a numpy view, so there's nothing to parse.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+# Python std lib imports
+import json
+import struct
+
+# Skonverter module imports
+import weights
+
+
+MAGIC = 'SKWT'
+VERSION = 1
+HEADER = struct.Struct( '<4sIIIIQIII' )
+ALIGNMENT = 8
+MAX_BONES = 65535 # Bone indices are stored as uint16
+
+
+def save_binary( file_path, data ):
+	"""
+	Saves the { 'weight': ..., 'order': ... } data to the file_path in the binary format.
+	"""
+	weight_table = weights.Weight_Table.from_data( data ).build( )
+	if len( weight_table.bone_names ) > MAX_BONES:
+		raise ValueError( 'Binary weight files hold at most {0} bones, got {1}'.format( MAX_BONES, len( weight_table.bone_names ) ) )
+
+	# Squeeze the table's dense offsets down to only the rows that have weights
+	vert_ids = weight_table.get_vertex_ids( )
+	row_offsets = numpy.concatenate( [ weight_table.offsets[ vert_ids ], weight_table.offsets[ -1: ] ] )
+
+	totals = numpy.zeros( 0, dtype = numpy.float64 )
+	if data.get( 'totals' ) is not None:
+		totals = weights.get_totals_array( data[ 'totals' ], weight_table.vertex_count )[ vert_ids ]
+
+	bone_table = ''.join( bone_name.encode( 'utf-8' ) + '\0' for bone_name in weight_table.bone_names )
+	metadata = json.dumps( dict( ( key, value ) for key, value in data.iteritems( ) if key not in ( 'weight', 'order', 'totals' ) ) )
+
+	sections = [
+		bone_table,
+		metadata,
+		numpy.asarray( vert_ids, dtype = '<u4' ).tostring( ),
+		numpy.asarray( row_offsets, dtype = '<u4' ).tostring( ),
+		numpy.asarray( weight_table.bone_indices, dtype = '<u2' ).tostring( ),
+		numpy.asarray( weight_table.weights, dtype = '<f4' ).tostring( ),
+		numpy.asarray( totals, dtype = '<f8' ).tostring( ),
+	]
+
+	with open( file_path, 'wb' ) as data_file:
+		data_file.write( HEADER.pack( MAGIC, VERSION, weight_table.vertex_count, len( weight_table.bone_names ), len( vert_ids ),
+		                              len( weight_table.weights ), len( totals ), len( bone_table ), len( metadata ) ) )
+		data_file.write( '\0' * padding( data_file.tell( ) ) )
+		for section in sections:
+			data_file.write( section )
+			data_file.write( '\0' * padding( data_file.tell( ) ) )
+	return True
+
+
+def load_binary( file_path ):
+	"""
+	Memory maps a binary weight file and returns the data dictionary. data[ 'weight' ] is a Weight_Mapping over the file's arrays.
+	"""
+	buffer = numpy.memmap( file_path, dtype = numpy.uint8, mode = 'r' )
+	magic, version, vertex_count, bone_count, row_count, entry_count, totals_count, bone_table_size, metadata_size = HEADER.unpack( buffer[ :HEADER.size ].tostring( ) )
+	if magic != MAGIC:
+		raise ValueError( '{0} is not a skonverter weight file'.format( file_path ) )
+	if version > VERSION:
+		raise ValueError( '{0} was written by a newer version of skonverter ( file version {1} )'.format( file_path, version ) )
+
+	reader = Section_Reader( buffer, HEADER.size )
+	bone_names = [ bone_name.decode( 'utf-8' ) for bone_name in reader.read_bytes( bone_table_size ).split( '\0' )[ :bone_count ] ]
+	metadata = json.loads( reader.read_bytes( metadata_size ) or '{}' )
+	vert_ids = reader.read_array( '<u4', row_count )
+	row_offsets = reader.read_array( '<u4', row_count + 1 )
+	bone_indices = reader.read_array( '<u2', entry_count )
+	weight_values = reader.read_array( '<f4', entry_count )
+	totals = reader.read_array( '<f8', totals_count )
+
+	weight_table = weights.Weight_Table.from_csr( vertex_count, bone_names, vert_ids, row_offsets, bone_indices, weight_values )
+
+	data = metadata
+	data[ 'weight' ] = weights.Weight_Mapping( weight_table )
+	data[ 'order' ] = bone_names
+	if totals_count:
+		data[ 'totals' ] = numpy.zeros( vertex_count, dtype = numpy.float64 )
+		data[ 'totals' ][ vert_ids ] = totals
+	return data
+
+
+def is_binary_file( file_path ):
+	"""
+	Checks the first bytes of a file for the binary format's magic.
+	"""
+	with open( file_path, 'rb' ) as data_file:
+		return data_file.read( len( MAGIC ) ) == MAGIC
+
+
+def padding( position ):
+	"""
+	How many bytes are needed after position to land on the next ALIGNMENT boundary.
+	"""
+	return -position % ALIGNMENT
+
+
+class Section_Reader( object ):
+	"""
+	Walks the sections of a memory mapped file in order, skipping the alignment padding between them.
+	"""
+	def __init__( self, buffer, position ):
+		self.buffer = buffer
+		self.position = position + padding( position )
+
+	def read_bytes( self, size ):
+		section = self.buffer[ self.position:self.position + size ].tostring( )
+		self._advance( size )
+		return section
+
+	def read_array( self, dtype, count ):
+		dtype = numpy.dtype( dtype )
+		section = self.buffer[ self.position:self.position + count * dtype.itemsize ].view( dtype )
+		self._advance( count * dtype.itemsize )
+		return section
+
+	def _advance( self, size ):
+		self.position += size
+		self.position += padding( self.position )
@@ -0,0 +1,382 @@
+"""
+Contains the weight table, the internal data model the skin converter uses to hold bone/vertex weighting.
+
+Weights are accumulated bone by bone as flat arrays and then packed into a compressed sparse row layout ( one row per vertex ),
+so pruning, normalization and lookups are whole array operations instead of loops over dictionaries of tuple lists.
+
+Author : Evan Cox, coxevan90@gmail.com
+"""
+
+# Third party imports
+import numpy
+
+
+class Weight_Table( object ):
+	"""
+	Sparse vertex x bone weight storage.
+
+	Rows are vertices, columns are indices into bone_names. Within a row the weights are kept in the order the bones were added,
+	which is the root to tip order the rest of the tool relies on.
+	"""
+	def __init__( self, vertex_count, bone_names = None ):
+		self.vertex_count = vertex_count
+
+		# Bone name list and a name -> column lookup
+		self.bone_names = [ ]
+		self.bone_index = { }
+
+		# Chunks added bone by bone, packed into the csr arrays below on build( )
+		self._vert_chunks   = [ ]
+		self._bone_chunks   = [ ]
+		self._weight_chunks = [ ]
+
+		# Compressed sparse row arrays. offsets[ vert_id ] : offsets[ vert_id + 1 ] slices bone_indices and weights for that vertex.
+		self.offsets      = numpy.zeros( vertex_count + 1, dtype = numpy.int64 )
+		self.bone_indices = numpy.zeros( 0, dtype = numpy.int32 )
+		self.weights      = numpy.zeros( 0, dtype = numpy.float64 )
+
+		for bone_name in bone_names or [ ]:
+			self.get_bone_index( bone_name )
+
+	@classmethod
+	def from_data( cls, data ):
+		"""
+		Builds a table from the { 'weight': ..., 'order': ... } data dictionary.
+		"""
+		weight_data = data[ 'weight' ]
+		if isinstance( weight_data, Weight_Mapping ):
+			return weight_data.table.copy( )
+
+		vertex_count = 0
+		if weight_data:
+			vertex_count = max( int( vert_id ) for vert_id in weight_data ) + 1
+		table = cls( vertex_count, bone_names = data[ 'order' ] )
+
+		vert_ids = [ ]
+		bone_indices = [ ]
+		weights = [ ]
+		for vert_id, weight_list in weight_data.iteritems( ):
+			vert_id = int( vert_id )
+			for bone_name, weight in weight_list:
+				vert_ids.append( vert_id )
+				bone_indices.append( table.get_bone_index( bone_name ) )
+				weights.append( weight )
+
+		table.add_entries( vert_ids, bone_indices, weights )
+		table.build( sort_bones = True )
+		return table
+
+	@classmethod
+	def from_csr( cls, vertex_count, bone_names, vert_ids, row_offsets, bone_indices, weights ):
+		"""
+		Builds a table around existing csr arrays that only hold rows for the weighted verts ( vert_ids ), like the binary file stores.
+		The bone index and weight arrays are used as they are, so memory mapped arrays stay memory mapped.
+		"""
+		table = cls( vertex_count, bone_names = bone_names )
+		counts = numpy.zeros( vertex_count, dtype = numpy.int64 )
+		counts[ numpy.asarray( vert_ids, dtype = numpy.int64 ) ] = numpy.diff( numpy.asarray( row_offsets, dtype = numpy.int64 ) )
+		numpy.cumsum( counts, out = table.offsets[ 1: ] )
+		table.bone_indices = bone_indices
+		table.weights = weights
+		return table
+
+	def copy( self ):
+		"""
+		Returns a new table sharing this one's arrays. Nothing edits the arrays in place, so sharing them is safe.
+		"""
+		self.build( )
+		table = Weight_Table( self.vertex_count, bone_names = self.bone_names )
+		table.offsets = self.offsets
+		table.bone_indices = self.bone_indices
+		table.weights = self.weights
+		return table
+
+	def get_bone_index( self, bone_name ):
+		"""
+		Returns the column index for the bone, adding the bone to the table if it isn't in it yet.
+		"""
+		index = self.bone_index.get( bone_name )
+		if index is None:
+			index = len( self.bone_names )
+			self.bone_names.append( bone_name )
+			self.bone_index[ bone_name ] = index
+		return index
+
+	def add_bone( self, bone_name, vert_ids, weights ):
+		"""
+		Adds the weighting of a single bone. vert_ids and weights are matching arrays, like the ones calculate_probe_weights returns.
+		"""
+		bone_index = self.get_bone_index( bone_name )
+		self._vert_chunks.append( numpy.asarray( vert_ids, dtype = numpy.int32 ) )
+		self._bone_chunks.append( numpy.full( len( vert_ids ), bone_index, dtype = numpy.int32 ) )
+		self._weight_chunks.append( numpy.asarray( weights, dtype = numpy.float64 ) )
+
+	def add_entries( self, vert_ids, bone_indices, weights ):
+		"""
+		Adds ( vert_id, bone_index, weight ) entries in any order. Build with sort_bones = True afterwards.
+		"""
+		self._vert_chunks.append( numpy.asarray( vert_ids, dtype = numpy.int32 ) )
+		self._bone_chunks.append( numpy.asarray( bone_indices, dtype = numpy.int32 ) )
+		self._weight_chunks.append( numpy.asarray( weights, dtype = numpy.float64 ) )
+
+	def build( self, sort_bones = False ):
+		"""
+		Packs everything added so far into the csr arrays. Safe to call more than once.
+
+		sort_bones orders each row by bone index, needed when the entries didn't come in bone by bone.
+		"""
+		if not self._vert_chunks:
+			return self
+
+		# Pull the current rows back out so new chunks merge with what was already built
+		vert_ids = numpy.concatenate( [ self.get_row_ids( ) ] + self._vert_chunks )
+		bone_indices = numpy.concatenate( [ self.bone_indices ] + self._bone_chunks )
+		weights = numpy.concatenate( [ self.weights ] + self._weight_chunks )
+		self._vert_chunks, self._bone_chunks, self._weight_chunks = [ ], [ ], [ ]
+
+		# A stable sort on the vertex id keeps the bones in the order they were added inside each row.
+		if sort_bones:
+			order = numpy.lexsort( ( bone_indices, vert_ids ) )
+		else:
+			order = numpy.argsort( vert_ids, kind = 'mergesort' )
+
+		self.vertex_count = max( self.vertex_count, int( vert_ids.max( ) ) + 1 if len( vert_ids ) else 0 )
+		self.bone_indices = bone_indices[ order ]
+		self.weights = weights[ order ]
+		self.offsets = numpy.zeros( self.vertex_count + 1, dtype = numpy.int64 )
+		numpy.cumsum( numpy.bincount( vert_ids, minlength = self.vertex_count ), out = self.offsets[ 1: ] )
+		return self
+
+	def get_byte_count( self ):
+		"""
+		Returns how many bytes the packed arrays take up.
+		"""
+		return self.offsets.nbytes + self.bone_indices.nbytes + self.weights.nbytes
+
+	def get_row_ids( self ):
+		"""
+		Returns the vertex id of every stored weight, the expanded form of offsets.
+		"""
+		return numpy.repeat( numpy.arange( self.vertex_count, dtype = numpy.int32 ), numpy.diff( self.offsets ) )
+
+	def get_vertex_ids( self ):
+		"""
+		Returns the ids of the vertices that hold at least one weight.
+		"""
+		self.build( )
+		return numpy.flatnonzero( numpy.diff( self.offsets ) )
+
+	def get_totals( self ):
+		"""
+		Returns the summed weight of every vertex. The sum runs in row order, the same as calculate_total_vertex_weight.
+		"""
+		self.build( )
+		return numpy.bincount( self.get_row_ids( ), weights = self.weights, minlength = self.vertex_count )
+
+	def normalize( self ):
+		"""
+		Divides every weight by the total weight of its vertex, then hands the rounding error left over to each vertex's last weight,
+		so every weighted vertex sums to exactly 1.0 when added up in row order. Vertices with no weight at all are left alone.
+		"""
+		totals = self.get_totals( )
+		totals[ totals == 0 ] = 1.0
+		row_ids = self.get_row_ids( )
+		self.weights = numpy.asarray( self.weights, dtype = numpy.float64 ) / totals[ row_ids ]
+
+		# The rest of each row sums to within an ulp or so of 1.0, so 1.0 minus it is exact and adding it back gives exactly 1.0.
+		vert_ids = self.get_vertex_ids( )
+		last_entries = self.offsets[ vert_ids + 1 ] - 1
+		rest_weights = self.weights.copy( )
+		rest_weights[ last_entries ] = 0.0
+		self.weights[ last_entries ] = 1.0 - numpy.bincount( row_ids, weights = rest_weights, minlength = self.vertex_count )[ vert_ids ]
+		return self
+
+	def scale_rows( self, totals ):
+		"""
+		Multiplies every weight by the value for its vertex in totals. Given the totals from before normalize( ), this undoes it.
+		"""
+		self.build( )
+		self.weights = self.weights * numpy.asarray( totals, dtype = numpy.float64 )[ self.get_row_ids( ) ]
+		return self
+
+	def prune( self, max_influences = None, threshold = None ):
+		"""
+		Drops the weights below threshold ( a fraction of their vertex's total weight ) and then all but the max_influences largest
+		weights of each vertex. A vertex always keeps its largest weight. Ties go to the bone added first, the one nearer the root.
+
+		Doesn't renormalize, call normalize( ) afterwards for that. Returns how many weights were dropped.
+		"""
+		self.build( )
+		if not max_influences and not threshold:
+			return 0
+
+		row_ids = self.get_row_ids( )
+		keep = numpy.ones( len( self.weights ), dtype = bool )
+
+		# Rank each entry within its row, largest weight first. lexsort is stable, so equal weights keep their root to tip order.
+		order = numpy.lexsort( ( -self.weights, row_ids ) )
+		ranks = numpy.empty( len( order ), dtype = numpy.int64 )
+		ranks[ order ] = numpy.arange( len( order ) ) - self.offsets[ row_ids[ order ] ]
+
+		if threshold:
+			totals = self.get_totals( )
+			keep &= self.weights >= threshold * totals[ row_ids ]
+		if max_influences:
+			keep &= ranks < max_influences
+		keep |= ranks == 0
+
+		dropped = int( len( keep ) - numpy.count_nonzero( keep ) )
+		if dropped:
+			self.bone_indices = self.bone_indices[ keep ]
+			self.weights = self.weights[ keep ]
+			self.offsets = numpy.zeros( self.vertex_count + 1, dtype = numpy.int64 )
+			numpy.cumsum( numpy.bincount( row_ids[ keep ], minlength = self.vertex_count ), out = self.offsets[ 1: ] )
+		return dropped
+
+	def count_unnormalized( self ):
+		"""
+		Returns how many weighted vertices do not add up to exactly 1.0.
+		"""
+		totals = self.get_totals( )[ self.get_vertex_ids( ) ]
+		return int( numpy.count_nonzero( totals != 1.0 ) )
+
+	def get_vertex_weights( self, vert_id ):
+		"""
+		Returns the [ ( bone_name, weight ), ... ] list for a single vertex.
+		"""
+		self.build( )
+		start, end = self.offsets[ vert_id ], self.offsets[ vert_id + 1 ]
+		bone_names = self.bone_names
+		return [ ( bone_names[ bone_index ], weight ) for bone_index, weight in zip( self.bone_indices[ start:end ].tolist( ), self.weights[ start:end ].tolist( ) ) ]
+
+	def get_bone_columns( self ):
+		"""
+		Returns { bone_name : ( vert_ids, weights ) } for every bone in the table, the reverse of add_bone.
+		"""
+		self.build( )
+		row_ids = self.get_row_ids( )
+		
+		# Group the entries by bone. The stable sort keeps each bone's verts in ascending order.
+		order = numpy.argsort( self.bone_indices, kind = 'mergesort' )
+		bounds = numpy.searchsorted( self.bone_indices[ order ], numpy.arange( len( self.bone_names ) + 1 ) )
+		
+		columns = { }
+		for bone_index, bone_name in enumerate( self.bone_names ):
+			entries = order[ bounds[ bone_index ]:bounds[ bone_index + 1 ] ]
+			columns[ bone_name ] = ( row_ids[ entries ], self.weights[ entries ] )
+		return columns
+
+	def get_dense_block( self, vert_ids, bone_names ):
+		"""
+		Returns a ( len( vert_ids ), len( bone_names ) ) array of weights, one row per vert and one column per bone in bone_names.
+		
+		Bones the table has no weights for come out as zero columns, bones that aren't in bone_names are left out.
+		"""
+		self.build( )
+		vert_ids = numpy.asarray( vert_ids, dtype = numpy.int64 )
+		block = numpy.zeros( ( len( vert_ids ), len( bone_names ) ), dtype = numpy.float64 )
+		
+		# Table bone index -> block column, -1 for bones we aren't writing
+		columns = numpy.full( len( self.bone_names ), -1, dtype = numpy.int64 )
+		for column, bone_name in enumerate( bone_names ):
+			if bone_name in self.bone_index:
+				columns[ self.bone_index[ bone_name ] ] = column
+		
+		# Expand the csr rows of the requested verts into ( block row, entry ) pairs
+		counts = self.offsets[ vert_ids + 1 ] - self.offsets[ vert_ids ]
+		rows = numpy.repeat( numpy.arange( len( vert_ids ) ), counts )
+		entries = numpy.repeat( self.offsets[ vert_ids ] - ( numpy.cumsum( counts ) - counts ), counts ) + numpy.arange( counts.sum( ) )
+		
+		entry_columns = columns[ self.bone_indices[ entries ] ]
+		keep = entry_columns >= 0
+		block[ rows[ keep ], entry_columns[ keep ] ] = self.weights[ entries[ keep ] ]
+		return block
+
+	def iter_vertex_weights( self ):
+		"""
+		Yields ( vert_id, [ ( bone_name, weight ), ... ] ) for every weighted vertex.
+		"""
+		# Convert to python lists once up front, slicing lists is a lot cheaper than slicing arrays per vertex.
+		vert_ids = self.get_vertex_ids( ).tolist( )
+		offsets = self.offsets.tolist( )
+		bone_names = [ self.bone_names[ bone_index ] for bone_index in self.bone_indices.tolist( ) ]
+		weights = self.weights.tolist( )
+		for vert_id in vert_ids:
+			start, end = offsets[ vert_id ], offsets[ vert_id + 1 ]
+			yield vert_id, zip( bone_names[ start:end ], weights[ start:end ] )
+
+	def to_weight_dict( self ):
+		"""
+		Builds the { 'vert_id': [ ( bone_name, weight ), ... ] } dictionary the data format uses.
+		"""
+		return dict( ( str( vert_id ), weight_list ) for vert_id, weight_list in self.iter_vertex_weights( ) )
+
+
+
+class Weight_Mapping( object ):
+	"""
+	Read only, dictionary like view of a Weight_Table keyed by stringified vertex id.
+
+	Lets code that expects data[ 'weight' ] to be a dictionary read a table ( like one loaded from a binary file ) without
+	building all the tuple lists up front.
+	"""
+	def __init__( self, table ):
+		self.table = table.build( )
+
+	def __getitem__( self, vert_id ):
+		vert_id = int( vert_id )
+		if vert_id < 0 or vert_id >= self.table.vertex_count or self.table.offsets[ vert_id ] == self.table.offsets[ vert_id + 1 ]:
+			raise KeyError( vert_id )
+		return self.table.get_vertex_weights( vert_id )
+
+	def __contains__( self, vert_id ):
+		try:
+			self[ vert_id ]
+		except ( KeyError, ValueError ):
+			return False
+		return True
+
+	def __iter__( self ):
+		for vert_id in self.table.get_vertex_ids( ).tolist( ):
+			yield str( vert_id )
+
+	def __len__( self ):
+		return len( self.table.get_vertex_ids( ) )
+
+	def keys( self ):
+		return list( self )
+
+	def iteritems( self ):
+		for vert_id, weight_list in self.table.iter_vertex_weights( ):
+			yield str( vert_id ), weight_list
+
+	def items( self ):
+		return list( self.iteritems( ) )
+
+	def itervalues( self ):
+		for vert_id, weight_list in self.iteritems( ):
+			yield weight_list
+
+	def values( self ):
+		return list( self.itervalues( ) )
+
+	def __eq__( self, other ):
+		if not hasattr( other, 'iteritems' ):
+			return NotImplemented
+		return dict( self.iteritems( ) ) == dict( other.iteritems( ) )
+
+	def __ne__( self, other ):
+		equal = self.__eq__( other )
+		return equal if equal is NotImplemented else not equal
+
+
+def get_totals_array( totals, vertex_count ):
+	"""
+	Turns the stored totals, either the { 'vert_id': total } dictionary or an array already, into a dense float64 array.
+	"""
+	if isinstance( totals, numpy.ndarray ):
+		return totals
+	totals_array = numpy.zeros( vertex_count, dtype = numpy.float64 )
+	for vert_id, total in totals.iteritems( ):
+		totals_array[ int( vert_id ) ] = total
+	return totals_array